@@ -1,7 +1,6 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from supabase import create_client
 from assets import MODELS_USED
 
 load_dotenv()
@@ -16,12 +15,28 @@ def get_api_key(model):
     env_var_name = list(MODELS_USED[model])[0]  # e.g., "GEMINI_API_KEY"
     return st.session_state.get(env_var_name) or os.getenv(env_var_name)
 
-def get_supabase_client():
-    """Returns a Supabase client if credentials exist, otherwise shows a guide."""
+def get_supabase_credentials():
+    """Returns (url, key) from the session or the environment, or None if they are missing."""
     supabase_url = st.session_state.get('SUPABASE_URL') or os.getenv('SUPABASE_URL')
     supabase_key = st.session_state.get('SUPABASE_ANON_KEY') or os.getenv('SUPABASE_ANON_KEY')
 
     if not supabase_url or not supabase_key or "your-supabase-url-here" in supabase_url:
         return None
+    return supabase_url, supabase_key
 
+@st.cache_resource(show_spinner=False)
+def _create_supabase_client(supabase_url, supabase_key):
+    # the supabase package is heavy; only import it once a client is needed
+    from supabase import create_client
     return create_client(supabase_url, supabase_key)
+
+def get_supabase_client():
+    """
+    Returns the Supabase client for the configured credentials, or None if
+    they are missing. Clients are created once per set of credentials and kept
+    in Streamlit's resource cache, instead of on every call or rerun.
+    """
+    credentials = get_supabase_credentials()
+    if credentials is None:
+        return None
+    return _create_supabase_client(*credentials)
@@ -12,6 +12,97 @@ MODELS_USED = {
     GEMINI_MODEL_FULLNAME: {"GEMINI_API_KEY"},
     DEEPSEEK_MODEL_FULLNAME : {"GROQ_API_KEY"},
 }
+# Per-provider limits for the parallel LLM path, keyed by the API key
+# name each model uses in MODELS_USED (one key = one provider account).
+#   max_concurrency: requests in flight at the same time
+#   rpm / tpm: requests and tokens per minute (None = unlimited)
+PROVIDER_RATE_LIMITS = {
+    "OPENAI_API_KEY": {"max_concurrency": 10, "rpm": 500, "tpm": 200000},
+    "GEMINI_API_KEY": {"max_concurrency": 10, "rpm": 1000, "tpm": 1000000},
+    "GROQ_API_KEY": {"max_concurrency": 5, "rpm": 30, "tpm": 6000},
+}
+DEFAULT_PROVIDER_RATE_LIMITS = {"max_concurrency": 5, "rpm": None, "tpm": None}
+
+# Pages larger than one request are split into chunks (see chunking.py):
+# each chunk uses at most this fraction of the model's input window,
+# and never more than CHUNK_MAX_TOKENS, so big pages are parsed in parallel.
+CHUNK_INPUT_TOKEN_FRACTION = 0.5
+CHUNK_MAX_TOKENS = 32000
+
+# Markdown pruning before extraction (see pruning.py), applied in order
+PRUNING_ENABLED = True
+PRUNING_STEPS = [
+    "drop_image_links",
+    "strip_tracking_params",
+    "strip_boilerplate",
+    "drop_navigation_sections",
+    "collapse_link_urls",
+]
+BOILERPLATE_KEYWORDS = [
+    "cookie", "consent", "privacy policy", "terms of service", "terms and conditions",
+    "newsletter", "subscribe", "all rights reserved", "©", "skip to content",
+    "skip to main content", "follow us",
+]
+# Link URLs longer than this are moved to a reference list even if used once
+LONG_URL_CHARS = 80
+
+# Rule-based pagination detection: below this confidence the LLM is used instead
+PAGINATION_RULE_MIN_CONFIDENCE = 0.8
+# Sequences longer than this are left to the LLM
+PAGINATION_MAX_GENERATED_PAGES = 500
+
+# Follow-through catalog crawl (see catalog_crawler.py)
+CATALOG_MAX_PAGES = 100        # pages fetched per launch, start URLs included
+CATALOG_MAX_DEPTH = 1          # pagination hops followed from a start URL
+CATALOG_EXTRACT_CONCURRENCY = 10
+
+# Retries, circuit breaker and hedging around every LLM request (see resilience.py)
+LLM_REQUEST_TIMEOUT_SECONDS = 120
+LLM_MAX_RETRIES = 4            # retries of timeouts, 429s and 5xx errors
+LLM_BACKOFF_BASE_SECONDS = 1.0
+LLM_BACKOFF_MAX_SECONDS = 60.0 # a longer Retry-After fails the request instead of waiting
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failures that open a provider's circuit
+CIRCUIT_RESET_SECONDS = 30.0   # an open circuit fails requests at once for this long, then lets one through
+# Hedging: a request slower than the provider's recent p95 latency gets one
+# duplicate and the first answer wins. Both requests may be billed.
+LLM_HEDGING_ENABLED = False
+LLM_HEDGE_PERCENTILE = 0.95
+LLM_HEDGE_MIN_SAMPLES = 20     # latencies observed before a provider's requests are hedged
+
+# Batch-job extraction (see batch_jobs.py): every prompt of a run goes into a
+# JSONL job file that a batch backend processes offline, at batch prices.
+BATCH_BACKEND = "local"        # "local" (a file-based stand-in) or "openai"
+BATCH_JOBS_PATH = ".cache/batch_jobs"
+BATCH_POLL_SECONDS = 30
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_PRICE_FACTOR = 0.5       # batch endpoints bill about half the real-time price
+
+# Incremental re-extraction (see incremental.py): a re-crawled page is diffed
+# block by block (table rows, list items, sections) against the version its
+# formatted_data came from, and only the changed blocks go to the LLM.
+INCREMENTAL_EXTRACTION_ENABLED = False
+INCREMENTAL_MAX_CHANGED_FRACTION = 0.5  # past this share of changed blocks the whole page is re-extracted
+
+# Near-duplicate pages (see near_duplicates.py): a SimHash of each page's
+# markdown is stored with its raw_data; pages of a batch that are near-copies
+# of an earlier page reuse its extraction instead of calling the LLM again.
+NEAR_DUPLICATE_DETECTION_ENABLED = False
+NEAR_DUPLICATE_MAX_DISTANCE = 3  # differing bits (of 64) up to which two pages are near-duplicates
+NEAR_DUPLICATE_SHINGLE_WORDS = 4  # consecutive words hashed together
+NEAR_DUPLICATE_MIN_WORDS = 50  # shorter pages get no fingerprint and are always extracted
+
+# Model cascade (see cascade.py): pages are extracted with the cheapest model
+# first and escalate to the next one only when the output fails validation
+# against the listing schema or leaves too many fields empty.
+CASCADE_MODELS = None          # models to try, in order; None = MODELS_USED, cheapest first
+CASCADE_MAX_EMPTY_FIELD_FRACTION = 0.3
+CASCADE_EMPTY_VALUES = {"", "n/a", "na", "none", "null", "unknown", "-"}
+
+# Timing spans (see tracing.py)
+TRACING_ENABLED = True
+TRACE_MAX_SPANS = 100000       # oldest spans are dropped past this
+PROFILE_OUTPUT_DIR = ".cache/profiles"
+
 # Timeout settings for web scraping
 TIMEOUT_SETTINGS = {
     "page_load": 30,
@@ -20,6 +111,45 @@ TIMEOUT_SETTINGS = {
 
 NUMBER_SCROLL=2
 
+# Maximum number of pages crawled at the same time by the shared crawler
+CRAWL_MAX_CONCURRENCY = 5
+
+# Page cache: crawled markdown is reused for this many seconds (None = forever)
+PAGE_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Revalidate expired pages with ETag / Last-Modified before re-crawling them
+PAGE_CACHE_REVALIDATE = False
+
+# Where scraped_data lives: "supabase" or "sqlite" (a local file, no network).
+# The STORAGE_BACKEND environment variable overrides this.
+STORAGE_BACKEND = "supabase"
+SQLITE_DB_PATH = ".cache/scraped_data.sqlite3"
+
+# Raw markdown is stored compressed in a content-addressed blob store
+# (see blob_store.py); rows keep only the hash and sizes. With Supabase this
+# needs the raw-blobs bucket and its policies (see the setup guide).
+RAW_DATA_BLOBS_ENABLED = False
+# "local" or "supabase" (a Storage bucket); None follows STORAGE_BACKEND
+BLOB_STORE_BACKEND = None
+BLOB_STORE_PATH = ".cache/blobs"
+BLOB_STORE_BUCKET = "raw-blobs"
+
+# Number of unique_names per bulk read query (keeps the `in` filter URL short)
+RAW_DATA_BULK_CHUNK_SIZE = 50
+
+# Write-behind buffer for formatted_data / pagination_data (see write_buffer.py)
+WRITE_BUFFER_MAX_ROWS = 50
+WRITE_BUFFER_FLUSH_SECONDS = 2.0
+WRITE_BUFFER_MAX_RETRIES = 3
+
+# On-disk cache of LLM responses (see llm_cache.py)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = ".cache/llm_responses.sqlite3"
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+LLM_CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+# CSV / NDJSON exports are serialized this many rows at a time (see results.py)
+EXPORT_CHUNK_ROWS = 5000
+
 
 
 
@@ -44,11 +174,11 @@ Analyze the provided markdown text to detect URLs that follow a pattern where on
 If the numbers start from a low value and increment, generate the full sequence of URLs—even if not all numbers are present in the text.
 
 -Construct Complete URLs:
-In cases where only part of a URL is provided, combine it with the given base URL (which will appear at the end of this prompt) to form complete URLs.
+In cases where only part of a URL is provided, combine it with the URL of the page being analyzed (given with the page content) to form complete URLs.
 Ensure that every URL you generate is clickable and leads directly to the intended page.
 
 -Incorporate User Indications:
-If additional user instructions about the pagination mechanism are provided at the end of the prompt, use those instructions to refine your URL generation.
+If additional user instructions about the pagination mechanism are provided with the page content, use those instructions to refine your URL generation.
 Output Format Requirements:
 
 -Strictly output only a valid JSON object with the exact structure below:
@@ -0,0 +1,369 @@
+# batch_jobs.py
+
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import List
+import litellm
+from assets import BATCH_BACKEND, BATCH_JOBS_PATH, BATCH_POLL_SECONDS, BATCH_COMPLETION_WINDOW, BATCH_PRICE_FACTOR, LLM_CACHE_ENABLED
+from chunking import split_for_model
+from llm_cache import get_llm_cache
+from llm_calls import build_batch_request
+from markdown import read_raw_data_bulk
+from resilience import call_with_retries
+from scraper import (get_listing_models, get_extraction_system_message, prepare_page_markdown, merge_listings,
+                     save_formatted_data, failed_page_result, sum_scrape_usage)
+from utils import generate_run_id
+from write_buffer import WriteBuffer
+
+FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchBackend(ABC):
+    """
+    Runs batch job files: one request per line (see build_batch_request),
+    answered with one line per request, in any order:
+        {"custom_id", "response": {"status_code", "body": <chat completion>}, "error"}
+    price_factor scales the real-time token prices for the results' cost:
+    only backends that go through a discounted batch endpoint lower it.
+    """
+
+    price_factor = 1.0
+
+    @abstractmethod
+    def submit(self, job_path: str) -> str:
+        """Starts a job from a job file and returns its id."""
+
+    @abstractmethod
+    def status(self, job_id: str) -> str:
+        """One of "validating", "in_progress", "finalizing", "completed", "failed", "expired", "cancelled"."""
+
+    @abstractmethod
+    def results(self, job_id: str) -> List[dict]:
+        """The output lines of a finished job."""
+
+
+def _response_body(response) -> dict:
+    """A chat completion response as the JSON body a batch output line holds."""
+    usage = getattr(response, "usage", None)
+    body = {
+        "model": getattr(response, "model", None),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": response.choices[0].message.content}}],
+        "usage": None,
+    }
+    if usage is not None:
+        body["usage"] = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+            "completion_tokens": getattr(usage, "completion_tokens", 0),
+            "total_tokens": getattr(usage, "total_tokens", 0),
+        }
+    return body
+
+
+def _request_schema(response_format):
+    """The JSON schema of a batch request's response_format, so its cache key matches call_llm_model's."""
+    if isinstance(response_format, dict) and "json_schema" in response_format:
+        return response_format["json_schema"].get("schema")
+    return response_format
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for a provider batch endpoint, so the batch mode runs
+    offline (with a fake or cached LLM) and without a batch-capable account.
+    Each job is a folder under `root` with input.jsonl, status.json and
+    output.jsonl; its requests are sent one by one on a background thread
+    through litellm.completion, with the usual retries, and answered from
+    the response cache (shared with call_llm_model) when LLM_CACHE_ENABLED.
+    The calls are real-time ones, so they are billed at full price.
+    """
+
+    def __init__(self, root: str = BATCH_JOBS_PATH):
+        self.root = root
+        self._threads = {}
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.root, job_id, name)
+
+    def _write_status(self, job_id: str, status: str, error: str = None) -> None:
+        path = self._path(job_id, "status.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"status": status, "error": error, "updated_at": datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def submit(self, job_path: str) -> str:
+        job_id = f"local-{generate_run_id()}"
+        os.makedirs(os.path.join(self.root, job_id), exist_ok=True)
+        shutil.copyfile(job_path, self._path(job_id, "input.jsonl"))
+        self._write_status(job_id, "in_progress")
+        self._start(job_id)
+        return job_id
+
+    def _start(self, job_id: str) -> None:
+        thread = threading.Thread(target=self._run, args=(job_id,), name=f"batch-{job_id}", daemon=True)
+        self._threads[job_id] = thread
+        thread.start()
+
+    def _run(self, job_id: str) -> None:
+        output_path = self._path(job_id, "output.jsonl")
+        try:
+            with open(self._path(job_id, "input.jsonl"), encoding="utf-8") as source, open(f"{output_path}.tmp", "w", encoding="utf-8") as output:
+                for line in source:
+                    if line.strip():
+                        output.write(json.dumps(self._answer(json.loads(line))) + "\n")
+            os.replace(f"{output_path}.tmp", output_path)
+            self._write_status(job_id, "completed")
+        except Exception as e:
+            self._write_status(job_id, "failed", str(e))
+
+    @staticmethod
+    def _answer(request: dict) -> dict:
+        body = request["body"]
+        cache_key = None
+        if LLM_CACHE_ENABLED:
+            cache_key = get_llm_cache().make_key(body["model"], body["messages"], _request_schema(body.get("response_format")), body.get("max_tokens"))
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                token_counts = cached["token_counts"]
+                answer = {
+                    "model": body["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": cached["parsed_response"]}}],
+                    "usage": {
+                        "prompt_tokens": token_counts["input_tokens"],
+                        "completion_tokens": token_counts["output_tokens"],
+                        "total_tokens": token_counts["input_tokens"] + token_counts["output_tokens"],
+                    },
+                }
+                return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": answer}, "error": None}
+        try:
+            response = call_with_retries(lambda: litellm.completion(**body), body["model"])
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+        answer = _response_body(response)
+        if cache_key is not None and answer["usage"] is not None:
+            usage = answer["usage"]
+            token_counts = {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"], "cached_input_tokens": 0}
+            cost = batch_cost(body["model"], usage["prompt_tokens"], usage["completion_tokens"])
+            get_llm_cache().set(cache_key, answer["choices"][0]["message"]["content"], token_counts, cost)
+        return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": answer}, "error": None}
+
+    def _read_status(self, job_id: str) -> str:
+        with open(self._path(job_id, "status.json"), encoding="utf-8") as f:
+            return json.load(f)["status"]
+
+    def status(self, job_id: str) -> str:
+        status = self._read_status(job_id)
+        thread = self._threads.get(job_id)
+        if status == "in_progress" and (thread is None or not thread.is_alive()):
+            # read again: the thread may have finished since the first read
+            status = self._read_status(job_id)
+            if status == "in_progress":
+                # the process that ran it has stopped: run the job again from the start
+                self._start(job_id)
+        return status
+
+    def results(self, job_id: str) -> List[dict]:
+        with open(self._path(job_id, "output.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI's Batch API (files + batches endpoints) through litellm; OpenAI models only."""
+
+    price_factor = BATCH_PRICE_FACTOR
+
+    def submit(self, job_path: str) -> str:
+        with open(job_path, "rb") as f:
+            uploaded = litellm.create_file(file=f, purpose="batch", custom_llm_provider="openai")
+        batch = litellm.create_batch(completion_window=BATCH_COMPLETION_WINDOW, endpoint="/v1/chat/completions", input_file_id=uploaded.id, custom_llm_provider="openai")
+        return batch.id
+
+    def status(self, job_id: str) -> str:
+        return litellm.retrieve_batch(batch_id=job_id, custom_llm_provider="openai").status
+
+    def results(self, job_id: str) -> List[dict]:
+        batch = litellm.retrieve_batch(batch_id=job_id, custom_llm_provider="openai")
+        lines = []
+        # failed requests are reported in a separate error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = litellm.file_content(file_id=file_id, custom_llm_provider="openai")
+                lines.extend(json.loads(line) for line in content.content.decode("utf-8").splitlines() if line.strip())
+        return lines
+
+
+BATCH_BACKENDS = {"local": LocalBatchBackend, "openai": OpenAIBatchBackend}
+
+_batch_backend = None
+
+def get_batch_backend() -> BatchBackend:
+    """Returns the process-wide batch backend selected by BATCH_BACKEND (or the env variable)."""
+    global _batch_backend
+    if _batch_backend is None:
+        name = (os.getenv("BATCH_BACKEND") or BATCH_BACKEND).lower()
+        if name not in BATCH_BACKENDS:
+            raise ValueError(f"Unknown BATCH_BACKEND '{name}', expected one of {sorted(BATCH_BACKENDS)}")
+        _batch_backend = BATCH_BACKENDS[name]()
+    return _batch_backend
+
+def set_batch_backend(backend: BatchBackend) -> None:
+    """Replaces the process-wide batch backend (e.g. for benchmarks)."""
+    global _batch_backend
+    _batch_backend = backend
+
+
+def batch_cost(model: str, prompt_tokens: int, completion_tokens: int, price_factor: float = 1.0) -> float:
+    """Real-time price of the tokens from litellm's cost map, times price_factor (see BatchBackend)."""
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    except Exception:  # model missing from the cost map
+        return 0.0
+    return (prompt_cost + completion_cost) * price_factor
+
+
+def submit_extraction_job(unique_names: List[str], fields: List[str], selected_model: str, raw_data_map=None, backend: BatchBackend = None) -> dict:
+    """
+    Writes the extraction request of every page with raw_data to a JSONL job
+    file (pruned and chunked like scrape_urls, one line per chunk with
+    custom_id "<unique_name>#<chunk>") and submits it. Returns the job, a
+    JSON-serializable dict to poll and collect it with, even from a later run:
+        {"job_id", "job_path", "model", "fields", "submitted_at",
+         "pages": {unique_name: {"chunks", "pruning"}}, "skipped": [unique_name, ...]}
+    """
+    backend = backend or get_batch_backend()
+    if raw_data_map is None:
+        raw_data_map = read_raw_data_bulk(unique_names)
+    listings_container_model = get_listing_models(tuple(fields))[1]
+    system_message = get_extraction_system_message(tuple(fields))
+
+    os.makedirs(BATCH_JOBS_PATH, exist_ok=True)
+    job_path = os.path.join(BATCH_JOBS_PATH, f"extract_{generate_run_id()}.jsonl")
+    pages = {}
+    skipped = []
+    with open(job_path, "w", encoding="utf-8") as f:
+        for uniq in unique_names:
+            raw_data = raw_data_map.get(uniq, "")
+            if not raw_data:
+                skipped.append(uniq)
+                continue
+            page_markdown, pruning_stats = prepare_page_markdown(uniq, raw_data, fields)
+            chunks = split_for_model(page_markdown, selected_model, system_message)
+            for index, chunk in enumerate(chunks):
+                request = build_batch_request(f"{uniq}#{index}", chunk, listings_container_model, selected_model, system_message)
+                f.write(json.dumps(request) + "\n")
+            pages[uniq] = {"chunks": len(chunks), "pruning": pruning_stats}
+
+    job_id = backend.submit(job_path)
+    GREEN = "\033[32m"
+    RESET = "\033[0m"
+    print(f"{GREEN}INFO:Submitted batch job {job_id} with {len(pages)} pages ({job_path}){RESET}")
+    return {
+        "job_id": job_id,
+        "job_path": job_path,
+        "model": selected_model,
+        "fields": list(fields),
+        "submitted_at": datetime.now(timezone.utc).isoformat(),
+        "pages": pages,
+        "skipped": skipped,
+    }
+
+
+def wait_for_job(job: dict, backend: BatchBackend = None, poll_seconds: float = BATCH_POLL_SECONDS) -> str:
+    """Polls the job every poll_seconds until it finishes; returns its final status."""
+    backend = backend or get_batch_backend()
+    while True:
+        status = backend.status(job["job_id"])
+        if status in FINISHED_STATUSES:
+            return status
+        print(f"INFO:Batch job {job['job_id']} is {status}, checking again in {poll_seconds:.0f}s")
+        time.sleep(poll_seconds)
+
+
+def _chunk_error(line: dict):
+    error = line.get("error")
+    if error:
+        return error.get("message", str(error)) if isinstance(error, dict) else str(error)
+    response = line.get("response") or {}
+    if response.get("status_code", 200) != 200:
+        return f"request failed with status {response.get('status_code')}"
+    return None
+
+
+def _page_result(uniq: str, page: dict, chunk_lines: dict, model: str, listings_container_model, price_factor: float = 1.0) -> dict:
+    """Builds a page's result (like scrape_urls) from the output lines of its chunks."""
+    contents = []
+    token_counts = {"input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0}
+    cost = 0
+    for index in range(page["chunks"]):
+        line = chunk_lines.get(index)
+        if line is None:
+            raise RuntimeError(f"the batch job has no output for chunk {index}")
+        error = _chunk_error(line)
+        if error:
+            raise RuntimeError(error)
+        body = line["response"]["body"]
+        contents.append(body["choices"][0]["message"]["content"])
+        usage = body.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        token_counts["input_tokens"] += prompt_tokens
+        token_counts["output_tokens"] += completion_tokens
+        token_counts["cached_input_tokens"] += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        cost += batch_cost(model, prompt_tokens, completion_tokens, price_factor)
+    parsed = contents[0] if len(contents) == 1 else merge_listings(contents, listings_container_model)
+    return {"unique_name": uniq, "parsed_data": parsed, "token_counts": token_counts, "cost": cost, "pruning": page["pruning"]}
+
+
+def collect_extraction_results(job: dict, backend: BatchBackend = None, write_buffer: WriteBuffer = None, on_result=None):
+    """
+    Maps the output of a finished job back to its pages and stores each one
+    through save_formatted_data. Returns the same
+    (input_tokens, output_tokens, cost, parsed_results) as scrape_urls;
+    pages whose requests failed come back as failed_page_result entries,
+    and on_result gets None for pages skipped for lack of raw_data.
+    """
+    if write_buffer is None:
+        with WriteBuffer() as run_buffer:
+            return collect_extraction_results(job, backend, run_buffer, on_result)
+
+    backend = backend or get_batch_backend()
+    outputs = {}
+    for line in backend.results(job["job_id"]):
+        uniq, _, index = line["custom_id"].rpartition("#")
+        outputs.setdefault(uniq, {})[int(index)] = line
+    listings_container_model = get_listing_models(tuple(job["fields"]))[1]
+
+    results = []
+    for uniq, page in job["pages"].items():
+        try:
+            result = _page_result(uniq, page, outputs.get(uniq, {}), job["model"], listings_container_model, backend.price_factor)
+            save_formatted_data(uniq, result["parsed_data"], write_buffer)
+        except Exception as e:
+            result = failed_page_result(uniq, e)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    if on_result is not None:
+        for _ in job["skipped"]:
+            on_result(None)
+    return sum_scrape_usage(results)
+
+
+def batch_scrape_urls(unique_names: List[str], fields: List[str], selected_model: str, raw_data_map=None, write_buffer: WriteBuffer = None, on_result=None, poll_seconds: float = BATCH_POLL_SECONDS):
+    """
+    Batch-job version of scrape_urls: submits every page as one job, waits
+    for it and collects the results. Returns the same
+    (input_tokens, output_tokens, cost, parsed_results). Meant for large
+    offline runs: no per-request rate limiting, batch prices on a real batch
+    endpoint, but results only come once the whole job is done.
+    """
+    backend = get_batch_backend()
+    job = submit_extraction_job(unique_names, fields, selected_model, raw_data_map, backend)
+    status = wait_for_job(job, backend, poll_seconds)
+    if status != "completed":
+        raise RuntimeError(f"Batch job {job['job_id']} ended as {status}")
+    return collect_extraction_results(job, backend, write_buffer, on_result)
@@ -0,0 +1,128 @@
+# benchmarks/fake_llm.py
+"""
+Stand-in for litellm.completion / acompletion, so LLM-bound code can be
+benchmarked without paid API calls.
+
+Each call sleeps for a configurable latency and answers with JSON that
+matches the requested response_format. Responses can be recorded to a JSON
+lines file and replayed from it, so two runs see exactly the same outputs.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+import litellm
+import llm_calls
+from llm_cache import LLMResponseCache
+
+# flat price used instead of litellm's cost map
+COST_PER_INPUT_TOKEN = 0.15 / 1_000_000
+COST_PER_OUTPUT_TOKEN = 0.60 / 1_000_000
+
+
+def _response_properties(response_format) -> dict:
+    if hasattr(response_format, "model_json_schema"):
+        return response_format.model_json_schema()
+    if isinstance(response_format, dict) and "json_schema" in response_format:
+        # the JSON-schema form used in batch job files
+        return response_format["json_schema"].get("schema", {})
+    return response_format or {}
+
+
+class FakeLLM:
+    """
+    Args:
+        latency: seconds each call takes
+        jitter: +/- fraction of the latency, drawn from a seeded RNG
+        listings_per_response: listings returned for listing extraction
+        replay_path: JSON lines {"key", "content"} to answer from when the request matches
+        record_path: JSON lines file every answer is appended to (for later replay)
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, listings_per_response: int = 20, replay_path: str = None, record_path: str = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.listings_per_response = listings_per_response
+        self.record_path = record_path
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._replay = {}
+        if replay_path:
+            with open(replay_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._replay[entry["key"]] = entry["content"]
+        self._originals = None
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _content(self, model, messages, response_format, max_tokens) -> str:
+        key = LLMResponseCache.make_key(model, messages, response_format, max_tokens)
+        if key in self._replay:
+            return self._replay[key]
+        schema = _response_properties(response_format)
+        properties = schema.get("properties", {})
+        if "page_urls" in properties:
+            content = json.dumps({"page_urls": []})
+        elif "listings" in properties:
+            item_ref = properties["listings"].get("items", {}).get("$ref", "")
+            item_schema = schema.get("$defs", {}).get(item_ref.split("/")[-1], {})
+            fields = list(item_schema.get("properties", {})) or ["value"]
+            content = json.dumps({"listings": [{field: f"{field} {index}" for field in fields} for index in range(self.listings_per_response)]})
+        else:
+            content = json.dumps({})
+        if self.record_path:
+            with self._lock, open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "content": content}) + "\n")
+        return content
+
+    def _response(self, model, messages, response_format=None, max_tokens=None, **kwargs):
+        content = self._content(model, messages, response_format, max_tokens)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def completion(self, model, messages, response_format=None, max_tokens=None, **kwargs):
+        time.sleep(self._delay())
+        return self._response(model, messages, response_format, max_tokens)
+
+    async def acompletion(self, model, messages, response_format=None, max_tokens=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._response(model, messages, response_format, max_tokens)
+
+    @staticmethod
+    def completion_cost(completion_response=None, **kwargs) -> float:
+        usage = completion_response.usage
+        return usage.prompt_tokens * COST_PER_INPUT_TOKEN + usage.completion_tokens * COST_PER_OUTPUT_TOKEN
+
+    def install(self) -> None:
+        """Routes litellm calls (and llm_calls' imported names) to this fake."""
+        self._originals = (litellm.completion, litellm.acompletion, llm_calls.completion, llm_calls.acompletion, llm_calls.completion_cost)
+        litellm.completion = llm_calls.completion = self.completion
+        litellm.acompletion = llm_calls.acompletion = self.acompletion
+        llm_calls.completion_cost = self.completion_cost
+
+    def uninstall(self) -> None:
+        if self._originals is not None:
+            litellm.completion, litellm.acompletion, llm_calls.completion, llm_calls.acompletion, llm_calls.completion_cost = self._originals
+            self._originals = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.uninstall()
+        return False
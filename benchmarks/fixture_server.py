@@ -0,0 +1,103 @@
+# benchmarks/fixture_server.py
+"""
+Local HTTP server serving deterministic fixture pages, so crawling can be
+benchmarked without live sites.
+
+    /catalog/<name>?page=<n>   a listing page with LISTINGS_PER_PAGE products,
+                               site navigation, a cookie banner, a footer and
+                               links to pages 1..PAGES_PER_CATALOG
+"""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+LISTINGS_PER_PAGE = 20
+PAGES_PER_CATALOG = 5
+
+
+def render_listing_page(name: str, page: int) -> str:
+    """The HTML of one catalog page; the same (name, page) always gives the same bytes."""
+    cards = []
+    for index in range(LISTINGS_PER_PAGE):
+        number = (page - 1) * LISTINGS_PER_PAGE + index + 1
+        cards.append(
+            f'<div class="product"><h2><a href="/product/{name}/{number}">Product {name} #{number}</a></h2>'
+            f'<img src="/img/{number}.jpg" alt="Product {number}">'
+            f'<p class="price">${(number * 37) % 500 + 9.99:.2f}</p>'
+            f'<p class="rating">{(number % 5) + 1} stars from {number * 3} reviews</p>'
+            f'<p class="description">Fixture product {number} of catalog {name}, in stock and ready to ship.</p></div>'
+        )
+    pages = " ".join(f'<a href="/catalog/{name}?page={n}">{n}</a>' for n in range(1, PAGES_PER_CATALOG + 1))
+    return (
+        f"<!DOCTYPE html><html><head><title>Catalog {name} - page {page}</title></head><body>"
+        '<nav><a href="/">Home</a> <a href="/about">About</a> <a href="/contact">Contact</a></nav>'
+        '<div class="cookie">We use cookies to improve your experience. <a href="/privacy">Privacy policy</a></div>'
+        f"<h1>Catalog {name}, page {page}</h1>"
+        f'<main>{"".join(cards)}</main>'
+        f'<div class="pagination">{pages} <a href="/catalog/{name}?page={min(page + 1, PAGES_PER_CATALOG)}">Next</a></div>'
+        "<footer>© Fixture Shop. All rights reserved. Subscribe to our newsletter.</footer>"
+        "</body></html>"
+    )
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if len(segments) != 2 or segments[0] != "catalog":
+            self.send_error(404)
+            return
+        try:
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+        except ValueError:
+            page = 1
+        body = render_listing_page(segments[1], page).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", f'"{segments[1]}-{page}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+
+class FixtureServer:
+    """
+    Runs the fixture server on a background thread.
+
+    Usage:
+        with FixtureServer() as server:
+            urls = server.catalog_urls(100)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), FixtureHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def catalog_urls(self, count: int, prefix: str = "c") -> list:
+        """`count` distinct catalog start URLs; a new prefix gives URLs never crawled before."""
+        return [f"{self.base_url}/catalog/{prefix}{index}?page=1" for index in range(count)]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
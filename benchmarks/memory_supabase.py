@@ -0,0 +1,150 @@
+# benchmarks/memory_supabase.py
+"""
+In-memory stand-in for the Supabase client, covering the calls
+SupabaseStorage and SupabaseBlobStore make. Every execute() / storage
+call can sleep for a fixed round-trip latency, to model a remote database.
+"""
+
+import copy
+import threading
+import time
+from types import SimpleNamespace
+
+
+class _Query:
+    def __init__(self, table: "_Table", action: str, payload=None, on_conflict: str = None):
+        self._table = table
+        self._action = action
+        self._payload = payload
+        self._on_conflict = on_conflict
+        self._columns = None
+        self._filters = []
+
+    def select(self, columns: str = "*"):
+        self._columns = None if columns.strip() == "*" else [column.strip() for column in columns.split(",")]
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    @property
+    def not_(self):
+        return _Not(self)
+
+    def execute(self):
+        return self._table.client._execute(self)
+
+
+class _Not:
+    def __init__(self, query: _Query):
+        self._query = query
+
+    def is_(self, column: str, value):
+        if value == "null":
+            self._query._filters.append(lambda row: row.get(column) is not None)
+        else:
+            self._query._filters.append(lambda row: row.get(column) != value)
+        return self._query
+
+
+class _Table:
+    def __init__(self, client: "InMemorySupabaseClient", name: str):
+        self.client = client
+        self.name = name
+
+    def select(self, columns: str = "*"):
+        return _Query(self, "select").select(columns)
+
+    def upsert(self, rows, on_conflict: str = "id"):
+        return _Query(self, "upsert", rows if isinstance(rows, list) else [rows], on_conflict)
+
+    def update(self, values: dict):
+        return _Query(self, "update", values)
+
+
+class _Bucket:
+    def __init__(self, client: "InMemorySupabaseClient", name: str):
+        self.client = client
+        self.name = name
+
+    def _objects(self) -> dict:
+        return self.client.buckets.setdefault(self.name, {})
+
+    def list(self, folder: str = "", options: dict = None):
+        self.client._round_trip()
+        search = (options or {}).get("search", "")
+        prefix = f"{folder}/" if folder else ""
+        with self.client.lock:
+            objects = [(path[len(prefix):], len(data)) for path, data in self._objects().items() if path.startswith(prefix)]
+        # Supabase reports the object size in its metadata
+        return [{"name": name, "metadata": {"size": size}} for name, size in objects if search in name and "/" not in name]
+
+    def upload(self, path: str, data: bytes, options: dict = None):
+        self.client._round_trip()
+        with self.client.lock:
+            self._objects()[path] = bytes(data)
+        return {"Key": f"{self.name}/{path}"}
+
+    def download(self, path: str) -> bytes:
+        self.client._round_trip()
+        with self.client.lock:
+            return self._objects()[path]
+
+
+class InMemorySupabaseClient:
+    """
+    Tables are lists of row dicts; rows are matched on the upsert's
+    on_conflict column, like PostgREST does.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables = {}
+        self.buckets = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.storage = SimpleNamespace(from_=lambda bucket: _Bucket(self, bucket))
+
+    def table(self, name: str) -> _Table:
+        return _Table(self, name)
+
+    def _round_trip(self) -> None:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _execute(self, query: _Query):
+        self._round_trip()
+        with self.lock:
+            rows = self.tables.setdefault(query._table.name, [])
+            if query._action == "select":
+                data = [row for row in rows if all(match(row) for match in query._filters)]
+                if query._columns is not None:
+                    data = [{column: row.get(column) for column in query._columns} for row in data]
+                return SimpleNamespace(data=copy.deepcopy(data))
+            if query._action == "update":
+                data = []
+                for row in rows:
+                    if all(match(row) for match in query._filters):
+                        row.update(copy.deepcopy(query._payload))
+                        data.append(row)
+                return SimpleNamespace(data=copy.deepcopy(data))
+            # upsert
+            key = query._on_conflict
+            index = {row.get(key): row for row in rows}
+            for new_row in query._payload:
+                new_row = copy.deepcopy(new_row)
+                existing = index.get(new_row.get(key))
+                if existing is None:
+                    rows.append(new_row)
+                    index[new_row.get(key)] = new_row
+                else:
+                    existing.update(new_row)
+            return SimpleNamespace(data=copy.deepcopy(query._payload))
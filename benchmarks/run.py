@@ -0,0 +1,190 @@
+# benchmarks/run.py
+"""
+Offline benchmark of the fetch / scrape / paginate pipeline.
+
+Pages come from a local fixture server (fixture_server.py), LLM calls from a
+fake with fixed latency (fake_llm.py) and the database from an in-memory
+Supabase stand-in (memory_supabase.py), so results don't depend on live
+sites or paid APIs. For each batch size the stages are timed separately:
+
+    fetch     fetch_and_store_markdowns   latency = each page's crawl span
+    scrape    scrape_urls(parallel=True)  latency = time until the page's result
+    paginate  paginate_urls(parallel=True) latency = time until the page's result
+
+and reported as JSON: seconds, URLs/second, p50/p95 latency and peak
+Python memory (tracemalloc) per stage, plus the commit and settings used,
+so runs can be compared over time.
+
+Run from the repository root:
+    python -m benchmarks.run --sizes 10,100,1000 --output benchmarks/results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.common import REPO_ROOT, git_commit, percentile
+
+sys.path.insert(0, REPO_ROOT)
+# never download litellm's model cost map during a benchmark
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from assets import MODELS_USED, CRAWL_MAX_CONCURRENCY
+import rate_limits
+from benchmarks.fake_llm import FakeLLM
+from benchmarks.fixture_server import FixtureServer, render_listing_page
+from benchmarks.memory_supabase import InMemorySupabaseClient
+
+DEFAULT_FIELDS = ["name", "price", "rating"]
+
+
+def measure(stage: str, size: int, run, latencies_of) -> dict:
+    """Runs one stage and returns its result row."""
+    from tracing import set_run_id
+    run_id = f"bench-{stage}-{size}-{time.time_ns()}"
+    set_run_id(run_id)
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = latencies_of(run_id, started)
+    return {
+        "stage": stage,
+        "urls": size,
+        "seconds": round(seconds, 4),
+        "urls_per_second": round(size / seconds, 2) if seconds else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def run_size(size: int, server: FixtureServer, args) -> list:
+    from markdown import fetch_and_store_markdowns, save_raw_data
+    from scraper import scrape_urls
+    from pagination import paginate_urls
+    from tracing import get_tracer
+    from utils import generate_unique_name
+
+    # a fresh prefix per size, so no page or LLM response is cached from a smaller run
+    urls = server.catalog_urls(size, prefix=f"s{size}-")
+    unique_names = [generate_unique_name(url) for url in urls]
+    results = []
+
+    if args.no_crawl:
+        # no browser available: store the fixture HTML as the page content
+        for url, name in zip(urls, unique_names):
+            save_raw_data(name, url, render_listing_page(url.split("/")[-1].split("?")[0], 1))
+    else:
+        def crawl_latencies(run_id, started):
+            return [span["duration"] for span in get_tracer().spans(run_id) if span["name"] == "crawl"]
+        results.append(measure("fetch", size, lambda: fetch_and_store_markdowns(urls, args.crawl_concurrency), crawl_latencies))
+
+    finished = []
+
+    def on_result(result):
+        finished.append(time.perf_counter())
+
+    def result_latencies(run_id, started):
+        latencies = [at - started for at in finished]
+        finished.clear()
+        return latencies
+
+    if "scrape" in args.stages:
+        results.append(measure("scrape", size, lambda: scrape_urls(unique_names, args.fields, args.model, parallel=True, on_result=on_result), result_latencies))
+    if "paginate" in args.stages:
+        results.append(measure("paginate", size, lambda: paginate_urls(unique_names, args.model, args.pagination_details, urls, parallel=True, on_result=on_result), result_latencies))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the scraping pipeline.")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated batch sizes")
+    parser.add_argument("--stages", default="scrape,paginate", help="LLM stages to run after fetching (scrape, paginate)")
+    parser.add_argument("--model", default=list(MODELS_USED)[0], choices=list(MODELS_USED))
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="Comma-separated fields to extract")
+    parser.add_argument("--pagination-details", default="", help="Indications given to pagination (non-empty forces the LLM path)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="+/- fraction of the LLM latency")
+    parser.add_argument("--llm-concurrency", type=int, default=10, help="Concurrent fake LLM calls (rate limits are lifted)")
+    parser.add_argument("--respect-rate-limits", action="store_true", help="Keep the configured provider rate limits")
+    parser.add_argument("--replay", help="JSON lines of recorded LLM responses to replay")
+    parser.add_argument("--record", help="Append every LLM response served to this JSON lines file")
+    parser.add_argument("--storage", default="supabase", choices=["supabase", "sqlite"], help="supabase = in-memory stand-in")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Seconds per stand-in database round trip")
+    parser.add_argument("--crawl-concurrency", type=int, default=CRAWL_MAX_CONCURRENCY)
+    parser.add_argument("--no-crawl", action="store_true", help="Skip the fetch stage and seed storage with the fixture pages")
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.stages = {stage.strip() for stage in args.stages.split(",") if stage.strip()}
+    args.fields = [field.strip() for field in args.fields.split(",") if field.strip()]
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    for path_arg in ("replay", "record"):
+        if getattr(args, path_arg):
+            setattr(args, path_arg, os.path.abspath(getattr(args, path_arg)))
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    for key_names in MODELS_USED.values():
+        for key_name in key_names:
+            os.environ.setdefault(key_name, "benchmark")
+    if not args.respect_rate_limits:
+        for key_names in MODELS_USED.values():
+            for key_name in key_names:
+                rate_limits.PROVIDER_RATE_LIMITS[key_name] = {"max_concurrency": args.llm_concurrency, "rpm": None, "tpm": None}
+
+    # every cache (.cache/...) lives in a scratch directory, so runs start cold
+    workdir = tempfile.mkdtemp(prefix="scraper-bench-")
+    os.chdir(workdir)
+
+    from storage import SupabaseStorage, SQLiteStorage, set_storage
+    from blob_store import SupabaseBlobStore, LocalBlobStore, set_blob_store
+    client = InMemorySupabaseClient(latency=args.db_latency)
+    if args.storage == "sqlite":
+        set_storage(SQLiteStorage(os.path.join(workdir, "bench.sqlite3")))
+        set_blob_store(LocalBlobStore(os.path.join(workdir, "blobs")))
+    else:
+        set_storage(SupabaseStorage(client=client))
+        set_blob_store(SupabaseBlobStore(client=client))
+
+    results = []
+    with FixtureServer() as server, FakeLLM(latency=args.llm_latency, jitter=args.llm_jitter, replay_path=args.replay, record_path=args.record) as fake_llm:
+        for size in args.sizes:
+            results.extend(run_size(size, server, args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {key: sorted(value) if isinstance(value, set) else value for key, value in vars(args).items()},
+            "llm_calls": fake_llm.calls,
+            "db_requests": client.requests,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# benchmarks/startup.py
+"""
+Startup benchmark of the Streamlit app.
+
+Each sample runs streamlit_app.py in a fresh interpreter with Streamlit's
+AppTest harness and measures:
+
+    first_render_s   time from interpreter start to the first complete render
+                     (imports included), i.e. what a cold process pays
+    rerun_s          one more run of the script in the same process, i.e.
+                     what every widget interaction pays
+    heavy_modules    which heavy packages the first render loaded
+
+and reports p50/p95 over the samples as JSON.
+
+Run from the repository root:
+    python -m benchmarks.startup --samples 5 --output benchmarks/startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from benchmarks.common import REPO_ROOT, git_commit, percentile
+
+HEAVY_MODULES = ("litellm", "crawl4ai", "pandas", "supabase", "tiktoken", "httpx", "pyarrow")
+
+SAMPLE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("streamlit_app.py", default_timeout=120)
+app.run()
+first_render = time.perf_counter() - started
+loaded = [name for name in {heavy!r} if name in sys.modules]
+started = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - started
+print(json.dumps({{"first_render_s": first_render, "rerun_s": rerun, "heavy_modules": loaded, "exceptions": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def run_sample() -> dict:
+    output = subprocess.check_output(
+        [sys.executable, "-c", SAMPLE_SCRIPT.format(heavy=HEAVY_MODULES)],
+        cwd=REPO_ROOT, text=True,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time to first render of the Streamlit app.")
+    parser.add_argument("--samples", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    samples = [run_sample() for _ in range(args.samples)]
+    first_renders = [sample["first_render_s"] for sample in samples]
+    reruns = [sample["rerun_s"] for sample in samples]
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "samples": args.samples,
+        },
+        "results": {
+            "first_render_p50_s": round(percentile(first_renders, 0.50), 4),
+            "first_render_p95_s": round(percentile(first_renders, 0.95), 4),
+            "rerun_p50_s": round(percentile(reruns, 0.50), 4),
+            "rerun_p95_s": round(percentile(reruns, 0.95), 4),
+            "heavy_modules_loaded": sorted({name for sample in samples for name in sample["heavy_modules"]}),
+            "exceptions": sorted({error for sample in samples for error in sample["exceptions"]}),
+        },
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(os.path.abspath(args.output), "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
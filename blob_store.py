@@ -0,0 +1,203 @@
+# blob_store.py
+
+import hashlib
+import mmap
+import os
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from api_management import get_supabase_client
+from assets import BLOB_STORE_BACKEND, BLOB_STORE_PATH, BLOB_STORE_BUCKET
+from storage import get_storage_backend_name
+from tracing import get_tracer
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+# every zstd frame starts with these bytes; zlib streams never do
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress(data: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+
+def detect_codec(data) -> str:
+    """The codec a blob was written with, read from its first bytes."""
+    return "zstd" if data[:len(ZSTD_MAGIC)] == ZSTD_MAGIC else "zlib"
+
+
+def decompress(data) -> bytes:
+    """
+    Decompresses bytes or any buffer (e.g. an mmap) without copying it first.
+    The codec is detected from the data, so blobs stay readable whichever
+    DEFAULT_CODEC wrote them.
+    """
+    if detect_codec(data) == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This blob is zstd-compressed; install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def is_blob_reference(raw_data) -> bool:
+    """True if a raw_data value is blob metadata rather than inline markdown."""
+    return isinstance(raw_data, dict) and "blob" in raw_data
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed store of compressed page content. Blobs are named by the
+    SHA-256 of their uncompressed content, so identical pages are stored once.
+    """
+
+    @abstractmethod
+    def _stored_size(self, digest: str):
+        """Size in bytes of the stored blob, or None if there is none."""
+
+    @abstractmethod
+    def _write(self, digest: str, data: bytes) -> None: ...
+
+    @abstractmethod
+    def _read(self, digest: str) -> bytes: ...
+
+    def put_text(self, text: str) -> dict:
+        """
+        Stores text and returns the metadata kept in the row instead of it:
+            {"blob": sha256, "size": int, "stored_size": int}
+        The codec is not recorded: a blob seen before keeps the one it was
+        first written with, and reads detect it (see decompress).
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        # a page seen before is not compressed again
+        stored_size = self._stored_size(digest)
+        if stored_size is None:
+            compressed = compress(data, DEFAULT_CODEC)
+            self._write(digest, compressed)
+            stored_size = len(compressed)
+        return {"blob": digest, "size": len(data), "stored_size": stored_size}
+
+    def get_text(self, reference: dict) -> str:
+        return self._read(reference["blob"]).decode("utf-8")
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under a local directory; reads memory-map the file."""
+
+    def __init__(self, root: str = BLOB_STORE_PATH):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _stored_size(self, digest: str):
+        try:
+            return os.path.getsize(self._path(digest))
+        except FileNotFoundError:
+            return None
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so readers never see a partial blob
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read(self, digest: str) -> bytes:
+        with open(self._path(digest), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return decompress(mapped)
+
+
+class SupabaseBlobStore(BlobStore):
+    """Blobs as objects in a Supabase Storage bucket."""
+
+    def __init__(self, bucket: str = BLOB_STORE_BUCKET, client=None):
+        self.bucket = bucket
+        self._client = client
+
+    def _storage(self):
+        if self._client is None:
+            self._client = get_supabase_client()
+        return self._client.storage.from_(self.bucket)
+
+    def _stored_size(self, digest: str):
+        folder, name = digest[:2], digest[2:]
+        for item in self._storage().list(folder, {"search": name}):
+            if item.get("name") == name:
+                return (item.get("metadata") or {}).get("size", 0)
+        return None
+
+    def _write(self, digest: str, data: bytes) -> None:
+        self._storage().upload(f"{digest[:2]}/{digest[2:]}", data, {"content-type": "application/octet-stream", "upsert": "true"})
+
+    def _read(self, digest: str) -> bytes:
+        return decompress(self._storage().download(f"{digest[:2]}/{digest[2:]}"))
+
+
+class RawDataMap(Mapping):
+    """
+    {unique_name: raw_data} whose blob-backed values are only fetched and
+    decompressed the first time they are looked up.
+    """
+
+    def __init__(self, rows: dict, blob_store: BlobStore):
+        self._rows = rows
+        self._blob_store = blob_store
+        self._loaded = {}
+
+    def __getitem__(self, unique_name: str) -> str:
+        if unique_name not in self._loaded:
+            self._loaded[unique_name] = resolve_raw_data(self._rows[unique_name], self._blob_store)
+        return self._loaded[unique_name]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+def resolve_raw_data(raw_data, blob_store: BlobStore = None) -> str:
+    """Returns the markdown of a raw_data value, reading it from the blob store if needed."""
+    if is_blob_reference(raw_data):
+        with get_tracer().span("storage.read", column="blob", bytes=raw_data["size"], stored_bytes=raw_data["stored_size"]):
+            return (blob_store or get_blob_store()).get_text(raw_data)
+    return raw_data or ""
+
+
+BLOB_STORES = {
+    "local": LocalBlobStore,
+    "supabase": SupabaseBlobStore,
+}
+
+_blob_store = None
+
+def get_blob_store() -> BlobStore:
+    """
+    Returns the process-wide blob store selected by BLOB_STORE_BACKEND;
+    by default blobs live next to the rows (local for sqlite, supabase otherwise).
+    """
+    global _blob_store
+    if _blob_store is None:
+        name = os.getenv("BLOB_STORE_BACKEND") or BLOB_STORE_BACKEND
+        if not name:
+            name = "local" if get_storage_backend_name() == "sqlite" else "supabase"
+        name = name.lower()
+        if name not in BLOB_STORES:
+            raise ValueError(f"Unknown BLOB_STORE_BACKEND '{name}', expected one of {sorted(BLOB_STORES)}")
+        _blob_store = BLOB_STORES[name]()
+    return _blob_store
+
+def set_blob_store(blob_store: BlobStore) -> None:
+    """Replaces the process-wide blob store (e.g. for benchmarks)."""
+    global _blob_store
+    _blob_store = blob_store
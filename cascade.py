@@ -0,0 +1,113 @@
+# cascade.py
+
+import json
+from typing import List
+from pydantic import ValidationError
+from assets import MODELS_USED, CASCADE_MODELS, CASCADE_MAX_EMPTY_FIELD_FRACTION, CASCADE_EMPTY_VALUES
+from api_management import get_api_key
+
+
+def _price_per_token(model: str) -> float:
+    """Input + output price per token from litellm's cost map; unknown models sort last."""
+    import litellm
+    info = litellm.model_cost.get(model)
+    if not info:
+        return float("inf")
+    return (info.get("input_cost_per_token") or 0) + (info.get("output_cost_per_token") or 0)
+
+
+def get_cascade_models(fallback_model: str = None) -> List[str]:
+    """
+    The models tried in cascade mode, in order: CASCADE_MODELS, or every entry
+    of MODELS_USED from cheapest to most expensive. Models without an API key
+    are left out; if none has one, only fallback_model is used.
+    """
+    models = CASCADE_MODELS or sorted(MODELS_USED, key=_price_per_token)
+    models = [model for model in models if model in MODELS_USED and get_api_key(model)]
+    if not models and fallback_model:
+        return [fallback_model]
+    return models
+
+
+def _is_empty(value) -> bool:
+    return value is None or str(value).strip().lower() in CASCADE_EMPTY_VALUES
+
+
+def validate_extraction(parsed, listings_container_model, fields: List[str]):
+    """
+    Checks one model's output for a page against the listings container.
+    Returns (accepted, reason, empty_fraction):
+        reason is None when accepted, else "invalid output", "no listings"
+        or "empty fields"; empty_fraction is the share of listing fields
+        that are missing or placeholders like "N/A".
+    """
+    try:
+        if isinstance(parsed, str):
+            parsed = json.loads(parsed)
+        elif hasattr(parsed, "model_dump"):
+            parsed = parsed.model_dump()
+        listings_container_model.model_validate(parsed)
+    except (json.JSONDecodeError, ValidationError):
+        return False, "invalid output", 1.0
+
+    listings = parsed.get("listings", [])
+    values = [listing.get(field) for listing in listings for field in fields]
+    if not values:
+        return False, "no listings", 1.0
+    empty_fraction = sum(1 for value in values if _is_empty(value)) / len(values)
+    if empty_fraction > CASCADE_MAX_EMPTY_FIELD_FRACTION:
+        return False, "empty fields", empty_fraction
+    return True, None, empty_fraction
+
+
+def pick_cascade_result(attempts: List[dict]) -> dict:
+    """
+    The attempt whose output is kept: the accepted one, or when every tier
+    failed, the valid output with the fewest empty fields (later tiers win
+    ties). Tiers whose call raised (reason "error") come last.
+    """
+    for attempt in attempts:
+        if attempt["accepted"]:
+            return attempt
+    return min(attempts, key=lambda attempt: (attempt["reason"] == "error", attempt["reason"] == "invalid output", attempt["empty_fraction"], -attempt["tier"]))
+
+
+def summarize_cascade(parsed_results, totals: dict = None) -> dict:
+    """
+    Adds up the cascade attempts of a run's results, per model:
+        {model: {"tier", "attempts", "accepted", "seconds", "cost"}}
+    Pass the totals of earlier batches to keep adding to them.
+    """
+    totals = {} if totals is None else totals
+    for result in parsed_results:
+        cascade = result.get("cascade") if isinstance(result, dict) else None
+        if not cascade:
+            continue
+        for attempt in cascade["attempts"]:
+            model_totals = totals.setdefault(attempt["model"], {"tier": attempt["tier"], "attempts": 0, "accepted": 0, "seconds": 0.0, "cost": 0})
+            model_totals["attempts"] += 1
+            model_totals["accepted"] += 1 if attempt["accepted"] else 0
+            model_totals["seconds"] += attempt["seconds"]
+            model_totals["cost"] += attempt["cost"]
+    return totals
+
+
+def cascade_tier_rows(totals: dict) -> List[dict]:
+    """
+    One row per tier for display, cheapest first:
+        {"tier", "model", "attempts", "accepted", "hit_rate", "mean_latency_s", "cost"}
+    hit_rate is the share of pages reaching the tier that it accepted.
+    """
+    rows = []
+    for model, model_totals in sorted(totals.items(), key=lambda item: item[1]["tier"]):
+        attempts = model_totals["attempts"]
+        rows.append({
+            "tier": model_totals["tier"],
+            "model": model,
+            "attempts": attempts,
+            "accepted": model_totals["accepted"],
+            "hit_rate": round(model_totals["accepted"] / attempts, 3) if attempts else None,
+            "mean_latency_s": round(model_totals["seconds"] / attempts, 3) if attempts else None,
+            "cost": round(model_totals["cost"], 6),
+        })
+    return rows
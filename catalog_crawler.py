@@ -0,0 +1,177 @@
+# catalog_crawler.py
+
+import asyncio
+from typing import List
+from assets import (CRAWL_MAX_CONCURRENCY, PAGE_CACHE_TTL_SECONDS, CATALOG_MAX_PAGES, CATALOG_MAX_DEPTH, CATALOG_EXTRACT_CONCURRENCY)
+from markdown import crawl_urls_async, read_cached_page, is_cache_fresh, read_raw_data, save_raw_data
+from scraper import get_listing_models, ascrape_page, sum_scrape_usage, read_formatted_data_bulk, duplicate_page_result, failed_page_result
+from cascade import get_cascade_models
+from near_duplicates import simhash, SimHashIndex
+from pagination import apaginate_page, get_page_urls, sum_pagination_usage
+from utils import canonicalize_url, generate_unique_name, run_async
+from write_buffer import WriteBuffer
+
+
+async def acrawl_catalog(urls: List[str], fields: List[str], selected_model: str, indication: str = "", max_pages: int = CATALOG_MAX_PAGES, max_depth: int = CATALOG_MAX_DEPTH, crawl_concurrency: int = CRAWL_MAX_CONCURRENCY, extract_concurrency: int = CATALOG_EXTRACT_CONCURRENCY, force_refresh: bool = False, ttl_seconds=PAGE_CACHE_TTL_SECONDS, cascade: bool = False,
+                        incremental: bool = False, dedupe: bool = False) -> dict:
+    """
+    Crawls a whole paginated catalog as one pipelined job:
+      1) fetch workers crawl pages (or reuse cached ones) with one shared browser
+      2) each fetched page is queued for extraction right away, so listings are
+         parsed while later pages are still being fetched
+      3) pages less than `max_depth` hops from a start URL get their pagination
+         detected, and the page URLs found are queued for fetching
+    Page URLs are de-duplicated on their canonical form, and at most
+    `max_pages` pages are fetched in total. With no `fields`, pages are only
+    fetched and paginated. With cascade=True extraction goes through the model
+    cascade (see scrape_urls); pagination always uses selected_model. With
+    incremental=True a page extracted before only sends its changed blocks
+    (see scrape_urls). With dedupe=True a page that is a near-duplicate of a
+    page extracted earlier in the crawl reuses its listings; pages are
+    compared as they are fetched, so the first copy fetched is canonical.
+
+    Returns:
+        {"scrape_usage": {"input_tokens", "output_tokens", "cost"},
+         "pagination_usage": {"input_tokens", "output_tokens", "cost"},
+         "parsed_results": [...],       # like scrape_urls (failed pages included), in discovery order
+         "pagination_results": [...],   # like paginate_urls, in discovery order
+         "pages": [{"url", "unique_name", "depth", "status", "error"}, ...]}
+    """
+    listings_container_model = None
+    if fields:
+        listings_container_model = get_listing_models(tuple(fields))[1]
+    cascade_models = get_cascade_models(selected_model) if cascade else None
+
+    fetch_queue = asyncio.Queue()
+    extract_queue = asyncio.Queue()
+    seen = set()
+    pages = []
+    scrape_results = {}
+    pagination_results = {}
+    # near-duplicate detection: fingerprints of the canonical pages, and an
+    # event per canonical page set once its result is in scrape_results
+    dedupe_index = SimHashIndex() if dedupe else None
+    canonical_done = {}
+
+    def enqueue(url: str, depth: int) -> None:
+        key = canonicalize_url(url)
+        if key in seen or len(seen) >= max_pages:
+            return
+        seen.add(key)
+        page = {"url": url, "unique_name": generate_unique_name(url), "depth": depth, "status": "queued", "error": None}
+        page["index"] = len(pages)
+        pages.append(page)
+        fetch_queue.put_nowait(page)
+
+    for url in urls:
+        enqueue(url, 0)
+
+    async def fetch_page(page: dict, crawler) -> str:
+        uniq = page["unique_name"]
+        if not force_refresh:
+            cached_row = await asyncio.to_thread(read_cached_page, uniq)
+            if cached_row is not None and is_cache_fresh(cached_row, ttl_seconds):
+                page["status"] = "cached"
+                return await asyncio.to_thread(read_raw_data, uniq)
+        result = (await crawl_urls_async([page["url"]], 1, crawler=crawler))[0]
+        if not result["success"]:
+            page["status"] = "failed"
+            page["error"] = result["error"]
+            return ""
+        headers = {key.lower(): value for key, value in result["headers"].items()}
+        await asyncio.to_thread(save_raw_data, uniq, page["url"], result["markdown"], headers.get("etag"), headers.get("last-modified"))
+        page["status"] = "crawled"
+        return result["markdown"]
+
+    async def fetch_worker(crawler, write_buffer):
+        while True:
+            page = await fetch_queue.get()
+            queued = False
+            try:
+                raw_data = await fetch_page(page, crawler)
+                if page["status"] == "failed" and listings_container_model is not None:
+                    scrape_results[page["index"]] = failed_page_result(page["unique_name"], RuntimeError(page["error"]))
+                if raw_data and listings_container_model is not None:
+                    fingerprint = await asyncio.to_thread(simhash, raw_data) if dedupe else None
+                    # no await from here to the put: a canonical page is
+                    # always queued before its duplicates
+                    canonical = None
+                    if fingerprint is not None:
+                        matches = dedupe_index.find(fingerprint)
+                        if matches:
+                            canonical = matches[0][0]
+                        else:
+                            dedupe_index.add(page["index"], fingerprint)
+                            canonical_done[page["index"]] = asyncio.Event()
+                    extract_queue.put_nowait((page, raw_data, canonical))
+                    queued = True
+                if raw_data and page["depth"] < max_depth:
+                    result = await apaginate_page(page["unique_name"], raw_data, page["url"], selected_model, indication, write_buffer)
+                    pagination_results[page["index"]] = result
+                    for page_url in get_page_urls(result[1]):
+                        enqueue(page_url, page["depth"] + 1)
+            except Exception as e:
+                page["status"] = "failed"
+                page["error"] = str(e)
+                # a page already queued gets its result from extraction
+                if not queued and listings_container_model is not None:
+                    scrape_results[page["index"]] = failed_page_result(page["unique_name"], e)
+            finally:
+                fetch_queue.task_done()
+
+    async def extract_worker(write_buffer):
+        while True:
+            page, raw_data, canonical = await extract_queue.get()
+            try:
+                uniq = page["unique_name"]
+                if canonical is not None:
+                    # the canonical page was queued first, so it is already being extracted
+                    await canonical_done[canonical].wait()
+                    canonical_result = scrape_results.get(canonical)
+                    if canonical_result is not None and not canonical_result.get("error"):
+                        scrape_results[page["index"]] = duplicate_page_result(uniq, canonical_result, write_buffer)
+                        continue
+                previous_data = (await asyncio.to_thread(read_formatted_data_bulk, [uniq])).get(uniq) if incremental else None
+                scrape_results[page["index"]] = await ascrape_page(uniq, raw_data, listings_container_model, fields, selected_model, write_buffer, cascade_models, incremental, previous_data)
+            except Exception as e:
+                page["status"] = "failed"
+                page["error"] = str(e)
+                scrape_results[page["index"]] = failed_page_result(page["unique_name"], e)
+            finally:
+                if page["index"] in canonical_done:
+                    canonical_done[page["index"]].set()
+                extract_queue.task_done()
+
+    from crawl4ai import AsyncWebCrawler
+    with WriteBuffer() as write_buffer:
+        async with AsyncWebCrawler() as crawler:
+            workers = [asyncio.create_task(fetch_worker(crawler, write_buffer)) for _ in range(max(1, crawl_concurrency))]
+            workers += [asyncio.create_task(extract_worker(write_buffer)) for _ in range(max(1, extract_concurrency))]
+            try:
+                # fetch workers queue new pages before marking theirs done,
+                # so once fetching is drained no more extraction work can appear
+                await fetch_queue.join()
+                await extract_queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    scrape_input, scrape_output, scrape_cost, parsed_results = sum_scrape_usage(scrape_results[index] for index in sorted(scrape_results))
+    pag_input, pag_output, pag_cost, page_results = sum_pagination_usage(pagination_results[index] for index in sorted(pagination_results))
+    for page in pages:
+        page.pop("index", None)
+    return {
+        "scrape_usage": {"input_tokens": scrape_input, "output_tokens": scrape_output, "cost": scrape_cost},
+        "pagination_usage": {"input_tokens": pag_input, "output_tokens": pag_output, "cost": pag_cost},
+        "parsed_results": parsed_results,
+        "pagination_results": page_results,
+        "pages": pages,
+    }
+
+
+def crawl_catalog(urls: List[str], fields: List[str], selected_model: str, indication: str = "", **options) -> dict:
+    """
+    Synchronous wrapper around acrawl_catalog().
+    """
+    return run_async(acrawl_catalog(urls, fields, selected_model, indication, **options))
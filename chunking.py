@@ -0,0 +1,162 @@
+# chunking.py
+
+import re
+from typing import List
+from assets import CHUNK_INPUT_TOKEN_FRACTION, CHUNK_MAX_TOKENS
+
+CHARS_PER_TOKEN = 4
+
+HEADING_RE = re.compile(r"^#{1,6}\s")
+LIST_ITEM_RE = re.compile(r"^\s*([-*+]|\d+[.)])\s")
+TABLE_ROW_RE = re.compile(r"^\s*\|")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _line_kind(line: str) -> str:
+    if not line.strip():
+        return "blank"
+    if HEADING_RE.match(line):
+        return "heading"
+    if TABLE_ROW_RE.match(line):
+        return "table"
+    if LIST_ITEM_RE.match(line):
+        return "list"
+    return "text"
+
+
+def split_markdown_blocks(markdown: str) -> List[str]:
+    """
+    Splits markdown on structural boundaries: every heading starts a new
+    block, and consecutive table rows or list items stay together in one
+    block. Blank lines end paragraphs, but not lists or tables.
+    """
+    blocks = []
+    current = []
+    current_kind = None
+
+    def flush():
+        if current and any(line.strip() for line in current):
+            blocks.append("\n".join(current).strip("\n"))
+        current.clear()
+
+    for line in markdown.splitlines():
+        kind = _line_kind(line)
+        if kind == "blank":
+            if current_kind == "text":
+                flush()
+                current_kind = None
+            else:
+                current.append(line)
+            continue
+        # indented continuation lines belong to the list item above them
+        if kind == "text" and current_kind == "list" and line.startswith((" ", "\t")):
+            kind = "list"
+        if kind == "heading" or kind != current_kind:
+            # keep a heading attached to the block that follows it
+            if not (current_kind == "heading" and kind != "heading"):
+                flush()
+        current.append(line)
+        current_kind = kind
+    flush()
+    return blocks
+
+
+def _cut_line(line: str, max_tokens: int, count_tokens) -> List[str]:
+    """Cuts a line longer than the budget by characters, each part within max_tokens."""
+    parts = []
+    while line:
+        cut = min(len(line), max_tokens * CHARS_PER_TOKEN)
+        while cut > 1 and count_tokens(line[:cut]) > max_tokens:
+            cut = cut * 9 // 10
+        parts.append(line[:cut])
+        line = line[cut:]
+    return parts
+
+
+def _split_oversized_block(block: str, max_tokens: int, count_tokens) -> List[str]:
+    """
+    Cuts a block larger than max_tokens into pieces of at most max_tokens, in
+    source order, at line boundaries where possible. The header row of a
+    table is repeated in every piece.
+    """
+    lines = block.splitlines()
+    header = []
+    if len(lines) > 2 and _line_kind(lines[0]) == "table" and set(lines[1].strip()) <= set("|-: "):
+        header, lines = lines[:2], lines[2:]
+    header_tokens = count_tokens("\n".join(header)) if header else 0
+    if header_tokens > max_tokens // 2:
+        # too large to repeat: the header goes in the first piece only
+        header, lines, header_tokens = [], header + lines, 0
+
+    pieces = []
+    current = []
+    current_tokens = header_tokens
+    for line in lines:
+        # what the line adds to the piece, including the newline joining it
+        line_tokens = count_tokens(f"\n{line}") if header or current else count_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            pieces.append("\n".join(header + current))
+            current, current_tokens = [], header_tokens
+            line_tokens = count_tokens(f"\n{line}") if header else count_tokens(line)
+        if current_tokens + line_tokens > max_tokens:
+            # a line too long for any piece is cut on its own, without the header
+            pieces.extend(_cut_line(line, max_tokens, count_tokens))
+            continue
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(header + current))
+    return pieces
+
+
+def chunk_markdown(markdown: str, max_tokens: int, count_tokens=estimate_tokens) -> List[str]:
+    """
+    Packs the structural blocks of `markdown` greedily into chunks of at most
+    `max_tokens` tokens, in source order. Blocks are only cut when a single
+    block is larger than the budget.
+    """
+    if count_tokens(markdown) <= max_tokens:
+        return [markdown]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for block in split_markdown_blocks(markdown):
+        block_tokens = count_tokens(block)
+        pieces = [block] if block_tokens <= max_tokens else _split_oversized_block(block, max_tokens, count_tokens)
+        for piece in pieces:
+            # what the piece adds to the chunk, including the blank line joining it
+            piece_tokens = count_tokens(f"\n\n{piece}") if current else count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+                piece_tokens = count_tokens(piece)
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def get_input_token_budget(model: str, system_message: str = "") -> int:
+    """
+    Returns how many tokens of page content fit in one request to `model`:
+    a fraction of its input window (capped at CHUNK_MAX_TOKENS), minus
+    the system prompt.
+    """
+    from litellm import get_model_info, get_max_tokens
+    try:
+        window = get_model_info(model).get("max_input_tokens") or get_max_tokens(model)
+    except Exception:
+        window = get_max_tokens(model)
+    budget = min(int(window * CHUNK_INPUT_TOKEN_FRACTION), CHUNK_MAX_TOKENS)
+    return max(1000, budget - estimate_tokens(system_message))
+
+
+def split_for_model(markdown: str, model: str, system_message: str = "") -> List[str]:
+    """Splits page markdown into chunks that each fit one request to `model`."""
+    return chunk_markdown(markdown, get_input_token_budget(model, system_message))
@@ -0,0 +1,275 @@
+# incremental.py
+
+import hashlib
+from typing import List
+from assets import INCREMENTAL_MAX_CHANGED_FRACTION
+from chunking import split_markdown_blocks, HEADING_RE, LIST_ITEM_RE, TABLE_ROW_RE
+
+# formatted_data key holding the block hashes of the page it was extracted from
+MANIFEST_KEY = "block_manifest"
+
+
+def _is_table_separator(line: str) -> bool:
+    return "-" in line and set(line.strip()) <= set("|-: ")
+
+
+def _split_list_items(lines: List[str]) -> List[str]:
+    """One entry per top-level list item, with its nested items and continuation lines."""
+    indent = len(lines[0]) - len(lines[0].lstrip())
+    items = []
+    for line in lines:
+        if not items or (LIST_ITEM_RE.match(line) and len(line) - len(line.lstrip()) <= indent):
+            items.append([line])
+        else:
+            items[-1].append(line)
+    return ["\n".join(item).strip("\n") for item in items if any(line.strip() for line in item)]
+
+
+def _change_units(markdown: str) -> List[tuple]:
+    """
+    (unit, section, row, block) for each unit of split_change_blocks: block
+    is the markdown block it comes from, section is the
+    hash of the heading the unit falls under (None before the first heading)
+    and row is True for table rows, the only units extracted on their own:
+    any other unit may be one paragraph of a listing spread over its section.
+    """
+    units = []
+    section = None
+    for block in split_markdown_blocks(markdown):
+        lines = block.splitlines()
+        start = 0
+        while start < len(lines) and (HEADING_RE.match(lines[start]) or not lines[start].strip()):
+            start += 1
+        heading, body = [line for line in lines[:start] if line.strip()], lines[start:]
+        if heading:
+            section = block_hash("\n".join(heading))
+        if body and TABLE_ROW_RE.match(body[0]):
+            header, rows = [], body
+            if len(body) > 1 and _is_table_separator(body[1]):
+                header, rows = body[:2], body[2:]
+            rows = [row for row in rows if row.strip()]
+            if not rows:
+                units.append((block, section, False, block))
+            units.extend(("\n".join(heading + header + [row]), section, True, block) for row in rows)
+        elif body and LIST_ITEM_RE.match(body[0]):
+            units.extend(("\n".join(heading + [item]), section, False, block) for item in _split_list_items(body))
+        else:
+            units.append((block, section, False, block))
+    return units
+
+
+def split_change_blocks(markdown: str) -> List[str]:
+    """
+    Splits page markdown into the units changes are tracked in: the blocks
+    of split_markdown_blocks, with tables cut into rows and lists into items.
+    Each row or item keeps the heading above it (and a row its table header).
+    """
+    return [entry[0] for entry in _change_units(markdown)]
+
+
+def block_hash(unit: str) -> str:
+    """Hash of a unit, ignoring trailing whitespace."""
+    normalized = "\n".join(line.rstrip() for line in unit.strip().splitlines())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _normalize_text(value) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def attribute_listings(listings: List[dict], units: List[str], fields: List[str]) -> List[int]:
+    """
+    For each listing, the index of the unit it was most likely extracted
+    from (the one containing the most of its field values), or None if no
+    unit contains any of them.
+    """
+    texts = [_normalize_text(unit) for unit in units]
+    owners = []
+    for listing in listings:
+        values = [_normalize_text(listing.get(field, "")) for field in fields] if isinstance(listing, dict) else []
+        values = [value for value in values if len(value) > 1]
+        owner, best_score = None, 0
+        for index, text in enumerate(texts):
+            score = sum(1 for value in values if value in text)
+            if score > best_score:
+                owner, best_score = index, score
+        owners.append(owner)
+    return owners
+
+
+def build_manifest(plan: dict, listings: List[dict], fields: List[str]) -> dict:
+    """
+    The block manifest stored with a page's formatted_data, for the page of
+    an incremental plan:
+        {"fields", "model", "prompt_hash", "blocks": [unit hashes in page order],
+         "block_sections": [section of each unit], "row_blocks": [whether each unit is a table row],
+         "listing_blocks": [hash of each listing's unit, or None]}
+    """
+    owners = attribute_listings(listings, plan["units"], fields)
+    return {
+        "fields": list(fields),
+        "model": plan["model"],
+        "prompt_hash": plan["prompt_hash"],
+        "blocks": plan["hashes"],
+        "block_sections": plan["sections"],
+        "row_blocks": plan["rows"],
+        "listing_blocks": [plan["hashes"][owner] if owner is not None else None for owner in owners],
+    }
+
+
+def _changed_sections(plan: dict, manifest: dict, changed: List[int]):
+    """
+    The sections to re-extract whole: those of changed units and of removed
+    units that are not table rows. None if such a unit has no heading, as the
+    listing it belongs to cannot be told apart from the rest of the page.
+    """
+    current = set(plan["hashes"])
+    touched = [(plan["sections"][index], plan["rows"][index]) for index in changed]
+    touched.extend(
+        (section, row)
+        for unit_hash, section, row in zip(manifest["blocks"], manifest["block_sections"], manifest["row_blocks"])
+        if unit_hash not in current
+    )
+    sections = set()
+    for section, row in touched:
+        if row:
+            continue
+        if section is None:
+            return None
+        sections.add(section)
+    return sections
+
+
+def prompt_hash(system_message: str) -> str:
+    """Hash of the extraction prompt, so listings extracted with another prompt are not reused."""
+    return hashlib.sha256(system_message.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_incremental(page_markdown: str, fields: List[str], previous_data, model: str, system_message: str) -> dict:
+    """
+    Compares a page with the version its previous formatted_data was
+    extracted from (see build_manifest). Returns a plan:
+        {"mode", "model", "prompt_hash", "units", "hashes", "sections", "rows",
+         "changed": [unit indexes], "changed_markdown", "kept": [(unit hash, listing)]}
+    mode is "unchanged" (every unit seen before: reuse the listings),
+    "partial" (extract changed_markdown only and merge) or "full" (no usable
+    manifest, other fields, another model or prompt, too many changes, or a
+    change the listings around it cannot be kept apart from).
+    A changed table row is extracted on its own; any other change sends its
+    whole section (the heading and everything up to the next one) and drops
+    the listings kept from that section, since a listing may span several
+    of its paragraphs.
+    """
+    entries = _change_units(page_markdown)
+    units = [entry[0] for entry in entries]
+    hashes = [block_hash(unit) for unit in units]
+    plan = {
+        "mode": "full", "model": model, "prompt_hash": prompt_hash(system_message), "units": units, "hashes": hashes,
+        "sections": [entry[1] for entry in entries], "rows": [entry[2] for entry in entries],
+        "changed": list(range(len(units))), "changed_markdown": page_markdown, "kept": [],
+    }
+
+    manifest = previous_data.get(MANIFEST_KEY) if isinstance(previous_data, dict) else None
+    listings = previous_data.get("listings") if isinstance(previous_data, dict) else None
+    if not units or not manifest or manifest.get("fields") != list(fields) or not isinstance(listings, list):
+        return plan
+    if manifest.get("model") != plan["model"] or manifest.get("prompt_hash") != plan["prompt_hash"]:
+        return plan
+    listing_blocks = manifest.get("listing_blocks") or []
+    blocks = manifest.get("blocks") or []
+    if len(listing_blocks) != len(listings) or len(manifest.get("block_sections") or []) != len(blocks) or len(manifest.get("row_blocks") or []) != len(blocks):
+        return plan
+
+    seen = set(blocks)
+    changed = [index for index, unit_hash in enumerate(hashes) if unit_hash not in seen]
+    if not changed and set(hashes) == seen:
+        plan.update(mode="unchanged", changed=[], changed_markdown="", kept=list(zip(listing_blocks, listings)))
+        return plan
+    sections = _changed_sections(plan, manifest, changed)
+    if None in listing_blocks or sections is None:
+        return plan
+    changed = set(changed)
+    changed = [index for index in range(len(units)) if index in changed or plan["sections"][index] in sections]
+    if len(changed) > INCREMENTAL_MAX_CHANGED_FRACTION * len(units):
+        return plan
+
+    # listings of units that are gone from the page, or of the sections sent
+    # again, are dropped; a unit found both in and outside those sections
+    # (boilerplate) leaves its listing ambiguous
+    current = set(hashes)
+    resent = {hashes[index] for index in changed}
+    elsewhere = {unit_hash for index, unit_hash in enumerate(hashes) if index not in changed}
+    if any(unit_hash in resent and unit_hash in elsewhere for unit_hash in listing_blocks):
+        return plan
+    parts = []
+    for index in changed:
+        section = plan["sections"][index]
+        if section in sections:
+            if not parts or parts[-1][0] != section:
+                parts.append((section, []))
+            parts[-1][1].append(index)
+        else:
+            parts.append((None, [index]))
+    plan.update(
+        mode="partial",
+        changed=changed,
+        changed_markdown="\n\n".join(
+            units[indexes[0]] if section is None else "\n\n".join(dict.fromkeys(entries[index][3] for index in indexes))
+            for section, indexes in parts
+        ),
+        kept=[(unit_hash, listing) for unit_hash, listing in zip(listing_blocks, listings) if unit_hash in current and unit_hash not in resent],
+    )
+    return plan
+
+
+def merge_incremental(plan: dict, new_listings: List[dict], fields: List[str]):
+    """
+    Combines the kept listings with those extracted from the changed units,
+    in page order. Returns (listings, manifest) for the new formatted_data.
+    """
+    manifest = {
+        "fields": list(fields), "model": plan["model"], "prompt_hash": plan["prompt_hash"],
+        "blocks": plan["hashes"], "block_sections": plan["sections"], "row_blocks": plan["rows"],
+    }
+    if plan["mode"] == "unchanged":
+        manifest["listing_blocks"] = [unit_hash for unit_hash, _ in plan["kept"]]
+        return [listing for _, listing in plan["kept"]], manifest
+
+    by_unit = {}
+    for unit_hash, listing in plan["kept"]:
+        by_unit.setdefault(unit_hash, []).append(listing)
+    changed_units = [plan["units"][index] for index in plan["changed"]]
+    unattributed = []
+    for listing, owner in zip(new_listings, attribute_listings(new_listings, changed_units, fields)):
+        if owner is None:
+            unattributed.append(listing)
+        else:
+            by_unit.setdefault(plan["hashes"][plan["changed"][owner]], []).append(listing)
+
+    listings, listing_blocks = [], []
+    for unit_hash in dict.fromkeys(plan["hashes"]):
+        for listing in by_unit.get(unit_hash, []):
+            listings.append(listing)
+            listing_blocks.append(unit_hash)
+    listings.extend(unattributed)
+    listing_blocks.extend([None] * len(unattributed))
+    manifest["listing_blocks"] = listing_blocks
+    return listings, manifest
+
+
+def summarize_incremental(parsed_results) -> dict:
+    """
+    Totals the incremental stats of a run:
+        {"pages": int, "unchanged": int, "partial": int, "blocks": int, "changed_blocks": int}
+    """
+    totals = {"pages": 0, "unchanged": 0, "partial": 0, "blocks": 0, "changed_blocks": 0}
+    for result in parsed_results:
+        stats = result.get("incremental") if isinstance(result, dict) else None
+        if not stats:
+            continue
+        totals["pages"] += 1
+        if stats["mode"] in ("unchanged", "partial"):
+            totals[stats["mode"]] += 1
+        totals["blocks"] += stats["blocks"]
+        totals["changed_blocks"] += stats["changed_blocks"]
+    return totals
@@ -0,0 +1,139 @@
+# llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from assets import LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_AGE_SECONDS
+
+
+def response_format_schema(response_format):
+    """
+    Returns a JSON-serializable description of a response_format
+    (a Pydantic model class, a dict, or None).
+    """
+    if response_format is None:
+        return None
+    if hasattr(response_format, "model_json_schema"):
+        return response_format.model_json_schema()
+    return response_format
+
+
+class LLMResponseCache:
+    """
+    On-disk cache of LLM responses stored in a small SQLite file.
+
+    Entries are keyed on a hash of (model, messages, response_format schema,
+    max_tokens) and keep the original token counts and cost, so usage totals
+    stay meaningful when a response is served from the cache.
+    Entries older than `max_age_seconds` expire, and the least recently used
+    entries are evicted once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES, max_age_seconds=LLM_CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_access ON llm_responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: list, response_format=None, max_tokens=None) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "response_format": response_format_schema(response_format),
+                "max_tokens": max_tokens,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached entry ({"parsed_response", "token_counts", "cost"})
+        or None on a miss. Expired entries count as misses.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, parsed_response, token_counts: dict, cost: float) -> None:
+        value = json.dumps(
+            {"parsed_response": parsed_response, "token_counts": token_counts, "cost": cost},
+            default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o),
+        )
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_age_seconds is not None:
+            self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", stale_keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+
+_llm_cache = None
+
+def get_llm_cache() -> LLMResponseCache:
+    """Returns the process-wide LLM response cache, creating it on first use."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
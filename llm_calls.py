@@ -1,51 +1,35 @@
 # llm_calls.py
 import litellm
 import json
-from litellm import (completion,token_counter,completion_cost,get_max_tokens,)
-from assets import USER_MESSAGE, MODELS_USED
+import time
+from functools import lru_cache
+from litellm import (completion,acompletion,completion_cost,get_max_tokens,)
+from assets import USER_MESSAGE, MODELS_USED, LLM_CACHE_ENABLED, LLM_REQUEST_TIMEOUT_SECONDS
 from api_management import get_api_key
+from llm_cache import get_llm_cache
+from rate_limits import get_rate_limiter
+from tracing import get_tracer
+from resilience import call_with_retries, acall_with_retries, get_latency_tracker
 import os
 
 
 
-def call_llm_model(data,response_format,model,system_message,extra_user_instruction="",max_tokens=None,use_model_max_tokens_if_none=False):
+def _prepare_llm_call(data,response_format,model,system_message,extra_user_instruction,max_tokens,use_model_max_tokens_if_none):
     """
-    Calls an LLM via LiteLLM and returns:
-      - parsed_response (str or dict, depending on your response_format),
-      - token_counts ({"input_tokens": int, "output_tokens": int}),
-      - cost (float).
-
-    It also checks the maximum allowable tokens for the chosen model via
-    'get_max_tokens' and ensures the 'max_tokens' parameter doesn't exceed that.
-
-    Parameters:
-        data (str): Additional data to append to the user message.
-        response_format: Desired response format (a dict or Pydantic model).
-        model (str): Model identifier (e.g., "gpt-3.5-turbo", "gemini/gemini-1.5-pro", etc.).
-        system_message (str): System prompt to prime the assistant.
-        extra_user_instruction (str, optional): Extra instructions for the user message.
-        max_tokens (int, optional): The maximum number of tokens to allow in the completion.
-        use_model_max_tokens_if_none (bool, optional): If True and max_tokens is not provided,
-            the function will automatically use the model's maximum context size.
-
-    Returns:
-        tuple: (parsed_response, token_counts, cost)
-            - parsed_response: The parsed output (could be text or a structured object).
-            - token_counts: A dict with "input_tokens" and "output_tokens".
-            - cost: The overall cost (in USD) for the API call.
+    Sets the model's API key and builds the LiteLLM completion parameters.
+    Shared by call_llm_model and acall_llm_model.
     """
     # 1) Retrieve the single API key name for this model from MODELS_USED
     env_var_name = list(MODELS_USED[model])[0]  # e.g., "GEMINI_API_KEY"
     # 2) Retrieve the actual key from session or OS
     env_value = get_api_key(model)
-    print("env variable is:" + env_value)
     # 3) Set it in os.environ so that litellm / underlying client sees it
     if env_value:
         os.environ[env_var_name] = env_value
 
     model_max_tokens = get_max_tokens(model)
     if max_tokens is not None:
-        max_tokens = min(max_tokens, model_max_tokens)-100 
+        max_tokens = min(max_tokens, model_max_tokens)-100
     elif use_model_max_tokens_if_none:
         max_tokens = model_max_tokens -100
 
@@ -60,35 +44,244 @@ def call_llm_model(data,response_format,model,system_message,extra_user_instruct
         "model": model,
         "messages": messages,
         "response_format": response_format,
+        "timeout": LLM_REQUEST_TIMEOUT_SECONDS,
     }
     if max_tokens is not None:
         params["max_tokens"] = max_tokens
+    return params
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str):
+    """
+    Returns the tiktoken encoding for a model, loaded once per model.
+    Models tiktoken doesn't know (Gemini, Claude, ...) use cl100k_base,
+    which is close enough for accounting.
+    """
+    # only needed when a response has no usage, so imported on first use
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model.split("/")[-1])
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
 
-    # Call the LLM using LiteLLM
-    response = completion(**params)
+
+def count_tokens(model: str, text: str) -> int:
+    return len(get_tokenizer(model).encode(text, disallowed_special=()))
+
+
+def _cached_input_tokens(usage) -> int:
+    """Input tokens the provider served from its prompt cache (OpenAI/Gemini/Anthropic style usage)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    if cached is None:
+        cached = getattr(usage, "cache_read_input_tokens", None)
+    return cached or 0
+
+
+def _usage_token_counts(response):
+    """Token counts reported by the provider, or None if the response has no usage."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens is None or completion_tokens is None:
+        return None
+    return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "cached_input_tokens": _cached_input_tokens(usage)}
+
+
+def _finish_llm_call(response, params):
+    """
+    Extracts the parsed response, token counts and cost from a LiteLLM response.
+    """
+    model = params["model"]
+    messages = params["messages"]
 
     # Extract the parsed response
     parsed_response = response.choices[0].message.content
 
-    # Calculate token counts:
-    #   - input_tokens: from the user/system prompt
-    #   - output_tokens: from the returned content
-    input_tokens = token_counter(model=model, messages=messages)
+    # Token counts come from the provider's usage; only responses without
+    # usage are tokenized locally (about 4 tokens of overhead per message)
+    token_counts = _usage_token_counts(response)
+    if token_counts is None:
+        output_text = (
+            parsed_response if isinstance(parsed_response, str)
+            else json.dumps(parsed_response)
+        )
+        token_counts = {
+            "input_tokens": sum(count_tokens(model, message["content"]) + 4 for message in messages),
+            "output_tokens": count_tokens(model, output_text),
+            "cached_input_tokens": 0,
+        }
+
+    # Calculate the total cost for the request
+    cost = completion_cost(completion_response=response)
+
+    return parsed_response, token_counts, cost
+
+
+def _with_latency(token_counts, queue: float, network: float, parse: float):
+    """
+    Returns token_counts with the call's latency in seconds:
+        {"queue": waiting for the rate limiter and for retries of failed attempts,
+         "network": the request that succeeded, "parse": reading the response,
+         token counts and cost}
+    """
+    return {**token_counts, "latency": {"queue": queue, "network": network, "parse": parse}}
+
 
-    # Make sure we convert the parsed response to a string for counting
-    output_text = (
-        parsed_response if isinstance(parsed_response, str)
-        else json.dumps(parsed_response)
+def _trace_llm_call(model, start_time, token_counts, cost, cache_hit):
+    """Records the finished call as an "llm.call" span."""
+    latency = token_counts["latency"]
+    get_tracer().record(
+        "llm.call", start_time, sum(latency.values()), model=model, cache_hit=cache_hit,
+        input_tokens=token_counts["input_tokens"], output_tokens=token_counts["output_tokens"],
+        cached_input_tokens=token_counts.get("cached_input_tokens", 0), cost=cost,
+        queue_seconds=latency["queue"], network_seconds=latency["network"], parse_seconds=latency["parse"],
     )
-    output_tokens = token_counter(model=model, text=output_text)
 
-    token_counts = {
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-    }
 
-    # Calculate the total cost for the request
-    cost = completion_cost(completion_response=response)
+def _cache_key(params, use_cache):
+    if not use_cache:
+        return None
+    return get_llm_cache().make_key(params["model"], params["messages"], params["response_format"], params.get("max_tokens"))
+
 
+def estimate_tokens(params) -> int:
+    """
+    Cheap upper-bound estimate of the tokens a request will use
+    (about 4 characters per token), for rate limiting before the call.
+    """
+    chars = sum(len(message["content"]) for message in params["messages"])
+    return chars // 4 + (params.get("max_tokens") or 0)
+
+
+def _response_format_param(response_format):
+    """A pydantic response_format as the JSON-schema dict providers accept; dicts are passed through."""
+    if hasattr(response_format, "model_json_schema"):
+        return {"type": "json_schema", "json_schema": {"name": response_format.__name__, "schema": response_format.model_json_schema()}}
+    return response_format
+
+
+def build_batch_request(custom_id,data,response_format,model,system_message,extra_user_instruction=""):
+    """
+    Returns one line of a batch job file (OpenAI batch format) holding the
+    same request call_llm_model would send:
+        {"custom_id", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+    """
+    params = _prepare_llm_call(data, response_format, model, system_message, extra_user_instruction, None, False)
+    body = {"model": model, "messages": params["messages"], "response_format": _response_format_param(params["response_format"])}
+    return {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+
+
+def call_llm_model(data,response_format,model,system_message,extra_user_instruction="",max_tokens=None,use_model_max_tokens_if_none=False,use_cache=LLM_CACHE_ENABLED):
+    """
+    Calls an LLM via LiteLLM and returns:
+      - parsed_response (str or dict, depending on your response_format),
+      - token_counts ({"input_tokens": int, "output_tokens": int, "cached_input_tokens": int,
+        "latency": {"queue": s, "network": s, "parse": s}}),
+      - cost (float).
+
+    It also checks the maximum allowable tokens for the chosen model via
+    'get_max_tokens' and ensures the 'max_tokens' parameter doesn't exceed that.
+
+    Parameters:
+        data (str): Additional data to append to the user message.
+        response_format: Desired response format (a dict or Pydantic model).
+        model (str): Model identifier (e.g., "gpt-3.5-turbo", "gemini/gemini-1.5-pro", etc.).
+        system_message (str): System prompt to prime the assistant.
+        extra_user_instruction (str, optional): Extra instructions for the user message.
+        max_tokens (int, optional): The maximum number of tokens to allow in the completion.
+        use_model_max_tokens_if_none (bool, optional): If True and max_tokens is not provided,
+            the function will automatically use the model's maximum context size.
+        use_cache (bool, optional): If True, byte-identical requests are answered from
+            the on-disk response cache (with the token counts and cost of the original call).
+
+    Returns:
+        tuple: (parsed_response, token_counts, cost)
+            - parsed_response: The parsed output (could be text or a structured object).
+            - token_counts: A dict with "input_tokens" and "output_tokens" (from the
+              provider's usage when present) and the call's "latency" breakdown.
+            - cost: The overall cost (in USD) for the API call.
+    """
+    params = _prepare_llm_call(data, response_format, model, system_message, extra_user_instruction, max_tokens, use_model_max_tokens_if_none)
+
+    # Serve identical requests from the response cache
+    start_time = time.time()
+    started = time.perf_counter()
+    cache_key = _cache_key(params, use_cache)
+    if cache_key is not None:
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None:
+            token_counts = _with_latency(cached["token_counts"], 0.0, 0.0, time.perf_counter() - started)
+            _trace_llm_call(model, start_time, token_counts, cached["cost"], True)
+            return cached["parsed_response"], token_counts, cached["cost"]
+
+    # Call the LLM using LiteLLM; transient errors are retried (see resilience.py)
+    def send():
+        sent = time.perf_counter()
+        response = completion(**params)
+        received = time.perf_counter()
+        get_latency_tracker(model).add(received - sent)
+        return response, sent, received
+
+    queued = time.perf_counter()
+    response, sent, received = call_with_retries(send, model)
+
+    parsed_response, token_counts, cost = _finish_llm_call(response, params)
+
+    if cache_key is not None:
+        get_llm_cache().set(cache_key, parsed_response, token_counts, cost)
+
+    token_counts = _with_latency(token_counts, sent - queued, received - sent, time.perf_counter() - received)
+    _trace_llm_call(model, start_time, token_counts, cost, False)
     return parsed_response, token_counts, cost
 
+
+async def acall_llm_model(data,response_format,model,system_message,extra_user_instruction="",max_tokens=None,use_model_max_tokens_if_none=False,use_cache=LLM_CACHE_ENABLED):
+    """
+    Async version of call_llm_model built on litellm.acompletion.
+
+    Calls go through the provider's rate limiter (see rate_limits.py), which caps
+    concurrent requests and requests/tokens per minute, so many of these can be
+    gathered at once. Every attempt, retries and hedged duplicates included
+    (see resilience.py), takes its own place in the limiter. Takes the same
+    parameters and returns the same (parsed_response, token_counts, cost)
+    tuple as call_llm_model.
+    """
+    params = _prepare_llm_call(data, response_format, model, system_message, extra_user_instruction, max_tokens, use_model_max_tokens_if_none)
+
+    start_time = time.time()
+    started = time.perf_counter()
+    cache_key = _cache_key(params, use_cache)
+    if cache_key is not None:
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None:
+            token_counts = _with_latency(cached["token_counts"], 0.0, 0.0, time.perf_counter() - started)
+            _trace_llm_call(model, start_time, token_counts, cached["cost"], True)
+            return cached["parsed_response"], token_counts, cached["cost"]
+
+    async def send():
+        async with get_rate_limiter(model).limit(estimate_tokens(params)) as usage:
+            sent = time.perf_counter()
+            response = await acompletion(**params)
+            received = time.perf_counter()
+            reported = _usage_token_counts(response)
+            if reported is not None:
+                # replace the estimate with the real usage in the tokens-per-minute window
+                usage["tokens"] = reported["input_tokens"] + reported["output_tokens"]
+        get_latency_tracker(model).add(received - sent)
+        return response, sent, received
+
+    queued = time.perf_counter()
+    response, sent, received = await acall_with_retries(send, model)
+    parsed_response, token_counts, cost = _finish_llm_call(response, params)
+
+    if cache_key is not None:
+        get_llm_cache().set(cache_key, parsed_response, token_counts, cost)
+
+    token_counts = _with_latency(token_counts, sent - queued, received - sent, time.perf_counter() - received)
+    _trace_llm_call(model, start_time, token_counts, cost, False)
+    return parsed_response, token_counts, cost
@@ -1,87 +1,244 @@
 # markdown.py
 
 import asyncio
-from typing import List
-from api_management import get_supabase_client
-from utils import generate_unique_name
-from crawl4ai import AsyncWebCrawler
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List
+from storage import get_storage
+from blob_store import get_blob_store, resolve_raw_data, RawDataMap
+from utils import generate_unique_name, dedupe_urls, run_async
+from tracing import get_tracer
+from near_duplicates import simhash, format_fingerprint
+from assets import CRAWL_MAX_CONCURRENCY, PAGE_CACHE_TTL_SECONDS, PAGE_CACHE_REVALIDATE, TIMEOUT_SETTINGS, RAW_DATA_BLOBS_ENABLED, NEAR_DUPLICATE_DETECTION_ENABLED
+
+# per-page progress is logged at debug level (run_batch.py --verbose shows it)
+logger = logging.getLogger(__name__)
+
+
+async def crawl_urls_async(urls: List[str], max_concurrency: int = CRAWL_MAX_CONCURRENCY, crawler=None) -> List[dict]:
+    """
+    Crawls every URL with one shared AsyncWebCrawler (a single browser),
+    running at most `max_concurrency` pages at the same time.
+
+    Pass an already started `crawler` to reuse it across several batches;
+    otherwise one is started for this batch and closed at the end.
+
+    Returns one dict per URL, in input order:
+        {"url": str, "success": bool, "markdown": str, "headers": dict, "error": str or None}
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def crawl_one(active_crawler, url: str) -> dict:
+        async with semaphore:
+            with get_tracer().span("crawl", url=url) as span:
+                try:
+                    result = await active_crawler.arun(url=url)
+                except Exception as e:
+                    span["error"] = str(e)
+                    return {"url": url, "success": False, "markdown": "", "error": str(e)}
+                span["success"] = bool(result.success)
+                span["bytes"] = len(result.markdown or "") if result.success else 0
+        headers = dict(getattr(result, "response_headers", None) or {})
+        if result.success:
+            return {"url": url, "success": True, "markdown": result.markdown or "", "headers": headers, "error": None}
+        return {"url": url, "success": False, "markdown": "", "headers": headers, "error": getattr(result, "error_message", None) or "crawl failed"}
+
+    if crawler is not None:
+        return list(await asyncio.gather(*(crawl_one(crawler, url) for url in urls)))
+
+    # crawl4ai (and its browser stack) is only imported when something is crawled
+    from crawl4ai import AsyncWebCrawler
+    async with AsyncWebCrawler() as shared_crawler:
+        return list(await asyncio.gather(*(crawl_one(shared_crawler, url) for url in urls)))
+
+
+def fetch_markdowns(urls: List[str], max_concurrency: int = CRAWL_MAX_CONCURRENCY) -> List[dict]:
+    """
+    Synchronous wrapper around crawl_urls_async().
+    """
+    return run_async(crawl_urls_async(urls, max_concurrency))
 
-supabase = get_supabase_client()
 
 async def get_fit_markdown_async(url: str) -> str:
     """
     Async function using crawl4ai's AsyncWebCrawler to produce the regular raw markdown.
     (Reverting from the 'fit' approach back to normal.)
     """
-
-    async with AsyncWebCrawler() as crawler:
-        result = await crawler.arun(url=url)
-        if result.success:
-            return result.markdown
-        else:
-            return ""
+    results = await crawl_urls_async([url], max_concurrency=1)
+    return results[0]["markdown"]
 
 
 def fetch_fit_markdown(url: str) -> str:
     """
     Synchronous wrapper around get_fit_markdown_async().
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(get_fit_markdown_async(url))
-    finally:
-        loop.close()
+    return run_async(get_fit_markdown_async(url))
 
 def read_raw_data(unique_name: str) -> str:
     """
     Query the 'scraped_data' table for the row with this unique_name,
     and return the 'raw_data' field.
     """
-    response = supabase.table("scraped_data").select("raw_data").eq("unique_name", unique_name).execute()
-    data = response.data
-    if data and len(data) > 0:
-        return data[0]["raw_data"]
-    return ""
+    with get_tracer().span("storage.read", unique_name=unique_name, rows=1) as span:
+        raw_data = resolve_raw_data(get_storage().read_raw(unique_name))
+        span["bytes"] = len(raw_data)
+    return raw_data
+
+def read_raw_data_bulk(unique_names: List[str]) -> Dict[str, str]:
+    """
+    Fetch raw_data for a whole batch with a few bulk queries instead of
+    one query per page.
+    Returns {unique_name: raw_data} for the rows that have raw_data;
+    compressed pages are only decompressed when they are looked up.
+    """
+    with get_tracer().span("storage.read", column="raw_data") as span:
+        rows = get_storage().read_raw_bulk(unique_names)
+        span["rows"] = len(rows)
+    return RawDataMap(rows, get_blob_store())
+
+def read_cached_pages_bulk(unique_names: List[str]) -> Dict[str, dict]:
+    """
+    Return the cache metadata (fetched_at / etag / last_modified) of every
+    unique_name that already has raw_data, without downloading the markdown.
+    """
+    with get_tracer().span("storage.read", column="cache_metadata") as span:
+        rows = get_storage().read_cache_metadata_bulk(unique_names)
+        span["rows"] = len(rows)
+    return rows
 
-def save_raw_data(unique_name: str, url: str, raw_data: str) -> None:
+def read_fingerprints_bulk(unique_names: List[str]) -> Dict[str, str]:
     """
-    Save or update the row in supabase with unique_name, url, and raw_data.
-    If a row with unique_name doesn't exist, it inserts; otherwise it might upsert.
+    Return the SimHash fingerprint stored with the raw_data of every unique_name
+    that has one (see save_raw_data).
     """
-    supabase.table("scraped_data").upsert({
-        "unique_name": unique_name,
-        "url": url,
-        "raw_data": raw_data
-    }, on_conflict="id").execute()
-    BLUE = "\033[34m"
+    with get_tracer().span("storage.read", column="simhash") as span:
+        rows = get_storage().read_fingerprints_bulk(unique_names)
+        span["rows"] = len(rows)
+    return rows
+
+def read_cached_page(unique_name: str):
+    """
+    Return the cache metadata row for this unique_name, or None if it has no raw_data.
+    """
+    return read_cached_pages_bulk([unique_name]).get(unique_name)
+
+def save_raw_data(unique_name: str, url: str, raw_data: str, etag: str = None, last_modified: str = None) -> None:
+    """
+    Save or update the row with unique_name, url, and raw_data.
+    unique_name is deterministic per page, so re-crawls overwrite the cached row.
+    With RAW_DATA_BLOBS_ENABLED the markdown goes to the compressed blob store
+    and the row only keeps its hash and sizes.
+    With NEAR_DUPLICATE_DETECTION_ENABLED the page's SimHash fingerprint
+    (see near_duplicates.py) is stored with it.
+    """
+    with get_tracer().span("storage.write", unique_name=unique_name, column="raw_data", rows=1, bytes=len(raw_data)) as span:
+        fingerprint = format_fingerprint(simhash(raw_data)) if NEAR_DUPLICATE_DETECTION_ENABLED else None
+        if RAW_DATA_BLOBS_ENABLED:
+            raw_data = get_blob_store().put_text(raw_data)
+            span["stored_bytes"] = raw_data["stored_size"]
+        get_storage().save_raw(unique_name, url, raw_data, etag, last_modified, fingerprint)
+    logger.debug("Raw data stored for %s", unique_name)
+
+def touch_cached_page(unique_name: str) -> None:
+    """
+    Mark a cached page as fresh again after a successful revalidation.
+    """
+    get_storage().touch(unique_name)
+
+def is_cache_fresh(cached_row: dict, ttl_seconds) -> bool:
+    """
+    True if the cached row was fetched less than ttl_seconds ago.
+    A ttl_seconds of None means cached pages never expire.
+    """
+    if ttl_seconds is None:
+        return True
+    fetched_at = cached_row.get("fetched_at")
+    if not fetched_at:
+        return False
+    fetched_at = datetime.fromisoformat(fetched_at.replace("Z", "+00:00"))
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - fetched_at).total_seconds() < ttl_seconds
+
+def revalidate_page(url: str, etag: str = None, last_modified: str = None) -> bool:
+    """
+    Send a conditional request with the stored ETag / Last-Modified validators.
+    Returns True if the server confirms the page did not change.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    if not headers:
+        return False
+    import httpx
+    try:
+        with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=TIMEOUT_SETTINGS["page_load"]) as response:
+            if response.status_code == 304:
+                return True
+            return bool(etag) and response.headers.get("etag") == etag
+    except httpx.HTTPError:
+        return False
+
+def _header(headers: dict, name: str):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def crawl_and_store_markdowns(urls: List[str], max_concurrency: int = CRAWL_MAX_CONCURRENCY, ttl_seconds=PAGE_CACHE_TTL_SECONDS, revalidate: bool = PAGE_CACHE_REVALIDATE, force_refresh: bool = False) -> List[dict]:
+    """
+    For each URL (duplicates within the batch are dropped):
+      1) Generate the deterministic unique_name from the canonical URL
+      2) Reuse the cached row if it is younger than ttl_seconds, or if
+         `revalidate` is on and the server answers 304 Not Modified
+      3) Crawl every other URL concurrently, sharing one crawler
+      4) Save each successful crawl to storage
+    `force_refresh` ignores the cache and re-crawls everything.
+    Return one report per unique URL, in input order:
+        {"url": str, "unique_name": str, "status": "cached" | "revalidated" | "crawled" | "failed", "error": str or None}
+    """
+    RED = "\033[31m"
     RESET = "\033[0m"
-    print(f"{BLUE}INFO:Raw data stored for {unique_name}{RESET}")
-
-def fetch_and_store_markdowns(urls: List[str]) -> List[str]:
-    """
-    For each URL:
-      1) Generate unique_name
-      2) Check if there's already a row in supabase with that unique_name
-      3) If not found or if raw_data is empty, fetch fit_markdown
-      4) Save to supabase
-    Return a list of unique_names (one per URL).
-    """
-    unique_names = []
-
-    for url in urls:
-        unique_name = generate_unique_name(url)
-        MAGENTA = "\033[35m"
-        RESET = "\033[0m"
-        # check if we already have raw_data in supabase
-        raw_data = read_raw_data(unique_name)
-        if raw_data:
-            print(f"{MAGENTA}Found existing data in supabase for {url} => {unique_name}{RESET}")
+
+    reports = [
+        {"url": url, "unique_name": generate_unique_name(url), "status": "cached", "error": None}
+        for url in dedupe_urls(urls)
+    ]
+    cached_rows = {} if force_refresh else read_cached_pages_bulk([report["unique_name"] for report in reports])
+    to_crawl = []
+    for report in reports:
+        url, unique_name = report["url"], report["unique_name"]
+        cached_row = cached_rows.get(unique_name)
+        if cached_row is None:
+            to_crawl.append(report)
+        elif is_cache_fresh(cached_row, ttl_seconds):
+            logger.debug("Found existing data in storage for %s => %s", url, unique_name)
+        elif revalidate and revalidate_page(url, cached_row.get("etag"), cached_row.get("last_modified")):
+            touch_cached_page(unique_name)
+            report["status"] = "revalidated"
+            logger.debug("Cached data still valid for %s => %s", url, unique_name)
         else:
-            # fetch fit markdown
-            fit_md = fetch_fit_markdown(url)
-            print(fit_md)
-            save_raw_data(unique_name, url, fit_md)
-        unique_names.append(unique_name)
+            to_crawl.append(report)
+
+    if to_crawl:
+        crawl_results = fetch_markdowns([report["url"] for report in to_crawl], max_concurrency)
+        for report, result in zip(to_crawl, crawl_results):
+            if result["success"]:
+                headers = result["headers"]
+                save_raw_data(report["unique_name"], report["url"], result["markdown"], _header(headers, "etag"), _header(headers, "last-modified"))
+                report["status"] = "crawled"
+            else:
+                report["status"] = "failed"
+                report["error"] = result["error"]
+                print(f"{RED}ERROR:Crawl failed for {report['url']}: {result['error']}{RESET}")
 
-    return unique_names
+    return reports
+
+def fetch_and_store_markdowns(urls: List[str], max_concurrency: int = CRAWL_MAX_CONCURRENCY, force_refresh: bool = False) -> List[str]:
+    """
+    Crawls and stores the markdown of every unique URL (see crawl_and_store_markdowns)
+    and returns a list of unique_names (one per unique URL).
+    """
+    return [report["unique_name"] for report in crawl_and_store_markdowns(urls, max_concurrency, force_refresh=force_refresh)]
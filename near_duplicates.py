@@ -0,0 +1,110 @@
+# near_duplicates.py
+
+import hashlib
+import re
+from typing import Dict, List
+from assets import NEAR_DUPLICATE_MAX_DISTANCE, NEAR_DUPLICATE_SHINGLE_WORDS, NEAR_DUPLICATE_MIN_WORDS
+
+FINGERPRINT_BITS = 64
+WORD_RE = re.compile(r"\w+")
+# mirrors and tracking-parameter variants of a page differ mostly in their links
+LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+
+
+def simhash(markdown: str):
+    """
+    64-bit SimHash of a page's markdown over shingles of
+    NEAR_DUPLICATE_SHINGLE_WORDS consecutive words, ignoring link targets.
+    Pages with mostly the same text get fingerprints a few bits apart.
+    Returns None for pages under NEAR_DUPLICATE_MIN_WORDS words, which are
+    too short to compare reliably.
+    """
+    words = WORD_RE.findall(LINK_TARGET_RE.sub("]", markdown or "").lower())
+    if len(words) < max(NEAR_DUPLICATE_MIN_WORDS, NEAR_DUPLICATE_SHINGLE_WORDS):
+        return None
+    shingles = {" ".join(words[i:i + NEAR_DUPLICATE_SHINGLE_WORDS]) for i in range(len(words) - NEAR_DUPLICATE_SHINGLE_WORDS + 1)}
+    # each bit is set when most shingle hashes have it set; counting the
+    # columns of the hashes' bit strings keeps the per-bit loop out of Python
+    bit_strings = [
+        format(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"), f"0{FINGERPRINT_BITS}b")
+        for shingle in shingles
+    ]
+    majority = len(bit_strings) / 2
+    return int("".join("1" if column.count("1") > majority else "0" for column in zip(*bit_strings)), 2)
+
+
+def format_fingerprint(fingerprint) -> str:
+    """Fingerprint as the hex string stored in the simhash column (None stays None)."""
+    return None if fingerprint is None else f"{fingerprint:016x}"
+
+
+def parse_fingerprint(value):
+    return None if not value else int(value, 16)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    Finds fingerprints within max_distance bits of a given one without
+    comparing every pair. Fingerprints are cut into max_distance + 1 bands;
+    two fingerprints that close agree exactly on at least one band, so only
+    fingerprints sharing a band bucket are compared.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        band_count = max_distance + 1
+        width, extra = divmod(FINGERPRINT_BITS, band_count)
+        self._bands = []
+        start = 0
+        for band in range(band_count):
+            band_width = width + (1 if band < extra else 0)
+            self._bands.append((start, (1 << band_width) - 1))
+            start += band_width
+        self._buckets = [{} for _ in self._bands]
+        self._fingerprints = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def add(self, key: str, fingerprint: int) -> None:
+        self._fingerprints[key] = fingerprint
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            buckets.setdefault(fingerprint >> shift & mask, []).append(key)
+
+    def find(self, fingerprint: int) -> List[tuple]:
+        """[(key, distance)] of the indexed fingerprints within max_distance, closest first."""
+        candidates = set()
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            candidates.update(buckets.get(fingerprint >> shift & mask, ()))
+        matches = []
+        for key in candidates:
+            distance = hamming_distance(fingerprint, self._fingerprints[key])
+            if distance <= self.max_distance:
+                matches.append((key, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+def find_near_duplicates(unique_names: List[str], fingerprints: Dict[str, int]) -> Dict[str, str]:
+    """
+    Maps every page that is a near-duplicate of an earlier page of
+    unique_names to that page, its canonical copy:
+        {unique_name: canonical_unique_name}
+    Canonical pages are never duplicates themselves, and pages without a
+    fingerprint are left out.
+    """
+    index = SimHashIndex()
+    duplicates = {}
+    for uniq in dict.fromkeys(unique_names):
+        fingerprint = fingerprints.get(uniq)
+        if fingerprint is None:
+            continue
+        matches = index.find(fingerprint)
+        if matches:
+            duplicates[uniq] = matches[0][0]
+        else:
+            index.add(uniq, fingerprint)
+    return duplicates
@@ -1,16 +1,26 @@
 # pagination.py
 
+import asyncio
 import json
+import logging
+import math
+import re
+from functools import lru_cache
 from typing import List, Dict
-from assets import PROMPT_PAGINATION
-from markdown import read_raw_data
-from api_management import get_supabase_client
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from assets import (PROMPT_PAGINATION, PRUNING_ENABLED, PAGINATION_RULE_MIN_CONFIDENCE, PAGINATION_MAX_GENERATED_PAGES)
+from markdown import read_raw_data, read_raw_data_bulk
+from storage import get_storage
 from pydantic import BaseModel, Field
 from typing import List
 from pydantic import create_model
-from llm_calls import (call_llm_model)
+from llm_calls import (call_llm_model, acall_llm_model)
+from utils import run_async
+from pruning import prune_markdown
+from write_buffer import WriteBuffer
+from tracing import get_tracer, trace_page
 
-supabase = get_supabase_client()
+logger = logging.getLogger(__name__)
 
 
 class PaginationModel(BaseModel):
@@ -25,70 +35,378 @@ def create_dynamic_listing_model(field_names: List[str]):
     field_definitions = {field: (str, ...) for field in field_names}
     return create_model('DynamicListingModel', **field_definitions)
 
-def build_pagination_prompt(indications: str, url: str) -> str:
-    # Base prompt
-    prompt = PROMPT_PAGINATION + f"\nThe page being analyzed is: {url}\n"
+@lru_cache(maxsize=1)
+def get_pagination_system_message() -> str:
+    """
+    The pagination instructions and response schema, built once. They are
+    the same for every page, so they form a stable prefix that provider-side
+    prompt caching can reuse; per-page content goes in the user message.
+    """
+    return PROMPT_PAGINATION + json.dumps(PaginationModel.model_json_schema())
 
+def build_pagination_instruction(indications: str, url: str) -> str:
+    """
+    The per-run and per-page part of a pagination request (user indications,
+    then the page URL), placed in the user message just before the markdown.
+    """
     if indications.strip():
-        prompt += (
+        prompt = (
             "These are the user's indications. Pay attention:\n"
             f"{indications}\n\n"
         )
     else:
-        prompt += (
+        prompt = (
             "No special user indications. Just apply the pagination logic.\n\n"
         )
-    # Finally append the actual markdown data
-    return prompt
+    # the markdown data follows
+    return prompt + f"The page being analyzed is: {url}\n\n"
+
+
+MARKDOWN_LINK_RE = re.compile(r"\[([^\]]*)\]\(\s*<?([^)\s>]+)>?[^)]*\)")
+REFERENCE_LINK_RE = re.compile(r"^\s*\[[^\]]+\]:\s*<?(\S+?)>?\s*$", re.MULTILINE)
+BARE_URL_RE = re.compile(r"https?://[^\s)\]\"'<>]+")
+
+# query parameters that hold a page number or an item offset
+PAGE_QUERY_PARAMS = {"page", "pg", "paged", "pagenum", "page_num", "pagenumber", "pn", "currentpage"}
+OFFSET_QUERY_PARAMS = {"offset", "start", "skip", "from"}
+# path patterns like /page/3, /page-3, /page3
+PAGE_PATH_RE = re.compile(r"(?i)(/(?:page|seite|pagina)[/_-]?)(\d+)(?=/|$)")
+# "p" is as often a product id (?p=1001, /p/1001) as a page number, so these
+# slots only count on links labeled like pagination (see _is_pager_link)
+SHORT_PAGE_QUERY_PARAMS = {"p"}
+SHORT_PAGE_PATH_RE = re.compile(r"(?i)(/p[/_-]?)(\d+)(?=/|$)")
+PAGER_LABELS = {"next", "next page", "previous", "previous page", "prev", "first", "last", ">", "<", ">>", "<<", "›", "‹", "»", "«", "→", "←"}
+PAGE_PLACEHOLDER = "__PAGE_NUMBER__"
+
+
+def extract_labeled_links(markdown: str, base_url: str) -> List[tuple]:
+    """
+    Returns every link of the markdown (inline, reference-style and bare URLs)
+    as (absolute URL, link text), resolved against the analyzed page's URL.
+    The text is None for reference-style and bare links; a URL linked several
+    times keeps every distinct text.
+    """
+    raw_links = (
+        [(link, text) for text, link in MARKDOWN_LINK_RE.findall(markdown)]
+        + [(link, None) for link in REFERENCE_LINK_RE.findall(markdown) + BARE_URL_RE.findall(markdown)]
+    )
+    links = []
+    seen = set()
+    for link, text in raw_links:
+        if link.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        absolute = urljoin(base_url, link)
+        if (absolute, text) not in seen:
+            seen.add((absolute, text))
+            links.append((absolute, text))
+    return links
+
+
+def extract_links(markdown: str, base_url: str) -> List[str]:
+    """
+    Returns every link of the markdown (inline, reference-style and bare URLs)
+    as an absolute URL, resolved against the analyzed page's URL.
+    """
+    return list(dict.fromkeys(link for link, _ in extract_labeled_links(markdown, base_url)))
+
+
+def _is_pager_link(text, number: int) -> bool:
+    """True if a link's text is its own page number or a label like "Next" or "»"."""
+    if text is None:
+        return False
+    label = " ".join(text.strip().lower().split())
+    return label == str(number) or label in PAGER_LABELS
+
+
+def _pagination_slots(url: str, short: bool = False):
+    """
+    Yields (template, kind, number) for every page-number or offset slot of a URL.
+    The template is the URL with that number replaced by PAGE_PLACEHOLDER.
+    With short=True only the ambiguous "p" slots are yielded instead.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query_params = SHORT_PAGE_QUERY_PARAMS if short else PAGE_QUERY_PARAMS | OFFSET_QUERY_PARAMS
+    for index, (key, value) in enumerate(query):
+        lowered = key.lower()
+        if value.isdigit() and lowered in query_params:
+            others = [item for i, item in enumerate(query) if i != index]
+            template_query = urlencode(others + [(key, "")]) + PAGE_PLACEHOLDER
+            template = urlunsplit((parts.scheme, parts.netloc, parts.path, template_query, ""))
+            yield template, "offset" if lowered in OFFSET_QUERY_PARAMS else "page", int(value)
+    for match in (SHORT_PAGE_PATH_RE if short else PAGE_PATH_RE).finditer(parts.path):
+        path_template = parts.path[:match.start(2)] + PAGE_PLACEHOLDER + parts.path[match.end(2):]
+        template = urlunsplit((parts.scheme, parts.netloc, path_template, parts.query, ""))
+        yield template, "page", int(match.group(2))
+
 
+def _score_sequence(kind: str, numbers: List[int]):
+    """
+    Returns (step, page count, confidence) for the numbers found in one URL
+    template, or None if they can't be a page sequence.
+    """
+    if len(numbers) < 2:
+        return None
+    step = 1
+    if kind == "offset":
+        step = 0
+        for previous, current in zip(numbers, numbers[1:]):
+            step = math.gcd(step, current - previous)
+    count = (numbers[-1] - numbers[0]) // step + 1
+    if count > PAGINATION_MAX_GENERATED_PAGES:
+        return None
+
+    # two numbers could be anything; three or more evenly spread ones are a sequence
+    confidence = 0.6 if len(numbers) == 2 else 0.9
+    # a pager like "1 2 3 ... 50" or "1 ... 7 8 9 ... 50" shows the first page
+    # and at most three runs of neighbours; other sequences with many holes
+    # are more likely a coincidence
+    runs = 1 + sum(1 for previous, current in zip(numbers, numbers[1:]) if current - previous != step)
+    if count > 10 and not (numbers[0] <= step and runs <= 3):
+        confidence *= max(0.5, len(numbers) / count)
+    return step, count, confidence
+
+
+def detect_pagination(markdown: str, url: str):
+    """
+    Rule-based pagination detection: finds links to the same site whose only
+    difference is a page number (page=N, /page/N, ...) or an item offset
+    (offset=N, start=N, ...), and generates the full sequence of page URLs
+    from the lowest to the highest number found.
+
+    Only page-like slots count (page=N, /page/N, offset=N, ...); the short
+    "p" forms only on links whose text is the page number or "Next"-like.
+    Every group of links sharing a template is scored and the most
+    confident valid one wins.
+
+    Returns (PaginationModel or None, confidence between 0 and 1).
+    """
+    host = urlsplit(url).netloc
+    candidates = {}
+    for link, text in extract_labeled_links(markdown, url):
+        if urlsplit(link).netloc != host:
+            continue
+        for template, kind, number in _pagination_slots(link):
+            candidates.setdefault((template, kind), set()).add(number)
+        for template, kind, number in _pagination_slots(link, short=True):
+            if _is_pager_link(text, number):
+                candidates.setdefault((template, kind), set()).add(number)
+    # the analyzed page is part of its own sequence, but only of one found in its links
+    for template, kind, number in list(_pagination_slots(url)) + list(_pagination_slots(url, short=True)):
+        if (template, kind) in candidates:
+            candidates[(template, kind)].add(number)
+
+    best = None
+    for (template, kind), numbers in candidates.items():
+        numbers = sorted(numbers)
+        scored = _score_sequence(kind, numbers)
+        if scored is None:
+            continue
+        step, count, confidence = scored
+        if best is None or (confidence, len(numbers)) > (best[0], best[1]):
+            best = (confidence, len(numbers), template, numbers[0], numbers[-1], step)
+    if best is None:
+        return None, 0.0
 
-def save_pagination_data(unique_name: str, pagination_data):
-       # if it's a pydantic object, convert to dict
+    confidence, _, template, first, last, step = best
+    page_urls = [template.replace(PAGE_PLACEHOLDER, str(number)) for number in range(first, last + 1, step)]
+    return PaginationModel(page_urls=page_urls), confidence
+
+
+def save_pagination_data(unique_name: str, pagination_data, write_buffer: WriteBuffer = None):
+    """
+    Store pagination_data for this unique_name. With a write_buffer the write
+    is queued and flushed in bulk later, instead of one update per page.
+    """
+    # if it's a pydantic object, convert to dict
     if hasattr(pagination_data, "dict"):
         pagination_data = pagination_data.dict()
     
     # parse if string
     if isinstance(pagination_data, str):
-        try:
-            pagination_data = json.loads(pagination_data)
-        except json.JSONDecodeError:
-            pagination_data = {"raw_text": pagination_data}
+        with get_tracer().span("json.parse", unique_name=unique_name, bytes=len(pagination_data)) as span:
+            try:
+                pagination_data = json.loads(pagination_data)
+            except json.JSONDecodeError:
+                span["error"] = "invalid JSON"
+                pagination_data = {"raw_text": pagination_data}
+
+    if write_buffer is not None:
+        write_buffer.add(unique_name, "pagination_data", pagination_data)
+        return
 
-    supabase.table("scraped_data").update({
-        "pagination_data": pagination_data
-    }).eq("unique_name", unique_name).execute()
-    MAGENTA = "\033[35m"
-    RESET = "\033[0m" 
-    print(f"{MAGENTA}INFO:Pagination data saved for {unique_name}{RESET}")
+    with get_tracer().span("storage.write", unique_name=unique_name, column="pagination_data", rows=1):
+        get_storage().save_pagination(unique_name, pagination_data)
+    logger.debug("Pagination data saved for %s", unique_name)
 
-def paginate_urls(unique_names: List[str], selected_model: str, indication: str, urls:List[str]):
+def prepare_pagination_markdown(raw_data: str) -> str:
     """
-    For each unique_name, read raw_data, detect pagination, save results,
-    accumulate cost usage, and return a final summary.
+    Prunes a page's markdown for pagination detection, keeping every link.
+    """
+    if not PRUNING_ENABLED:
+        return raw_data
+    pruned, _ = prune_markdown(raw_data, keep_links=True)
+    return pruned
+
+def detect_pagination_with_rules(raw_data: str, url: str, indication: str):
+    """
+    Tries the rule-based detector first. Returns (PaginationModel, zero token
+    counts, zero cost) when it is confident and the user gave no indications,
+    otherwise (None, None, None) so the caller falls back to the LLM.
+    """
+    if indication.strip():
+        return None, None, None
+    detected, confidence = detect_pagination(raw_data, url)
+    if detected is None or confidence < PAGINATION_RULE_MIN_CONFIDENCE:
+        return None, None, None
+    logger.debug("Pagination detected without LLM for %s (%d pages)", url, len(detected.page_urls))
+    return detected, {"input_tokens": 0, "output_tokens": 0}, 0
+
+def failed_pagination_result(uniq: str, error: Exception) -> dict:
+    """
+    The result of a page whose pagination LLM call failed after retries:
+    {"unique_name", "error"}, so the rest of the batch goes on.
+    """
+    RED = "\033[31m"
+    RESET = "\033[0m"
+    print(f"{RED}ERROR:Pagination failed for {uniq}: {error}{RESET}")
+    return {"unique_name": uniq, "error": str(error)}
+
+def sum_pagination_usage(results):
+    """
+    Adds up token counts and cost of per-page pagination results, in input order.
+    Failed pages appear as {"unique_name", "pagination_data": None, "error"}.
     """
     total_input_tokens = 0
     total_output_tokens = 0
     total_cost = 0
     pagination_results = []
+    for result in results:
+        if result is None:
+            continue
+        if isinstance(result, dict):
+            pagination_results.append({"unique_name": result["unique_name"], "pagination_data": None, "error": result["error"]})
+            continue
+        uniq, pag_data, token_counts, cost = result
+        total_input_tokens += token_counts["input_tokens"]
+        total_output_tokens += token_counts["output_tokens"]
+        total_cost += cost
+        pagination_results.append({"unique_name": uniq,"pagination_data": pag_data})
+    return total_input_tokens, total_output_tokens, total_cost, pagination_results
+
+def paginate_urls(unique_names: List[str], selected_model: str, indication: str, urls:List[str], parallel: bool = False, raw_data_map: Dict[str, str] = None, write_buffer: WriteBuffer = None, on_result=None):
+    """
+    For each unique_name, read raw_data, detect pagination, save results,
+    accumulate cost usage, and return a final summary.
+
+    Pagination is first detected with rules (see detect_pagination); the LLM
+    is only called when they aren't confident or the user gave indications.
+
+    With parallel=True the pages are analyzed concurrently (see apaginate_urls).
+    raw_data_map ({unique_name: raw_data}) reuses a bulk read shared with scrape_urls.
+    Results are written through write_buffer; without one, a buffer is opened
+    for this run and flushed before returning.
+    on_result((unique_name, pagination_data, token_counts, cost)) is called as
+    each page is done, in completion order; it gets None for skipped pages,
+    and a failed_pagination_result for pages whose LLM call still failed
+    after retries (see resilience.py).
+    """
+    if write_buffer is None:
+        with WriteBuffer() as run_buffer:
+            return paginate_urls(unique_names, selected_model, indication, urls, parallel, raw_data_map, run_buffer, on_result)
+
+    if parallel:
+        return run_async(apaginate_urls(unique_names, selected_model, indication, urls, raw_data_map, write_buffer, on_result))
 
+    if raw_data_map is None:
+        raw_data_map = read_raw_data_bulk(unique_names)
+
+    results = []
     for uniq,current_url in zip(unique_names, urls):
-        raw_data = read_raw_data(uniq)
+        raw_data = raw_data_map.get(uniq, "")
         if not raw_data:
             print(f"No raw_data found for {uniq}, skipping pagination.")
+            if on_result is not None:
+                on_result(None)
             continue
-        response_schema=get_pagination_response_format()
-        full_indication=build_pagination_prompt(indication,current_url)
-        pag_data, token_counts, cost = call_llm_model(raw_data, response_schema,selected_model, full_indication)
+        with trace_page(uniq):
+            try:
+                pag_data, token_counts, cost = detect_pagination_with_rules(raw_data, current_url, indication)
+                if pag_data is None:
+                    response_schema=get_pagination_response_format()
+                    page_instruction=build_pagination_instruction(indication,current_url)
+                    pag_data, token_counts, cost = call_llm_model(prepare_pagination_markdown(raw_data), response_schema,selected_model, get_pagination_system_message(), page_instruction)
 
-        # store
-        save_pagination_data(uniq, pag_data)
+                # store
+                save_pagination_data(uniq, pag_data, write_buffer)
+            except Exception as e:
+                results.append(failed_pagination_result(uniq, e))
+            else:
+                results.append((uniq, pag_data, token_counts, cost))
+        if on_result is not None:
+            on_result(results[-1])
 
-        # accumulate cost
-        
-        total_input_tokens += token_counts["input_tokens"]
-        total_output_tokens += token_counts["output_tokens"]
-        total_cost += cost
+    return sum_pagination_usage(results)
 
-        pagination_results.append({"unique_name": uniq,"pagination_data": pag_data})
+async def apaginate_urls(unique_names: List[str], selected_model: str, indication: str, urls:List[str], raw_data_map: Dict[str, str] = None, write_buffer: WriteBuffer = None, on_result=None):
+    """
+    Async version of paginate_urls: every page is analyzed concurrently through
+    acall_llm_model, within the provider's concurrency and rate limits.
+    Results come back in input order with the same totals as paginate_urls;
+    on_result is called as each page completes.
+    """
+    if write_buffer is None:
+        with WriteBuffer() as run_buffer:
+            return await apaginate_urls(unique_names, selected_model, indication, urls, raw_data_map, run_buffer, on_result)
 
-    return total_input_tokens, total_output_tokens, total_cost, pagination_results
+    if raw_data_map is None:
+        raw_data_map = await asyncio.to_thread(read_raw_data_bulk, unique_names)
+
+    async def paginate_one(uniq, current_url):
+        raw_data = raw_data_map.get(uniq, "")
+        if not raw_data:
+            print(f"No raw_data found for {uniq}, skipping pagination.")
+            result = None
+        else:
+            try:
+                result = await apaginate_page(uniq, raw_data, current_url, selected_model, indication, write_buffer)
+            except Exception as e:
+                result = failed_pagination_result(uniq, e)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    results = await asyncio.gather(*(paginate_one(uniq, current_url) for uniq, current_url in zip(unique_names, urls)))
+    return sum_pagination_usage(results)
+
+async def apaginate_page(uniq: str, raw_data: str, current_url: str, selected_model: str, indication: str, write_buffer: WriteBuffer = None):
+    """
+    Detects and stores the pagination of one page.
+    Returns (unique_name, pagination_data, token_counts, cost).
+    """
+    with trace_page(uniq):
+        pag_data, token_counts, cost = detect_pagination_with_rules(raw_data, current_url, indication)
+        if pag_data is None:
+            response_schema=get_pagination_response_format()
+            page_instruction=build_pagination_instruction(indication,current_url)
+            pag_data, token_counts, cost = await acall_llm_model(prepare_pagination_markdown(raw_data), response_schema,selected_model, get_pagination_system_message(), page_instruction)
+
+        # store (queued when there is a buffer; it writes in the background)
+        save_pagination_data(uniq, pag_data, write_buffer)
+    return uniq, pag_data, token_counts, cost
+
+def get_page_urls(pagination_data) -> List[str]:
+    """
+    Returns the page_urls of a pagination result, whether it is a
+    PaginationModel, a dict or the LLM's JSON string.
+    """
+    if hasattr(pagination_data, "page_urls"):
+        return list(pagination_data.page_urls)
+    if isinstance(pagination_data, str):
+        try:
+            pagination_data = json.loads(pagination_data)
+        except json.JSONDecodeError:
+            return []
+    if isinstance(pagination_data, dict) and isinstance(pagination_data.get("page_urls"), list):
+        return [url for url in pagination_data["page_urls"] if isinstance(url, str)]
+    return []
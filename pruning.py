@@ -0,0 +1,149 @@
+# pruning.py
+
+import re
+from typing import List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from assets import PRUNING_STEPS, BOILERPLATE_KEYWORDS, LONG_URL_CHARS
+from chunking import split_markdown_blocks, estimate_tokens
+from utils import TRACKING_PARAMS
+
+IMAGE_RE = re.compile(r"!\[([^\]]*)\]\(([^)]*)\)")
+LINK_RE = re.compile(r"(?<!!)\[([^\]]*)\]\((\S+?)(\s+\"[^\"]*\")?\)")
+LINK_ONLY_LINE_RE = re.compile(r"^\s*([-*+]|\d+[.)])?\s*(\[[^\]]*\]\([^)]*\)[\s|·•/,-]*)+$")
+BOILERPLATE_RE = re.compile("|".join(re.escape(keyword) for keyword in BOILERPLATE_KEYWORDS), re.IGNORECASE)
+
+# a block is boilerplate only if it is short; long blocks may hold real content
+MAX_BOILERPLATE_BLOCK_CHARS = 400
+# navigation menus sit in this fraction of blocks at the top or bottom of a page
+NAVIGATION_EDGE_FRACTION = 0.15
+MAX_NAVIGATION_LINK_TEXT_CHARS = 25
+
+
+def _mentions_field(text: str, fields: List[str]) -> bool:
+    lowered = text.lower()
+    return any(field.lower() in lowered for field in fields)
+
+
+def drop_image_links(markdown: str, fields: List[str]) -> str:
+    """Replaces images with their alt text, unless an image field was requested."""
+    if any(word in field.lower() for field in fields for word in ("image", "img", "photo", "picture", "thumbnail")):
+        return markdown
+    return IMAGE_RE.sub(lambda match: match.group(1), markdown)
+
+
+def _strip_tracking(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+def strip_tracking_params(markdown: str, fields: List[str]) -> str:
+    """Removes utm_* and other tracking parameters from link URLs."""
+    return LINK_RE.sub(lambda match: f"[{match.group(1)}]({_strip_tracking(match.group(2))})", markdown)
+
+
+def strip_boilerplate(markdown: str, fields: List[str]) -> str:
+    """Drops short blocks such as cookie banners, newsletter prompts and copyright footers."""
+    kept = []
+    for block in split_markdown_blocks(markdown):
+        if len(block) <= MAX_BOILERPLATE_BLOCK_CHARS and BOILERPLATE_RE.search(block) and not _mentions_field(block, fields):
+            continue
+        kept.append(block)
+    return "\n\n".join(kept)
+
+
+def _is_navigation_block(block: str) -> bool:
+    lines = [line for line in block.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    if len(lines) < 3:
+        return False
+    link_only = [line for line in lines if LINK_ONLY_LINE_RE.match(line)]
+    if len(link_only) < 0.8 * len(lines):
+        return False
+    texts = [match.group(1) for line in link_only for match in LINK_RE.finditer(line)]
+    return bool(texts) and sum(len(text) for text in texts) / len(texts) <= MAX_NAVIGATION_LINK_TEXT_CHARS
+
+
+def drop_navigation_sections(markdown: str, fields: List[str]) -> str:
+    """
+    Drops menus: blocks made almost only of short links, near the top or bottom
+    of the page, that don't mention any of the requested fields.
+    """
+    blocks = split_markdown_blocks(markdown)
+    edge = max(1, int(len(blocks) * NAVIGATION_EDGE_FRACTION))
+    kept = []
+    for index, block in enumerate(blocks):
+        at_edge = index < edge or index >= len(blocks) - edge
+        if at_edge and _is_navigation_block(block) and not _mentions_field(block, fields):
+            continue
+        kept.append(block)
+    return "\n\n".join(kept)
+
+
+def collapse_link_urls(markdown: str, fields: List[str]) -> str:
+    """
+    Rewrites links whose URL is long or repeated as reference-style links,
+    so every such URL is written out only once at the end of the page.
+    """
+    counts = {}
+    for match in LINK_RE.finditer(markdown):
+        counts[match.group(2)] = counts.get(match.group(2), 0) + 1
+
+    references = {}
+
+    def replace(match):
+        url = match.group(2)
+        if counts[url] < 2 and len(url) <= LONG_URL_CHARS:
+            return match.group(0)
+        if url not in references:
+            references[url] = len(references) + 1
+        return f"[{match.group(1)}][{references[url]}]"
+
+    collapsed = LINK_RE.sub(replace, markdown)
+    if not references:
+        return collapsed
+    definitions = "\n".join(f"[{number}]: {url}" for url, number in references.items())
+    return f"{collapsed}\n\n{definitions}"
+
+
+PRUNING_FUNCTIONS = {
+    "drop_image_links": drop_image_links,
+    "strip_tracking_params": strip_tracking_params,
+    "strip_boilerplate": strip_boilerplate,
+    "drop_navigation_sections": drop_navigation_sections,
+    "collapse_link_urls": collapse_link_urls,
+}
+
+# steps that would remove or rewrite the links pagination detection relies on
+LINK_STEPS = {"drop_navigation_sections", "collapse_link_urls"}
+# steps whose output for a block depends on the rest of the page
+# (collapse_link_urls numbers references across it); incremental extraction
+# runs them only on the markdown it sends
+PAGE_WIDE_STEPS = {"collapse_link_urls"}
+
+
+def prune_markdown(markdown: str, fields: List[str] = None, keep_links: bool = False, steps: List[str] = PRUNING_STEPS):
+    """
+    Runs the configured pruning steps over a page's markdown before it is sent
+    to the LLM. With keep_links=True (pagination, or a requested link/URL
+    field) the steps that drop or rewrite links are skipped.
+
+    Returns (pruned_markdown, stats) where stats is
+        {"tokens_before": int, "tokens_after": int}  (estimated tokens)
+    """
+    fields = fields or []
+    if any(word in field.lower() for field in fields for word in ("link", "url", "href")):
+        keep_links = True
+
+    pruned = markdown
+    for step in steps:
+        if keep_links and step in LINK_STEPS:
+            continue
+        pruned = PRUNING_FUNCTIONS[step](pruned, fields)
+
+    stats = {"tokens_before": estimate_tokens(markdown), "tokens_after": estimate_tokens(pruned)}
+    return pruned, stats
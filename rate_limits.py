@@ -0,0 +1,87 @@
+# rate_limits.py
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from assets import MODELS_USED, PROVIDER_RATE_LIMITS, DEFAULT_PROVIDER_RATE_LIMITS
+
+WINDOW_SECONDS = 60.0
+
+
+def get_provider(model: str) -> str:
+    """
+    Returns the provider of a model, identified by the API key name
+    it uses in MODELS_USED (e.g. "OPENAI_API_KEY").
+    """
+    return list(MODELS_USED[model])[0]
+
+
+class AsyncRateLimiter:
+    """
+    Limits concurrent requests, requests per minute and tokens per minute
+    for one provider, using a sliding one-minute window.
+
+    Usage:
+        async with limiter.limit(estimated_tokens) as usage:
+            response = await acompletion(...)
+            usage["tokens"] = actual_tokens   # optional correction
+    """
+
+    def __init__(self, max_concurrency: int = 5, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._window = deque()  # [timestamp, usage dict]
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        self._prune(now)
+        if not self._window:
+            return 0.0
+        oldest = self._window[0][0]
+        if self.rpm is not None and len(self._window) >= self.rpm:
+            return WINDOW_SECONDS - (now - oldest)
+        if self.tpm is not None:
+            used = sum(usage["tokens"] for _, usage in self._window)
+            if used + tokens > self.tpm:
+                return WINDOW_SECONDS - (now - oldest)
+        return 0.0
+
+    async def _reserve(self, tokens: int) -> dict:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                delay = self._wait_time(tokens, now)
+                if delay <= 0:
+                    usage = {"tokens": tokens}
+                    self._window.append((now, usage))
+                    return usage
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int = 0):
+        async with self._semaphore:
+            usage = await self._reserve(estimated_tokens)
+            yield usage
+
+
+# One set of limiters per event loop: asyncio primitives can't cross loops.
+_limiters = weakref.WeakKeyDictionary()
+
+def get_rate_limiter(model: str) -> AsyncRateLimiter:
+    """
+    Returns the shared rate limiter of the model's provider for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    per_loop = _limiters.setdefault(loop, {})
+    provider = get_provider(model)
+    if provider not in per_loop:
+        limits = PROVIDER_RATE_LIMITS.get(provider, DEFAULT_PROVIDER_RATE_LIMITS)
+        per_loop[provider] = AsyncRateLimiter(limits.get("max_concurrency", 5), limits.get("rpm"), limits.get("tpm"))
+    return per_loop[provider]
@@ -0,0 +1,265 @@
+# resilience.py
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from assets import (LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS,
+                    LLM_HEDGING_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+from rate_limits import get_provider
+from tracing import get_tracer
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+@lru_cache(maxsize=1)
+def retryable_errors() -> tuple:
+    """Exception types worth retrying; litellm is imported on the first failed call."""
+    import litellm
+    # not every litellm version has all of these
+    return tuple(
+        getattr(litellm, name) for name in ("RateLimitError", "Timeout", "APIConnectionError", "ServiceUnavailableError", "InternalServerError")
+        if hasattr(litellm, name)
+    ) + (TimeoutError, asyncio.TimeoutError, ConnectionError)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a provider whose circuit is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, rate limits (429) and server errors (5xx) are worth retrying."""
+    if isinstance(error, retryable_errors()):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception):
+    """The wait the provider asked for (Retry-After / retry-after-ms headers), or None."""
+    headers = getattr(error, "litellm_response_headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    headers = {str(name).lower(): value for name, value in dict(headers).items()}
+    if headers.get("retry-after-ms") is not None:
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Exponential backoff with full jitter (a random wait up to base * 2^attempt),
+    so clients that failed together don't retry together. A Retry-After from
+    the provider is waited at least.
+    """
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Sheds load from a degraded provider:
+      closed     requests go through; `failure_threshold` retryable failures
+                 in a row open the circuit
+      open       requests fail at once with CircuitOpenError for `reset_seconds`
+      half-open  then a single trial request goes through: success closes
+                 the circuit, failure opens it again
+    Thread-safe, so the sync and async paths share one breaker per provider.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> None:
+        """Returns if a request may be sent now, else raises CircuitOpenError."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at >= self.reset_seconds and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        raise CircuitOpenError(f"{self.name} is failing; its requests are paused for up to {self.reset_seconds:.0f}s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is None and self.failures < self.failure_threshold:
+                return
+            newly_opened = self.opened_at is None
+            self.opened_at = time.monotonic()
+        if newly_opened:
+            RED = "\033[31m"
+            RESET = "\033[0m"
+            print(f"{RED}INFO:Circuit opened for {self.name} after {self.failures} failed requests{RESET}")
+
+
+class LatencyTracker:
+    """Recent request latencies of one provider, for the hedging threshold."""
+
+    def __init__(self, size: int = 200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1):
+        """The latency below which `fraction` of recent requests finished, or None with too few samples."""
+        with self._lock:
+            values = sorted(self._values)
+        if not values or len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+_lock = threading.Lock()
+_breakers = {}
+_latencies = {}
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Returns the shared circuit breaker of the model's provider."""
+    provider = get_provider(model)
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+def get_latency_tracker(model: str) -> LatencyTracker:
+    """Returns the shared latency tracker of the model's provider."""
+    provider = get_provider(model)
+    with _lock:
+        if provider not in _latencies:
+            _latencies[provider] = LatencyTracker()
+        return _latencies[provider]
+
+
+def _after_failure(error: Exception, attempt: int, model: str, breaker: CircuitBreaker) -> float:
+    """
+    Books a failed attempt and returns how long to wait before the next one,
+    or raises the error when it shouldn't be retried.
+    """
+    if not is_retryable(error):
+        # the provider answered (bad request, auth, ...): it is not degraded
+        breaker.record_success()
+        raise error
+    breaker.record_failure()
+    if attempt >= LLM_MAX_RETRIES:
+        raise error
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None and retry_after > LLM_BACKOFF_MAX_SECONDS:
+        raise error
+    delay = backoff_delay(attempt, retry_after)
+    get_tracer().record("llm.retry", time.time(), delay, model=model, attempt=attempt + 1, error=type(error).__name__, retry_after=retry_after)
+    YELLOW = "\033[33m"
+    RESET = "\033[0m"
+    print(f"{YELLOW}INFO:{model} request failed ({type(error).__name__}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s{RESET}")
+    return delay
+
+
+def call_with_retries(send, model: str):
+    """
+    Calls send() (one request to the model's provider) through the provider's
+    circuit breaker. Timeouts, 429s and 5xx errors are retried up to
+    LLM_MAX_RETRIES times with jittered exponential backoff that honors
+    Retry-After; other errors, and the last failure, are raised.
+    """
+    breaker = get_circuit_breaker(model)
+    attempt = 0
+    while True:
+        breaker.allow()
+        try:
+            response = send()
+        except Exception as e:
+            time.sleep(_after_failure(e, attempt, model, breaker))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return response
+
+
+async def _send_hedged(send, model: str):
+    """
+    Awaits send(); if it is still running after the provider's recent
+    LLM_HEDGE_PERCENTILE latency, sends one duplicate and returns whichever
+    answers first (the other is cancelled). Fails only if both fail.
+    """
+    threshold = get_latency_tracker(model).percentile(LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    first = asyncio.ensure_future(send())
+    tasks = [first]
+    try:
+        if threshold is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            tasks.append(asyncio.ensure_future(send()))
+            get_tracer().record("llm.hedge", time.time(), threshold, model=model)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        return first.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def acall_with_retries(send, model: str, hedge: bool = LLM_HEDGING_ENABLED):
+    """
+    Async version of call_with_retries: send is a coroutine function. With
+    hedge=True each attempt may send a duplicate request (see _send_hedged).
+    """
+    breaker = get_circuit_breaker(model)
+    attempt = 0
+    while True:
+        breaker.allow()
+        try:
+            response = await (_send_hedged(send, model) if hedge else send())
+        except Exception as e:
+            await asyncio.sleep(_after_failure(e, attempt, model, breaker))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return response
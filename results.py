@@ -0,0 +1,130 @@
+# results.py
+
+import io
+import json
+import math
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, List
+from assets import EXPORT_CHUNK_ROWS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def normalize_parsed_data(parsed_data):
+    """
+    Returns parsed data as plain Python data: pydantic models are dumped and
+    JSON strings decoded (strings that aren't JSON are returned unchanged).
+    """
+    if hasattr(parsed_data, "model_dump"):
+        return parsed_data.model_dump()
+    if isinstance(parsed_data, str):
+        try:
+            return json.loads(parsed_data)
+        except json.JSONDecodeError:
+            return parsed_data
+    return parsed_data
+
+
+def listing_rows(parsed_data) -> list:
+    """Table rows for one page's parsed data: one row per listing when it has 'listings'."""
+    parsed_data = normalize_parsed_data(parsed_data)
+    if isinstance(parsed_data, dict) and isinstance(parsed_data.get("listings"), list):
+        return parsed_data["listings"]
+    return [{"parsed_data": parsed_data}]
+
+
+def build_results_table(parsed_results: List[dict]) -> "pd.DataFrame":
+    """
+    Turns the parsed results of a run ({"unique_name", "parsed_data", ...})
+    into one table with a row per listing, in a single pass: every page is
+    normalized once and the rows go to pandas as one batch of records.
+    Pages without listings become one row holding their parsed_data.
+    """
+    import pandas as pd
+    records = []
+    for result in parsed_results:
+        if isinstance(result, dict) and "parsed_data" in result:
+            records.extend(listing_rows(result["parsed_data"]))
+    return pd.DataFrame.from_records(records)
+
+
+def build_pagination_table(pagination_results: List[dict]) -> "pd.DataFrame":
+    """One row per page URL found, with the unique_name of the page it was found on."""
+    import pandas as pd
+    unique_names = []
+    page_urls = []
+    for result in pagination_results:
+        if not isinstance(result, dict):
+            continue
+        pagination_data = normalize_parsed_data(result.get("pagination_data"))
+        urls = pagination_data.get("page_urls") if isinstance(pagination_data, dict) else None
+        if isinstance(urls, list):
+            page_urls.extend(urls)
+            unique_names.extend([result.get("unique_name")] * len(urls))
+    return pd.DataFrame({"page_url": page_urls, "unique_name": unique_names})
+
+
+def to_json_bytes(parsed_results: List[dict]) -> bytes:
+    """The parsed results of a run as one JSON document."""
+    documents = [
+        {**result, "parsed_data": normalize_parsed_data(result.get("parsed_data"))} if isinstance(result, dict) else result
+        for result in parsed_results
+    ]
+    return json.dumps(documents, default=str, indent=4).encode("utf-8")
+
+
+def iter_csv_chunks(table: "pd.DataFrame", chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """The table as CSV, yielded as encoded chunks: the header, then `chunk_rows` rows at a time."""
+    yield table.iloc[0:0].to_csv(index=False).encode("utf-8")
+    for start in range(0, len(table), chunk_rows):
+        yield table.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode("utf-8")
+
+
+def iter_ndjson_chunks(table: "pd.DataFrame", chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per row, yielded as encoded chunks of `chunk_rows` lines."""
+    if table.empty:
+        return
+    for start in range(0, len(table), chunk_rows):
+        lines = table.iloc[start:start + chunk_rows].to_json(orient="records", lines=True, force_ascii=False)
+        # older pandas versions leave out the final newline
+        yield (lines if lines.endswith("\n") else lines + "\n").encode("utf-8")
+
+
+def write_export(chunks: Iterable[bytes], file: BinaryIO) -> int:
+    """Writes an export chunk by chunk to a binary file object and returns the number of bytes written."""
+    written = 0
+    for chunk in chunks:
+        file.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def to_csv_bytes(table: "pd.DataFrame") -> bytes:
+    return b"".join(iter_csv_chunks(table))
+
+
+def to_ndjson_bytes(table: "pd.DataFrame") -> bytes:
+    """One JSON object per row, for streaming into other tools."""
+    return b"".join(iter_ndjson_chunks(table))
+
+
+def _is_text_or_missing(value) -> bool:
+    return value is None or isinstance(value, str) or (isinstance(value, float) and math.isnan(value))
+
+
+def to_parquet_bytes(table: "pd.DataFrame"):
+    """
+    The table as Parquet, or None when no Parquet engine (pyarrow) is installed.
+    Mixed-type columns are written as strings.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:  # Parquet export is optional
+        return None
+    table = table.copy()
+    for column in table.columns[table.dtypes == object]:
+        if not table[column].map(_is_text_or_missing).all():
+            table[column] = table[column].map(lambda value: value if _is_text_or_missing(value) else json.dumps(value, default=str))
+    buffer = io.BytesIO()
+    table.to_parquet(buffer, index=False)
+    return buffer.getvalue()
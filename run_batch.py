@@ -0,0 +1,278 @@
+# run_batch.py
+"""
+Headless batch runner: runs the same fetch / scrape / paginate pipeline as the
+Streamlit app, without a browser tab.
+
+Every URL's progress through the stages is recorded in a JSON checkpoint file
+after each batch, so an interrupted job started again with the same arguments
+resumes where it stopped instead of re-crawling and re-billing finished pages.
+
+Example:
+    python run_batch.py --urls urls.txt --fields "name,price" --model gpt-4o-mini --pagination
+
+With --batch-job the scrape stage is sent as one provider batch job
+(cheaper, no rate limiting, results once the whole job is done).
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from assets import MODELS_USED, CRAWL_MAX_CONCURRENCY, BATCH_POLL_SECONDS
+from markdown import crawl_and_store_markdowns, read_raw_data_bulk
+from scraper import scrape_urls
+from pagination import paginate_urls
+from utils import dedupe_urls, generate_run_id, generate_unique_name
+from write_buffer import WriteBuffer
+from tracing import get_tracer, set_run_id, RunProfiler
+from cascade import summarize_cascade, cascade_tier_rows
+from batch_jobs import submit_extraction_job, wait_for_job, collect_extraction_results
+
+STAGES = ("fetch", "scrape", "paginate")
+
+
+def load_urls(path: str):
+    """Reads URLs from a file, one per line (blank lines and # comments are ignored)."""
+    with open(path, encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return dedupe_urls(urls)
+
+
+def load_checkpoint(path: str, urls, config: dict) -> dict:
+    """
+    Loads the checkpoint for this job, or starts a new one. A checkpoint from
+    a job with different fields, model or pagination settings is not reused.
+    """
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("config") == config:
+            for url in urls:
+                checkpoint["urls"].setdefault(url, _new_url_state(url))
+            return checkpoint
+        print(f"Checkpoint {path} belongs to a different job configuration, starting over.")
+    return {
+        "run_id": generate_run_id(),
+        "config": config,
+        "urls": {url: _new_url_state(url) for url in urls},
+        "usage": {stage: {"input_tokens": 0, "output_tokens": 0, "cost": 0} for stage in ("scrape", "paginate")},
+    }
+
+
+def _new_url_state(url: str) -> dict:
+    return {"unique_name": generate_unique_name(url), "fetch": "pending", "scrape": "pending", "paginate": "pending", "error": None}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    """Writes the checkpoint atomically, so an interruption never leaves it half written."""
+    checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def append_results(path: str, stage: str, results) -> None:
+    """Appends one JSON line per result to the output file."""
+    if not path:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps({"stage": stage, **result}, default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o)) + "\n")
+
+
+def _batches(items, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _pending(checkpoint: dict, stage: str):
+    states = checkpoint["urls"]
+    if stage == "fetch":
+        return [url for url, state in states.items() if state["fetch"] != "done"]
+    return [url for url, state in states.items() if state["fetch"] == "done" and state[stage] not in ("done", "skipped")]
+
+
+def run_fetch(checkpoint: dict, args) -> None:
+    pending = _pending(checkpoint, "fetch")
+    for batch in _batches(pending, args.batch_size):
+        for report in crawl_and_store_markdowns(batch, args.concurrency, force_refresh=args.force_refresh):
+            state = checkpoint["urls"][report["url"]]
+            state["fetch"] = "failed" if report["status"] == "failed" else "done"
+            state["error"] = report["error"]
+        save_checkpoint(args.checkpoint, checkpoint)
+        print(f"fetch: {len(batch)} URLs processed")
+
+
+def run_llm_stage(checkpoint: dict, stage: str, args) -> None:
+    pending = _pending(checkpoint, stage)
+    usage = checkpoint["usage"][stage]
+    for batch in _batches(pending, args.batch_size):
+        unique_names = [checkpoint["urls"][url]["unique_name"] for url in batch]
+        raw_data_map = read_raw_data_bulk(unique_names)
+        with WriteBuffer() as write_buffer:
+            if stage == "scrape":
+                input_tokens, output_tokens, cost, results = scrape_urls(unique_names, args.fields, args.model, parallel=True, raw_data_map=raw_data_map, write_buffer=write_buffer, cascade=args.cascade, dedupe=args.dedupe, incremental=args.incremental)
+            else:
+                input_tokens, output_tokens, cost, results = paginate_urls(unique_names, args.model, args.pagination_details, batch, parallel=True, raw_data_map=raw_data_map, write_buffer=write_buffer)
+        record_stage_results(checkpoint, stage, batch, unique_names, (input_tokens, output_tokens, cost, results), write_buffer, args)
+        print(f"{stage}: {len(batch)} URLs processed, total cost so far ${usage['cost']:.4f}")
+
+
+def run_scrape_batch_job(checkpoint: dict, args) -> None:
+    """
+    Runs the scrape stage as one provider batch job (see batch_jobs.py). The
+    submitted job is kept in the checkpoint, so a resumed run polls it
+    instead of submitting (and paying for) it again.
+    """
+    job = checkpoint.get("batch_job")
+    if job is None:
+        pending = _pending(checkpoint, "scrape")
+        if not pending:
+            return
+        unique_names = [checkpoint["urls"][url]["unique_name"] for url in pending]
+        job = submit_extraction_job(unique_names, args.fields, args.model)
+        checkpoint["batch_job"] = job
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    status = wait_for_job(job, poll_seconds=args.poll_seconds)
+    # saved together with the results below, so a job is never collected twice
+    checkpoint.pop("batch_job")
+    if status != "completed":
+        print(f"scrape: batch job {job['job_id']} ended as {status}, it will be submitted again on the next run")
+        save_checkpoint(args.checkpoint, checkpoint)
+        return
+    urls_by_name = {state["unique_name"]: url for url, state in checkpoint["urls"].items()}
+    unique_names = list(job["pages"]) + job["skipped"]
+    with WriteBuffer() as write_buffer:
+        stage_usage = collect_extraction_results(job, write_buffer=write_buffer)
+    record_stage_results(checkpoint, "scrape", [urls_by_name[uniq] for uniq in unique_names], unique_names, stage_usage, write_buffer, args)
+    print(f"scrape: batch job {job['job_id']} collected, total cost so far ${checkpoint['usage']['scrape']['cost']:.4f}")
+
+
+def record_stage_results(checkpoint: dict, stage: str, urls, unique_names, stage_usage, write_buffer: WriteBuffer, args) -> None:
+    """
+    Marks each URL of a finished batch done, failed or skipped, adds the
+    batch's usage, appends the results to the output file and saves the checkpoint.
+    """
+    input_tokens, output_tokens, cost, results = stage_usage
+    usage = checkpoint["usage"][stage]
+    failed_writes = {row["unique_name"] for row in write_buffer.failed_rows}
+    # pages whose LLM calls still failed after retries; retried when the job is resumed
+    failed_pages = {result["unique_name"]: result["error"] for result in results if result.get("error")}
+    done = {result["unique_name"] for result in results} - failed_writes - set(failed_pages)
+    for url, uniq in zip(urls, unique_names):
+        state = checkpoint["urls"][url]
+        if uniq in done:
+            state[stage] = "done"
+        elif uniq in failed_pages:
+            state[stage] = "failed"
+            state["error"] = failed_pages[uniq]
+        elif uniq in failed_writes:
+            state[stage] = "failed"
+            state["error"] = "result could not be saved"
+        else:
+            state[stage] = "skipped"  # no raw_data to work on
+    usage["input_tokens"] += input_tokens
+    usage["output_tokens"] += output_tokens
+    usage["cost"] += cost
+    if stage == "scrape" and args.cascade:
+        summarize_cascade(results, checkpoint.setdefault("cascade", {}))
+    append_results(args.output, stage, [result for result in results if result["unique_name"] in done])
+    save_checkpoint(args.checkpoint, checkpoint)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the fetch / scrape / paginate pipeline headless, with resumable checkpoints.")
+    parser.add_argument("--urls", required=True, help="File with one URL per line")
+    parser.add_argument("--fields", default="", help="Comma-separated fields to extract (omit to skip scraping)")
+    parser.add_argument("--model", default=list(MODELS_USED)[0], choices=list(MODELS_USED), help="LLM used for extraction and pagination")
+    parser.add_argument("--cascade", action="store_true", help="Extract with the cheapest model first and escalate pages whose output fails validation (--model is the fallback)")
+    parser.add_argument("--dedupe", action="store_true", help="Pages that are near-copies of an earlier page of the same batch reuse its extraction (see near_duplicates.py)")
+    parser.add_argument("--incremental", action="store_true", help="Pages scraped before with the same fields, model and prompt only send their changed blocks to the LLM (see incremental.py)")
+    parser.add_argument("--batch-job", action="store_true", help="Scrape through a provider batch job (see batch_jobs.py) instead of real-time calls")
+    parser.add_argument("--poll-seconds", type=float, default=BATCH_POLL_SECONDS, help="How often a batch job's status is checked")
+    parser.add_argument("--pagination", action="store_true", help="Also detect pagination URLs")
+    parser.add_argument("--pagination-details", default="", help="Free-text indications about the pagination")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <urls file>.checkpoint.json)")
+    parser.add_argument("--output", help="JSON lines file the results are appended to (default: <urls file>.results.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=25, help="URLs per batch; the checkpoint is saved after each batch")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_MAX_CONCURRENCY, help="Pages crawled at the same time")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore cached pages and crawl every URL again")
+    parser.add_argument("--trace-output", help="Append the run's timing spans to this JSON lines file")
+    parser.add_argument("--metrics-output", help="Write the run's span metrics to this file in Prometheus text format")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and print the slowest calls")
+    parser.add_argument("--verbose", action="store_true", help="Log per-page progress (pages stored, pruned, saved, ...)")
+    args = parser.parse_args(argv)
+    args.fields = [field.strip() for field in args.fields.split(",") if field.strip()]
+    args.checkpoint = args.checkpoint or f"{args.urls}.checkpoint.json"
+    args.output = args.output or f"{args.urls}.results.jsonl"
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.verbose:
+        # only the pipeline's own loggers: litellm and httpx are very chatty at debug level
+        logging.basicConfig(format="%(levelname)s:%(name)s:%(message)s")
+        for name in ("markdown", "scraper", "pagination"):
+            logging.getLogger(name).setLevel(logging.DEBUG)
+    if not args.fields and not args.pagination:
+        print("Nothing to do: pass --fields and/or --pagination.")
+        return 2
+    if args.batch_job and args.cascade:
+        print("--batch-job and --cascade can't be combined: a batch job is sent to one model.")
+        return 2
+    if args.batch_job and args.dedupe:
+        print("--batch-job and --dedupe can't be combined: every page of a batch job is sent as its own request.")
+        return 2
+    if args.batch_job and args.incremental:
+        print("--batch-job and --incremental can't be combined: a batch job sends every page whole.")
+        return 2
+
+    urls = load_urls(args.urls)
+    config = {"fields": args.fields, "model": args.model, "cascade": args.cascade, "pagination": args.pagination, "pagination_details": args.pagination_details}
+    checkpoint = load_checkpoint(args.checkpoint, urls, config)
+    print(f"Run {checkpoint['run_id']}: {len(urls)} URLs, checkpoint {args.checkpoint}")
+    set_run_id(checkpoint["run_id"])
+
+    profiler = RunProfiler(checkpoint["run_id"]) if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        run_fetch(checkpoint, args)
+        if args.fields and args.batch_job:
+            run_scrape_batch_job(checkpoint, args)
+        elif args.fields:
+            run_llm_stage(checkpoint, "scrape", args)
+        if args.pagination:
+            run_llm_stage(checkpoint, "paginate", args)
+    finally:
+        if profiler is not None:
+            print(profiler.stop()["top"])
+        # a resumed job keeps its run_id, so its spans add up in the same trace
+        if args.trace_output:
+            get_tracer().export_jsonl(args.trace_output, checkpoint["run_id"])
+        if args.metrics_output:
+            with open(args.metrics_output, "w", encoding="utf-8") as f:
+                f.write(get_tracer().to_prometheus(checkpoint["run_id"]))
+
+    states = checkpoint["urls"].values()
+    for stage in STAGES:
+        counts = {}
+        for state in states:
+            counts[state[stage]] = counts.get(state[stage], 0) + 1
+        print(f"{stage}: {counts}")
+    total_cost = sum(usage["cost"] for usage in checkpoint["usage"].values())
+    print(f"Total cost: ${total_cost:.4f}")
+    llm_calls_summary = get_tracer().summary(checkpoint["run_id"]).get("llm.call", {})
+    print(f"Provider-cached input tokens this session: {llm_calls_summary.get('cached_input_tokens', 0)} of {llm_calls_summary.get('input_tokens', 0)}")
+    for row in cascade_tier_rows(checkpoint.get("cascade", {})):
+        print(f"cascade tier {row['tier']} {row['model']}: {row['accepted']}/{row['attempts']} accepted ({row['hit_rate']:.0%}), mean {row['mean_latency_s']}s, cost ${row['cost']:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,28 @@
 # scraper.py
 
+import asyncio
 import json
-from typing import List
-from pydantic import BaseModel, create_model
-from assets import (OPENAI_MODEL_FULLNAME,GEMINI_MODEL_FULLNAME,SYSTEM_MESSAGE)
-from llm_calls import (call_llm_model)
-from markdown import read_raw_data
-from api_management import get_supabase_client
-from utils import  generate_unique_name
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, List, get_args
+from pydantic import BaseModel, ValidationError, create_model
+from assets import (OPENAI_MODEL_FULLNAME,GEMINI_MODEL_FULLNAME,SYSTEM_MESSAGE,PRUNING_ENABLED,PRUNING_STEPS,INCREMENTAL_EXTRACTION_ENABLED,NEAR_DUPLICATE_DETECTION_ENABLED)
+from llm_calls import (call_llm_model, acall_llm_model)
+from markdown import read_raw_data, read_raw_data_bulk, read_fingerprints_bulk
+from storage import get_storage
+from utils import  generate_unique_name, run_async
+from chunking import split_for_model, estimate_tokens
+from pruning import prune_markdown, PAGE_WIDE_STEPS
+from write_buffer import WriteBuffer
+from tracing import get_tracer, trace_page
+from cascade import get_cascade_models, validate_extraction, pick_cascade_result
+from incremental import MANIFEST_KEY, plan_incremental, build_manifest, merge_incremental
+from near_duplicates import simhash, parse_fingerprint, find_near_duplicates
 
-supabase = get_supabase_client()
+# per-page details (pruning, incremental plans, cascade tiers) are debug logs;
+# batch-level INFO lines and errors are still printed
+logger = logging.getLogger(__name__)
 
 def create_dynamic_listing_model(field_names: List[str]):
     field_definitions = {field: (str, ...) for field in field_names}
@@ -40,58 +53,536 @@ def generate_system_message(listing_model: BaseModel) -> str:
 
     return final_prompt
 
+@lru_cache(maxsize=128)
+def get_listing_models(fields: tuple):
+    """
+    Returns (DynamicListingModel, DynamicListingsContainer) for a field set,
+    built once per field set instead of on every scrape_urls call.
+    """
+    listing_model = create_dynamic_listing_model(list(fields))
+    return listing_model, create_listings_container_model(listing_model)
+
+@lru_cache(maxsize=128)
+def get_extraction_system_message(fields: tuple) -> str:
+    """
+    The system prompt (instructions + schema) for a field set, built once.
+    It is the same for every page and every model, so it forms a stable
+    prefix that provider-side prompt caching can reuse across pages;
+    the page itself always goes last, in the user message.
+    """
+    return generate_system_message(get_listing_models(fields)[0])
+
 
-def save_formatted_data(unique_name: str, formatted_data):
+def save_formatted_data(unique_name: str, formatted_data, write_buffer: WriteBuffer = None, block_manifest: dict = None, duplicate_of: str = None):
+    """
+    Store formatted_data for this unique_name. With a write_buffer the write
+    is queued and flushed in bulk later, instead of one update per page.
+    A block_manifest (see incremental.py) is stored alongside the listings;
+    duplicate_of names the page the listings were copied from.
+    """
     if isinstance(formatted_data, str):
-        try:
-            data_json = json.loads(formatted_data)
-        except json.JSONDecodeError:
-            data_json = {"raw_text": formatted_data}
+        with get_tracer().span("json.parse", unique_name=unique_name, bytes=len(formatted_data)) as span:
+            try:
+                data_json = json.loads(formatted_data)
+            except json.JSONDecodeError:
+                span["error"] = "invalid JSON"
+                data_json = {"raw_text": formatted_data}
     elif hasattr(formatted_data, "dict"):
         data_json = formatted_data.dict()
     else:
         data_json = formatted_data
+    if block_manifest is not None and isinstance(data_json, dict):
+        data_json = {**data_json, MANIFEST_KEY: block_manifest}
+    if duplicate_of is not None and isinstance(data_json, dict):
+        data_json = {**data_json, "duplicate_of": duplicate_of}
+
+    if write_buffer is not None:
+        write_buffer.add(unique_name, "formatted_data", data_json)
+        return
 
-    supabase.table("scraped_data").update({
-        "formatted_data": data_json
-    }).eq("unique_name", unique_name).execute()
-    MAGENTA = "\033[35m"
-    RESET = "\033[0m"  # Reset color to default
-    print(f"{MAGENTA}INFO:Scraped data saved for {unique_name}{RESET}")
+    with get_tracer().span("storage.write", unique_name=unique_name, column="formatted_data", rows=1):
+        get_storage().save_formatted(unique_name, data_json)
+    logger.debug("Scraped data saved for %s", unique_name)
 
-def scrape_urls(unique_names: List[str], fields: List[str], selected_model: str):
+def read_formatted_data_bulk(unique_names: List[str]) -> Dict[str, dict]:
     """
-    For each unique_name:
-      1) read raw_data from supabase
-      2) parse with selected LLM
-      3) save formatted_data
-      4) accumulate cost
-    Return total usage + list of final parsed data
+    Returns {unique_name: formatted_data} for every page that was extracted
+    before, in one storage round trip.
+    """
+    with get_tracer().span("storage.read", column="formatted_data", rows=len(unique_names)) as span:
+        formatted = get_storage().read_formatted_bulk(unique_names)
+        span["found"] = len(formatted)
+    return formatted
+
+def _listings_of(parsed):
+    """The listings of an extraction output (JSON string, model or dict), or None if unreadable."""
+    if isinstance(parsed, str):
+        try:
+            parsed = json.loads(parsed)
+        except json.JSONDecodeError:
+            return None
+    elif hasattr(parsed, "model_dump"):
+        parsed = parsed.model_dump()
+    listings = parsed.get("listings") if isinstance(parsed, dict) else None
+    return listings if isinstance(listings, list) else None
+
+def extraction_model_name(selected_model: str, cascade_models: List[str] = None) -> str:
+    """The model recorded in block manifests: selected_model, or the cascade's tiers."""
+    return "cascade:" + ",".join(cascade_models) if cascade_models else selected_model
+
+def prepare_page_extraction(uniq: str, raw_data: str, fields: List[str], previous_data, incremental: bool, model: str, system_message: str):
+    """
+    Prunes a page and plans its incremental extraction (see plan_incremental).
+    Returns (plan, extraction_markdown, pruning_stats); plan is None when
+    incremental extraction is off. Outside "full" mode extraction_markdown
+    only holds the changed blocks, and the LLM is not called at all if
+    plan["changed"] is empty.
+    The plan compares the page pruned without PAGE_WIDE_STEPS, which would
+    rewrite every block when one listing is added; they run afterwards on
+    extraction_markdown, so it carries its own link references.
+    model (see extraction_model_name) and system_message must match those of
+    the previous extraction for its listings to be reused.
+    """
+    if not incremental:
+        page_markdown, pruning_stats = prepare_page_markdown(uniq, raw_data, fields)
+        return None, page_markdown, pruning_stats
+    page_markdown, pruning_stats = prepare_page_markdown(uniq, raw_data, fields, steps=[step for step in PRUNING_STEPS if step not in PAGE_WIDE_STEPS])
+    plan = plan_incremental(page_markdown, fields, previous_data, model, system_message)
+    extraction_markdown = plan["changed_markdown"]
+    if PRUNING_ENABLED and extraction_markdown:
+        extraction_markdown, _ = prune_markdown(extraction_markdown, fields, steps=[step for step in PRUNING_STEPS if step in PAGE_WIDE_STEPS])
+        if plan["mode"] == "full":
+            pruning_stats["tokens_after"] = estimate_tokens(extraction_markdown)
+    if plan["mode"] != "full":
+        logger.debug("%s: %d of %d blocks changed, reusing %d listings", uniq, len(plan["changed"]), len(plan["units"]), len(plan["kept"]))
+    return plan, extraction_markdown, pruning_stats
+
+def finish_page_extraction(plan, parsed, fields: List[str], listings_container_model):
+    """
+    Merges an extraction with the listings kept by the plan. Returns
+    (parsed_data, block_manifest, incremental_stats); the last two are None
+    without a plan.
+    """
+    if plan is None:
+        return parsed, None, None
+    stats = {"mode": plan["mode"], "blocks": len(plan["units"]), "changed_blocks": len(plan["changed"])}
+    new_listings = _listings_of(parsed) if parsed is not None else []
+    if plan["mode"] == "full":
+        return parsed, build_manifest(plan, new_listings or [], fields), stats
+    if new_listings is None:
+        raise ValueError("could not read the listings extracted from the changed blocks")
+    listings, manifest = merge_incremental(plan, new_listings, fields)
+    return listings_container_model.model_validate({"listings": listings}), manifest, stats
+
+def reused_page_usage() -> dict:
+    """Token counts of a page whose listings were reused without calling the LLM."""
+    return {"input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0, "latency": {"queue": 0.0, "network": 0.0, "parse": 0.0}}
+
+def find_duplicate_pages(unique_names: List[str], raw_data_map: Dict[str, str]) -> Dict[str, str]:
+    """
+    {unique_name: canonical_unique_name} for the pages of a batch that are
+    near-duplicates of an earlier page (see find_near_duplicates). Uses the
+    fingerprints stored with raw_data; pages stored without one (crawled
+    with detection off, or on a table without the simhash column) are
+    hashed here.
+    """
+    with get_tracer().span("dedupe", pages=len(unique_names)) as span:
+        fingerprints = {uniq: parse_fingerprint(value) for uniq, value in read_fingerprints_bulk(unique_names).items()}
+        for uniq in unique_names:
+            if fingerprints.get(uniq) is None and raw_data_map.get(uniq):
+                fingerprints[uniq] = simhash(raw_data_map[uniq])
+        duplicates = find_near_duplicates(unique_names, fingerprints)
+        span["duplicates"] = len(duplicates)
+    if duplicates:
+        GREEN = "\033[32m"
+        RESET = "\033[0m"
+        print(f"{GREEN}INFO:{len(duplicates)} of {len(unique_names)} pages are near-duplicates and reuse another page's extraction{RESET}")
+    return duplicates
+
+def duplicate_page_result(uniq: str, canonical_result: dict, write_buffer: WriteBuffer = None) -> dict:
+    """
+    The result of a near-duplicate page: the listings of its canonical page,
+    stored without calling the LLM and linked to it by "duplicate_of".
+    """
+    canonical = canonical_result["unique_name"]
+    save_formatted_data(uniq, canonical_result["parsed_data"], write_buffer, duplicate_of=canonical)
+    return {"unique_name": uniq, "parsed_data": canonical_result["parsed_data"], "token_counts": reused_page_usage(), "cost": 0, "duplicate_of": canonical}
+
+def merge_listings(parsed_chunks, listings_container_model: BaseModel):
+    """
+    Merges the 'listings' of every chunk's parsed output into one container,
+    dropping listings that appear in more than one chunk. Each listing is
+    validated on its own, so an invalid one (e.g. a missing field) is logged
+    and dropped without losing the rest of the page.
+    """
+    listing_model = get_args(listings_container_model.model_fields["listings"].annotation)[0]
+    merged = []
+    seen = set()
+    for parsed in parsed_chunks:
+        if isinstance(parsed, str):
+            try:
+                parsed = json.loads(parsed)
+            except json.JSONDecodeError:
+                print(f"Could not parse a chunk's output, skipping it: {parsed[:200]}")
+                continue
+        elif hasattr(parsed, "model_dump"):
+            parsed = parsed.model_dump()
+        for listing in parsed.get("listings", []) if isinstance(parsed, dict) else []:
+            try:
+                listing = listing_model.model_validate(listing).model_dump()
+            except ValidationError as e:
+                print(f"Dropping an invalid listing ({e.error_count()} errors): {json.dumps(listing, default=str)[:200]}")
+                continue
+            key = json.dumps(listing, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                merged.append(listing)
+    return listings_container_model.model_validate({"listings": merged})
+
+async def _aextract_chunks(chunks, listings_container_model, selected_model, system_message):
+    outputs = await asyncio.gather(*(acall_llm_model(chunk, listings_container_model, selected_model, system_message) for chunk in chunks))
+    token_counts = {
+        "input_tokens": sum(counts["input_tokens"] for _, counts, _ in outputs),
+        "output_tokens": sum(counts["output_tokens"] for _, counts, _ in outputs),
+        "cached_input_tokens": sum(counts.get("cached_input_tokens", 0) for _, counts, _ in outputs),
+        # chunks run concurrently, so the page waited as long as its slowest chunk
+        "latency": {phase: max(counts.get("latency", {}).get(phase, 0.0) for _, counts, _ in outputs) for phase in ("queue", "network", "parse")},
+    }
+    cost = sum(chunk_cost for _, _, chunk_cost in outputs)
+    return merge_listings([parsed for parsed, _, _ in outputs], listings_container_model), token_counts, cost
+
+def extract_listings(raw_data: str, listings_container_model, selected_model: str, system_message: str):
+    """
+    Parses one page with the LLM. Pages that don't fit one request are split
+    on structural boundaries, the chunks are parsed in parallel and their
+    listings merged into one container.
+    Returns (parsed, token_counts, cost) like call_llm_model.
+    """
+    chunks = split_for_model(raw_data, selected_model, system_message)
+    if len(chunks) == 1:
+        return call_llm_model(raw_data, listings_container_model, selected_model, system_message)
+    return run_async(_aextract_chunks(chunks, listings_container_model, selected_model, system_message))
+
+async def aextract_listings(raw_data: str, listings_container_model, selected_model: str, system_message: str):
+    """Async version of extract_listings."""
+    chunks = split_for_model(raw_data, selected_model, system_message)
+    if len(chunks) == 1:
+        return await acall_llm_model(raw_data, listings_container_model, selected_model, system_message)
+    return await _aextract_chunks(chunks, listings_container_model, selected_model, system_message)
+
+def _cascade_attempt(tier: int, model: str, output, seconds: float, listings_container_model, fields: List[str]) -> dict:
+    parsed, token_counts, cost = output
+    accepted, reason, empty_fraction = validate_extraction(parsed, listings_container_model, fields)
+    if not accepted:
+        logger.debug("%s output rejected (%s)", model, reason)
+    return {"tier": tier, "model": model, "accepted": accepted, "reason": reason, "empty_fraction": round(empty_fraction, 3),
+            "seconds": seconds, "cost": cost, "parsed": parsed, "token_counts": token_counts}
+
+def _failed_cascade_attempt(tier: int, model: str, error: Exception, seconds: float) -> dict:
+    """A tier whose call raised (e.g. its provider's circuit is open, or retries ran out)."""
+    logger.debug("%s failed (%s: %s), trying the next model", model, type(error).__name__, error)
+    return {"tier": tier, "model": model, "accepted": False, "reason": "error", "empty_fraction": 1.0, "seconds": seconds, "cost": 0,
+            "error": str(error), "exception": error, "parsed": None,
+            "token_counts": {"input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0}}
+
+def _finish_cascade(attempts):
+    if all(attempt["reason"] == "error" for attempt in attempts):
+        raise attempts[-1]["exception"]
+    kept = pick_cascade_result(attempts)
+    token_counts = {
+        "input_tokens": sum(attempt["token_counts"]["input_tokens"] for attempt in attempts),
+        "output_tokens": sum(attempt["token_counts"]["output_tokens"] for attempt in attempts),
+        "cached_input_tokens": sum(attempt["token_counts"].get("cached_input_tokens", 0) for attempt in attempts),
+        # tiers run one after another, so the page waited for all of them
+        "latency": {phase: sum(attempt["token_counts"].get("latency", {}).get(phase, 0.0) for attempt in attempts) for phase in ("queue", "network", "parse")},
+    }
+    cost = sum(attempt["cost"] for attempt in attempts)
+    cascade = {
+        "model": kept["model"],
+        "tier": kept["tier"],
+        "accepted": kept["accepted"],
+        "attempts": [{key: value for key, value in attempt.items() if key not in ("parsed", "token_counts", "exception")} for attempt in attempts],
+    }
+    return kept["parsed"], token_counts, cost, cascade
+
+def extract_listings_cascade(raw_data: str, listings_container_model, fields: List[str], models: List[str], system_message: str):
+    """
+    Parses one page with each model of the cascade in turn (see cascade.py),
+    stopping at the first output that passes validate_extraction. A tier
+    whose call raises is recorded as rejected with reason "error" and the
+    next model is tried; the error is raised only if every tier failed.
+    Returns (parsed, token_counts, cost, cascade): token counts and cost cover
+    every tier tried, and cascade is
+        {"model", "tier", "accepted", "attempts": [{"tier", "model", "accepted", "reason", "empty_fraction", "seconds", "cost"[, "error"]}, ...]}
+    """
+    attempts = []
+    for tier, model in enumerate(models):
+        started = time.perf_counter()
+        try:
+            output = extract_listings(raw_data, listings_container_model, model, system_message)
+        except Exception as e:
+            attempts.append(_failed_cascade_attempt(tier, model, e, time.perf_counter() - started))
+            continue
+        attempts.append(_cascade_attempt(tier, model, output, time.perf_counter() - started, listings_container_model, fields))
+        if attempts[-1]["accepted"]:
+            break
+    return _finish_cascade(attempts)
+
+async def aextract_listings_cascade(raw_data: str, listings_container_model, fields: List[str], models: List[str], system_message: str):
+    """Async version of extract_listings_cascade."""
+    attempts = []
+    for tier, model in enumerate(models):
+        started = time.perf_counter()
+        try:
+            output = await aextract_listings(raw_data, listings_container_model, model, system_message)
+        except Exception as e:
+            attempts.append(_failed_cascade_attempt(tier, model, e, time.perf_counter() - started))
+            continue
+        attempts.append(_cascade_attempt(tier, model, output, time.perf_counter() - started, listings_container_model, fields))
+        if attempts[-1]["accepted"]:
+            break
+    return _finish_cascade(attempts)
+
+def prepare_page_markdown(uniq: str, raw_data: str, fields: List[str], keep_links: bool = False, steps: List[str] = PRUNING_STEPS):
+    """
+    Prunes a page's markdown before extraction (if PRUNING_ENABLED) with the
+    given pruning steps and reports the estimated tokens before and after.
+    Returns (markdown, pruning_stats or None).
+    """
+    if not PRUNING_ENABLED:
+        return raw_data, None
+    pruned, stats = prune_markdown(raw_data, fields, keep_links=keep_links, steps=steps)
+    logger.debug("Pruned %s: %d -> %d tokens", uniq, stats["tokens_before"], stats["tokens_after"])
+    return pruned, stats
+
+def summarize_pruning(parsed_results) -> dict:
+    """
+    Totals the pruning stats of a run: {"tokens_before": int, "tokens_after": int}.
+    """
+    totals = {"tokens_before": 0, "tokens_after": 0}
+    for result in parsed_results:
+        stats = result.get("pruning") if isinstance(result, dict) else None
+        if stats:
+            totals["tokens_before"] += stats["tokens_before"]
+            totals["tokens_after"] += stats["tokens_after"]
+    return totals
+
+def failed_page_result(uniq: str, error: Exception) -> dict:
+    """
+    The result of a page whose extraction failed after retries, so that one
+    bad page is reported on its own instead of aborting the whole batch.
+    """
+    RED = "\033[31m"
+    RESET = "\033[0m"
+    print(f"{RED}ERROR:Scraping failed for {uniq}: {error}{RESET}")
+    return {"unique_name": uniq, "parsed_data": None, "token_counts": {"input_tokens": 0, "output_tokens": 0}, "cost": 0, "error": str(error)}
+
+def sum_scrape_usage(results):
+    """
+    Adds up token counts and cost of per-page results, in input order.
+    Failed pages (see failed_page_result) appear as {"unique_name", "error"}.
     """
     total_input_tokens = 0
     total_output_tokens = 0
     total_cost = 0
     parsed_results = []
+    for result in results:
+        if result is None:
+            continue
+        if result.get("error"):
+            parsed_results.append({"unique_name": result["unique_name"], "error": result["error"]})
+            continue
+        total_input_tokens += result["token_counts"]["input_tokens"]
+        total_output_tokens += result["token_counts"]["output_tokens"]
+        total_cost += result["cost"]
+        entry = {"unique_name": result["unique_name"],"parsed_data": result["parsed_data"]}
+        if result.get("pruning"):
+            entry["pruning"] = result["pruning"]
+        if result.get("cascade"):
+            entry["cascade"] = result["cascade"]
+        if result.get("incremental"):
+            entry["incremental"] = result["incremental"]
+        if result.get("duplicate_of"):
+            entry["duplicate_of"] = result["duplicate_of"]
+        parsed_results.append(entry)
+    return total_input_tokens, total_output_tokens, total_cost, parsed_results
 
-    DynamicListingModel = create_dynamic_listing_model(fields)
-    DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
+def scrape_urls(unique_names: List[str], fields: List[str], selected_model: str, parallel: bool = False, raw_data_map: Dict[str, str] = None, write_buffer: WriteBuffer = None, on_result=None, cascade: bool = False, incremental: bool = INCREMENTAL_EXTRACTION_ENABLED,
+                dedupe: bool = NEAR_DUPLICATE_DETECTION_ENABLED):
+    """
+    For each unique_name:
+      1) read raw_data from storage (or from raw_data_map)
+      2) prune the markdown
+      3) parse with selected LLM
+      4) save formatted_data
+      5) accumulate cost
+    Return total usage + list of final parsed data
+
+    With parallel=True the pages are parsed concurrently (see ascrape_urls);
+    results and totals are the same as in the sequential path.
+    raw_data_map ({unique_name: raw_data}, see read_raw_data_bulk) lets several
+    stages share one bulk read; without it the batch is loaded in one go here.
+    Results are written through write_buffer (see WriteBuffer); without one,
+    a buffer is opened for this run and flushed before returning.
+    on_result(result) is called as soon as each page is done, in completion
+    order, so callers can show results while the rest of the batch runs;
+    it gets None for pages skipped for lack of raw_data.
+    A page whose LLM calls still fail after retries (see resilience.py) gets
+    a failed_page_result with an "error" and the rest of the batch goes on.
+    With cascade=True selected_model is only a fallback: each page is parsed
+    by the cheapest model first and escalated while its output fails
+    validation (see extract_listings_cascade); results then carry "cascade".
+    With incremental=True a page extracted before only sends the blocks that
+    changed since then to the LLM, and keeps the listings of the others
+    (see incremental.py) as long as the model and prompt are the same;
+    results then carry "incremental".
+    With dedupe=True a page that is a near-duplicate of an earlier page of
+    the batch (see find_duplicate_pages) reuses that page's listings instead
+    of being parsed; its result carries "duplicate_of".
+    """
+    if write_buffer is None:
+        with WriteBuffer() as run_buffer:
+            return scrape_urls(unique_names, fields, selected_model, parallel, raw_data_map, run_buffer, on_result, cascade, incremental, dedupe)
 
+    if parallel:
+        return run_async(ascrape_urls(unique_names, fields, selected_model, raw_data_map, write_buffer, on_result, cascade, incremental, dedupe))
+
+    if raw_data_map is None:
+        raw_data_map = read_raw_data_bulk(unique_names)
+    previous_map = read_formatted_data_bulk(unique_names) if incremental else {}
+    duplicates = find_duplicate_pages(unique_names, raw_data_map) if dedupe else {}
+
+    DynamicListingModel, DynamicListingsContainer = get_listing_models(tuple(fields))
+    system_message = get_extraction_system_message(tuple(fields))
+    cascade_models = get_cascade_models(selected_model) if cascade else None
+
+    results = []
+    results_by_name = {}
     for uniq in unique_names:
-        raw_data = read_raw_data(uniq)
+        raw_data = raw_data_map.get(uniq, "")
         if not raw_data:
             BLUE = "\033[34m"
             RESET = "\033[0m"
             print(f"{BLUE}No raw_data found for {uniq}, skipping.{RESET}")
+            if on_result is not None:
+                on_result(None)
             continue
 
-        parsed, token_counts, cost = call_llm_model(raw_data, DynamicListingsContainer, selected_model, SYSTEM_MESSAGE)
+        # a canonical page always comes before its duplicates; if it failed the duplicate is parsed itself
+        canonical_result = results_by_name.get(duplicates.get(uniq))
+        if canonical_result is not None and not canonical_result.get("error"):
+            result = duplicate_page_result(uniq, canonical_result, write_buffer)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+            continue
 
-        # store
-        save_formatted_data(uniq, parsed)
+        with trace_page(uniq):
+            try:
+                plan, extraction_markdown, pruning_stats = prepare_page_extraction(uniq, raw_data, fields, previous_map.get(uniq), incremental, extraction_model_name(selected_model, cascade_models), system_message)
+                cascade_info = None
+                if plan is not None and plan["mode"] != "full" and not plan["changed"]:
+                    parsed, token_counts, cost = None, reused_page_usage(), 0
+                elif cascade_models:
+                    parsed, token_counts, cost, cascade_info = extract_listings_cascade(extraction_markdown, DynamicListingsContainer, fields, cascade_models, system_message)
+                else:
+                    parsed, token_counts, cost = extract_listings(extraction_markdown, DynamicListingsContainer, selected_model, system_message)
+                parsed, block_manifest, incremental_stats = finish_page_extraction(plan, parsed, fields, DynamicListingsContainer)
 
-        total_input_tokens += token_counts["input_tokens"]
-        total_output_tokens += token_counts["output_tokens"]
-        total_cost += cost
-        parsed_results.append({"unique_name": uniq,"parsed_data": parsed})
+                # store
+                save_formatted_data(uniq, parsed, write_buffer, block_manifest)
+            except Exception as e:
+                result = failed_page_result(uniq, e)
+            else:
+                result = {"unique_name": uniq, "parsed_data": parsed, "token_counts": token_counts, "cost": cost, "pruning": pruning_stats, "cascade": cascade_info, "incremental": incremental_stats}
+        results.append(result)
+        results_by_name[uniq] = result
+        if on_result is not None:
+            on_result(result)
 
-    return total_input_tokens, total_output_tokens, total_cost, parsed_results
+    return sum_scrape_usage(results)
+
+async def ascrape_urls(unique_names: List[str], fields: List[str], selected_model: str, raw_data_map: Dict[str, str] = None, write_buffer: WriteBuffer = None, on_result=None, cascade: bool = False, incremental: bool = INCREMENTAL_EXTRACTION_ENABLED,
+                       dedupe: bool = NEAR_DUPLICATE_DETECTION_ENABLED):
+    """
+    Async version of scrape_urls: every page is parsed concurrently through
+    acall_llm_model, within the provider's concurrency and rate limits.
+    Returns the same (input_tokens, output_tokens, cost, parsed_results)
+    as scrape_urls, with parsed_results in input order; on_result is called
+    as each page completes, and failed pages are reported like in scrape_urls.
+    Near-duplicate pages wait for their canonical page instead of being parsed.
+    """
+    if write_buffer is None:
+        with WriteBuffer() as run_buffer:
+            return await ascrape_urls(unique_names, fields, selected_model, raw_data_map, run_buffer, on_result, cascade, incremental, dedupe)
+
+    if raw_data_map is None:
+        raw_data_map = await asyncio.to_thread(read_raw_data_bulk, unique_names)
+    previous_map = await asyncio.to_thread(read_formatted_data_bulk, unique_names) if incremental else {}
+    duplicates = await asyncio.to_thread(find_duplicate_pages, unique_names, raw_data_map) if dedupe else {}
+
+    DynamicListingModel, DynamicListingsContainer = get_listing_models(tuple(fields))
+    cascade_models = get_cascade_models(selected_model) if cascade else None
+    # set once a canonical page has its result, which its duplicates wait for
+    canonical_done = {canonical: asyncio.Event() for canonical in set(duplicates.values())}
+    results_by_name = {}
+
+    async def scrape_one(uniq):
+        try:
+            result = await scrape_or_reuse(uniq)
+        finally:
+            if uniq in canonical_done:
+                canonical_done[uniq].set()
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    async def scrape_or_reuse(uniq):
+        canonical = duplicates.get(uniq)
+        if canonical is not None:
+            await canonical_done[canonical].wait()
+            canonical_result = results_by_name.get(canonical)
+            if canonical_result is not None and not canonical_result.get("error"):
+                return duplicate_page_result(uniq, canonical_result, write_buffer)
+        raw_data = raw_data_map.get(uniq, "")
+        if not raw_data:
+            BLUE = "\033[34m"
+            RESET = "\033[0m"
+            print(f"{BLUE}No raw_data found for {uniq}, skipping.{RESET}")
+            result = None
+        else:
+            try:
+                result = await ascrape_page(uniq, raw_data, DynamicListingsContainer, fields, selected_model, write_buffer, cascade_models, incremental, previous_map.get(uniq))
+            except Exception as e:
+                result = failed_page_result(uniq, e)
+        results_by_name[uniq] = result
+        return result
+
+    results = await asyncio.gather(*(scrape_one(uniq) for uniq in unique_names))
+    return sum_scrape_usage(results)
+
+async def ascrape_page(uniq: str, raw_data: str, listings_container_model, fields: List[str], selected_model: str, write_buffer: WriteBuffer = None, cascade_models: List[str] = None,
+                       incremental: bool = False, previous_data: dict = None) -> dict:
+    """
+    Prunes, parses and stores one page. Returns its result:
+        {"unique_name", "parsed_data", "token_counts", "cost", "pruning", "cascade", "incremental"}
+    With cascade_models (see get_cascade_models) the page goes through the
+    model cascade instead of selected_model alone; otherwise "cascade" is None.
+    With incremental=True only the blocks changed since previous_data (the
+    page's stored formatted_data) are parsed; otherwise "incremental" is None.
+    """
+    with trace_page(uniq):
+        system_message = get_extraction_system_message(tuple(fields))
+        plan, extraction_markdown, pruning_stats = prepare_page_extraction(uniq, raw_data, fields, previous_data, incremental, extraction_model_name(selected_model, cascade_models), system_message)
+        cascade_info = None
+        if plan is not None and plan["mode"] != "full" and not plan["changed"]:
+            parsed, token_counts, cost = None, reused_page_usage(), 0
+        elif cascade_models:
+            parsed, token_counts, cost, cascade_info = await aextract_listings_cascade(extraction_markdown, listings_container_model, fields, cascade_models, system_message)
+        else:
+            parsed, token_counts, cost = await aextract_listings(extraction_markdown, listings_container_model, selected_model, system_message)
+        parsed, block_manifest, incremental_stats = finish_page_extraction(plan, parsed, fields, listings_container_model)
+
+        # store (queued when there is a buffer; it writes in the background)
+        save_formatted_data(uniq, parsed, write_buffer, block_manifest)
+    return {"unique_name": uniq, "parsed_data": parsed, "token_counts": token_counts, "cost": cost, "pruning": pruning_stats, "cascade": cascade_info, "incremental": incremental_stats}
@@ -0,0 +1,306 @@
+# storage.py
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, List
+from api_management import get_supabase_client
+from assets import STORAGE_BACKEND, SQLITE_DB_PATH, RAW_DATA_BULK_CHUNK_SIZE
+
+SCRAPED_DATA_TABLE = "scraped_data"
+# columns of scraped_data stored as JSON
+JSON_COLUMNS = {"raw_data", "formatted_data", "pagination_data"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _chunks(items: List[str], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class StorageBackend(ABC):
+    """
+    The operations the pipeline runs against the `scraped_data` table.
+    Rows are identified by their unique_name.
+    """
+
+    @abstractmethod
+    def read_raw_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        """Returns {unique_name: raw_data} for the rows that have raw_data."""
+
+    @abstractmethod
+    def read_cache_metadata_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        """Returns {unique_name: {"fetched_at", "etag", "last_modified"}} for rows with raw_data."""
+
+    @abstractmethod
+    def read_fingerprints_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        """Returns {unique_name: simhash} for the rows that have a SimHash fingerprint."""
+
+    @abstractmethod
+    def read_formatted_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        """Returns {unique_name: formatted_data} for the rows that have formatted_data."""
+
+    @abstractmethod
+    def save_raw(self, unique_name: str, url: str, raw_data, etag: str = None, last_modified: str = None, simhash: str = None) -> None:
+        """Inserts or replaces a page's raw_data and cache metadata (and its fingerprint, cleared when None)."""
+
+    @abstractmethod
+    def touch(self, unique_name: str) -> None:
+        """Marks a cached page as fetched now."""
+
+    @abstractmethod
+    def bulk_upsert(self, rows: List[dict]) -> None:
+        """Inserts or updates rows by unique_name; only the given columns are written."""
+
+    def read_raw(self, unique_name: str) -> str:
+        return self.read_raw_bulk([unique_name]).get(unique_name, "")
+
+    def save_formatted(self, unique_name: str, formatted_data) -> None:
+        self.bulk_upsert([{"unique_name": unique_name, "formatted_data": formatted_data}])
+
+    def save_pagination(self, unique_name: str, pagination_data) -> None:
+        self.bulk_upsert([{"unique_name": unique_name, "pagination_data": pagination_data}])
+
+
+class SupabaseStorage(StorageBackend):
+    """
+    Stores scraped_data in Supabase (PostgREST over HTTP).
+    Tables created before near-duplicate detection have no simhash column:
+    fingerprints are then neither stored nor read, and dedupe hashes the
+    pages itself.
+    """
+
+    def __init__(self, client=None, chunk_size: int = RAW_DATA_BULK_CHUNK_SIZE):
+        self._client = client
+        self.chunk_size = chunk_size
+        # set to False once a request shows the table has no simhash column
+        self._simhash_column = True
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_supabase_client()
+            if self._client is None:
+                raise RuntimeError("Supabase is not configured (SUPABASE_URL / SUPABASE_ANON_KEY).")
+        return self._client
+
+    def _table(self):
+        return self.client.table(SCRAPED_DATA_TABLE)
+
+    def read_raw_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        raw_data_map = {}
+        for chunk in _chunks(list(dict.fromkeys(unique_names)), self.chunk_size):
+            response = self._table().select("unique_name, raw_data").in_("unique_name", chunk).execute()
+            for row in response.data or []:
+                if row.get("raw_data"):
+                    raw_data_map[row["unique_name"]] = row["raw_data"]
+        return raw_data_map
+
+    def read_cache_metadata_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        cached_rows = {}
+        for chunk in _chunks(list(dict.fromkeys(unique_names)), self.chunk_size):
+            response = (
+                self._table()
+                .select("unique_name, fetched_at, etag, last_modified")
+                .in_("unique_name", chunk)
+                .not_.is_("raw_data", "null")
+                .execute()
+            )
+            for row in response.data or []:
+                cached_rows[row["unique_name"]] = row
+        return cached_rows
+
+    def _missing_simhash_column(self, error: Exception) -> bool:
+        """True (and fingerprints are skipped from now on) if error is about the missing simhash column."""
+        if "simhash" not in str(error):
+            return False
+        self._simhash_column = False
+        YELLOW = "\033[33m"
+        RESET = "\033[0m"
+        print(f"{YELLOW}INFO:{SCRAPED_DATA_TABLE} has no simhash column, page fingerprints are not stored (see the setup guide to add it){RESET}")
+        return True
+
+    def read_fingerprints_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        fingerprints = {}
+        if not self._simhash_column:
+            return fingerprints
+        try:
+            for chunk in _chunks(list(dict.fromkeys(unique_names)), self.chunk_size):
+                response = self._table().select("unique_name, simhash").in_("unique_name", chunk).not_.is_("simhash", "null").execute()
+                for row in response.data or []:
+                    fingerprints[row["unique_name"]] = row["simhash"]
+        except Exception as e:
+            if not self._missing_simhash_column(e):
+                raise
+            return {}
+        return fingerprints
+
+    def read_formatted_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        formatted = {}
+        for chunk in _chunks(list(dict.fromkeys(unique_names)), self.chunk_size):
+            response = self._table().select("unique_name, formatted_data").in_("unique_name", chunk).not_.is_("formatted_data", "null").execute()
+            for row in response.data or []:
+                formatted[row["unique_name"]] = row["formatted_data"]
+        return formatted
+
+    def save_raw(self, unique_name: str, url: str, raw_data, etag: str = None, last_modified: str = None, simhash: str = None) -> None:
+        row = {
+            "unique_name": unique_name,
+            "url": url,
+            "raw_data": raw_data,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": _now(),
+        }
+        if self._simhash_column:
+            try:
+                # written even when None, so a re-crawl clears the fingerprint of the old markdown
+                self._table().upsert({**row, "simhash": simhash}, on_conflict="unique_name").execute()
+                return
+            except Exception as e:
+                if not self._missing_simhash_column(e):
+                    raise
+        self._table().upsert(row, on_conflict="unique_name").execute()
+
+    def touch(self, unique_name: str) -> None:
+        self._table().update({"fetched_at": _now()}).eq("unique_name", unique_name).execute()
+
+    def bulk_upsert(self, rows: List[dict]) -> None:
+        self._table().upsert(rows, on_conflict="unique_name").execute()
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Stores scraped_data in a local SQLite file, for local runs, benchmarks and
+    single-node deployments without an external database. JSON columns are
+    stored as JSON text.
+    """
+
+    COLUMNS = ("unique_name", "url", "raw_data", "formatted_data", "pagination_data", "etag", "last_modified", "simhash", "fetched_at", "created_at")
+
+    def __init__(self, path: str = SQLITE_DB_PATH, chunk_size: int = 500):
+        self.path = path
+        self.chunk_size = chunk_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {SCRAPED_DATA_TABLE} ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " unique_name TEXT NOT NULL UNIQUE,"
+            " url TEXT,"
+            " raw_data TEXT,"
+            " formatted_data TEXT,"
+            " pagination_data TEXT,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " simhash TEXT,"
+            " fetched_at TEXT,"
+            " created_at TEXT)"
+        )
+        # databases created before the simhash column
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({SCRAPED_DATA_TABLE})")}
+        if "simhash" not in existing:
+            self._conn.execute(f"ALTER TABLE {SCRAPED_DATA_TABLE} ADD COLUMN simhash TEXT")
+        self._conn.commit()
+
+    def _select(self, columns: str, unique_names: List[str], extra_where: str = "") -> list:
+        rows = []
+        with self._lock:
+            for chunk in _chunks(list(dict.fromkeys(unique_names)), self.chunk_size):
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT {columns} FROM {SCRAPED_DATA_TABLE} WHERE unique_name IN ({placeholders}) {extra_where}", chunk
+                ).fetchall())
+        return rows
+
+    def read_raw_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        raw_data_map = {}
+        for unique_name, raw_data in self._select("unique_name, raw_data", unique_names, "AND raw_data IS NOT NULL"):
+            raw_data = json.loads(raw_data)
+            if raw_data:
+                raw_data_map[unique_name] = raw_data
+        return raw_data_map
+
+    def read_cache_metadata_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        return {
+            unique_name: {"unique_name": unique_name, "fetched_at": fetched_at, "etag": etag, "last_modified": last_modified}
+            for unique_name, fetched_at, etag, last_modified in self._select(
+                "unique_name, fetched_at, etag, last_modified", unique_names, "AND raw_data IS NOT NULL"
+            )
+        }
+
+    def read_fingerprints_bulk(self, unique_names: List[str]) -> Dict[str, str]:
+        return dict(self._select("unique_name, simhash", unique_names, "AND simhash IS NOT NULL"))
+
+    def read_formatted_bulk(self, unique_names: List[str]) -> Dict[str, dict]:
+        return {
+            unique_name: json.loads(formatted_data)
+            for unique_name, formatted_data in self._select("unique_name, formatted_data", unique_names, "AND formatted_data IS NOT NULL")
+        }
+
+    def save_raw(self, unique_name: str, url: str, raw_data, etag: str = None, last_modified: str = None, simhash: str = None) -> None:
+        self.bulk_upsert([{
+            "unique_name": unique_name,
+            "url": url,
+            "raw_data": raw_data,
+            "etag": etag,
+            "last_modified": last_modified,
+            "simhash": simhash,
+            "fetched_at": _now(),
+        }])
+
+    def touch(self, unique_name: str) -> None:
+        with self._lock:
+            self._conn.execute(f"UPDATE {SCRAPED_DATA_TABLE} SET fetched_at = ? WHERE unique_name = ?", (_now(), unique_name))
+            self._conn.commit()
+
+    def bulk_upsert(self, rows: List[dict]) -> None:
+        with self._lock:
+            for row in rows:
+                columns = [column for column in row if column in self.COLUMNS]
+                values = [json.dumps(row[column]) if column in JSON_COLUMNS else row[column] for column in columns]
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "unique_name")
+                self._conn.execute(
+                    f"INSERT INTO {SCRAPED_DATA_TABLE} ({', '.join(columns)}, created_at) VALUES ({', '.join('?' * len(columns))}, ?)"
+                    f" ON CONFLICT(unique_name) DO {'UPDATE SET ' + updates if updates else 'NOTHING'}",
+                    values + [_now()],
+                )
+            self._conn.commit()
+
+
+STORAGE_BACKENDS = {
+    "supabase": SupabaseStorage,
+    "sqlite": SQLiteStorage,
+}
+
+_storage = None
+
+def get_storage_backend_name() -> str:
+    """The configured backend: the STORAGE_BACKEND env var, else assets.STORAGE_BACKEND."""
+    return (os.getenv("STORAGE_BACKEND") or STORAGE_BACKEND).lower()
+
+def get_storage() -> StorageBackend:
+    """Returns the process-wide storage backend selected by configuration."""
+    global _storage
+    if _storage is None:
+        name = get_storage_backend_name()
+        if name not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected one of {sorted(STORAGE_BACKENDS)}")
+        _storage = STORAGE_BACKENDS[name]()
+    return _storage
+
+def set_storage(storage: StorageBackend) -> None:
+    """Replaces the process-wide storage backend (e.g. for benchmarks)."""
+    global _storage
+    _storage = storage
@@ -2,28 +2,105 @@
 
 import streamlit as st
 from streamlit_tags import st_tags_sidebar
-import pandas as pd
-import json
 import re
 import sys
+import time
 import asyncio
 # ---local imports---
-from scraper import scrape_urls
-from pagination import paginate_urls
-from markdown import fetch_and_store_markdowns
-from assets import MODELS_USED
-from api_management import get_supabase_client
+# The pipeline modules pull in litellm, crawl4ai, pandas and supabase; they are
+# imported on the code paths that use them, so widget reruns stay fast.
+from assets import MODELS_USED, CRAWL_MAX_CONCURRENCY, CATALOG_MAX_PAGES
+from api_management import get_supabase_credentials
+from storage import get_storage_backend_name
+from utils import generate_run_id
+from llm_cache import get_llm_cache
+from tracing import get_tracer, set_run_id, RunProfiler
 
 # Only use WindowsProactorEventLoopPolicy on Windows
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 
+# Results tables are built once per run (keyed by run_id) and shared by the
+# table view and the downloads; leading underscores keep Streamlit from hashing them.
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_results_table(run_id: str, _parsed_results):
+    from results import build_results_table
+    return build_results_table(_parsed_results)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_results_exports(run_id: str, _results_table, _parsed_results) -> dict:
+    from results import to_json_bytes, to_csv_bytes, to_ndjson_bytes, to_parquet_bytes
+    return {
+        "json": to_json_bytes(_parsed_results),
+        "csv": to_csv_bytes(_results_table),
+        "ndjson": to_ndjson_bytes(_results_table),
+        "parquet": to_parquet_bytes(_results_table),
+    }
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_pagination_table(run_id: str, _pagination_results):
+    from results import build_pagination_table
+    return build_pagination_table(_pagination_results)
+
+
+class LiveProgress:
+    """
+    Progress bar with ETA, running token/cost counters and, optionally, a
+    results table that grows as pages finish. advance() is meant to be
+    called from the on_result callback of scrape_urls / paginate_urls.
+    """
+
+    TABLE_REFRESH_SECONDS = 0.5
+
+    def __init__(self, label: str, total: int, show_table: bool = False):
+        self.label = label
+        self.total = max(1, total)
+        self.done = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_input_tokens = 0
+        self.cost = 0
+        self.rows = []
+        self.started = time.monotonic()
+        self._table_refreshed = 0.0
+        self.bar = st.progress(0.0, text=f"{label}: 0/{total} pages")
+        self.counters = st.empty()
+        self.table = st.empty() if show_table else None
+
+    def advance(self, token_counts: dict = None, cost: float = 0, rows=()) -> None:
+        self.done += 1
+        if token_counts:
+            self.input_tokens += token_counts["input_tokens"]
+            self.output_tokens += token_counts["output_tokens"]
+            self.cached_input_tokens += token_counts.get("cached_input_tokens", 0)
+        self.cost += cost
+        elapsed = time.monotonic() - self.started
+        eta = elapsed / self.done * (self.total - self.done)
+        self.bar.progress(min(1.0, self.done / self.total), text=f"{self.label}: {self.done}/{self.total} pages · ETA {eta:.0f}s")
+        self.counters.markdown(f"*Input Tokens:* {self.input_tokens} (cached: {self.cached_input_tokens}) · *Output Tokens:* {self.output_tokens} · **Cost:** ${self.cost:.4f}")
+        if self.table is not None and rows:
+            self.rows.extend(rows)
+            # re-rendering a large dataframe for every page would slow the run down
+            if self.done >= self.total or time.monotonic() - self._table_refreshed >= self.TABLE_REFRESH_SECONDS:
+                import pandas as pd
+                self.table.dataframe(pd.DataFrame(self.rows), use_container_width=True)
+                self._table_refreshed = time.monotonic()
+
+    def clear(self) -> None:
+        self.bar.empty()
+        self.counters.empty()
+        if self.table is not None:
+            self.table.empty()
+
+
 
 # Initialize Streamlit app
 st.set_page_config(page_title="Universal Web Scraper", page_icon="🦑")
-supabase=get_supabase_client()
-if supabase==None:
+# only checks that credentials are set; no client is created to render the page
+if get_storage_backend_name() == "supabase" and get_supabase_credentials() is None:
     st.error("🚨 **Supabase is not configured!** This project requires a Supabase database to function.")
     st.warning("Follow these steps to set it up:")
 
@@ -35,27 +112,53 @@ if supabase==None:
     ```sql
     CREATE TABLE IF NOT EXISTS scraped_data (
     id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-    unique_name TEXT NOT NULL,
+    unique_name TEXT NOT NULL UNIQUE,
     url TEXT,
     raw_data JSONB,        
     formatted_data JSONB, 
     pagination_data JSONB,
+    etag TEXT,
+    last_modified TEXT,
+    simhash TEXT,
+    fetched_at TIMESTAMPTZ DEFAULT NOW(),
     created_at TIMESTAMPTZ DEFAULT NOW()
     );
     ```
 
-    4. **Go to Project Settings → API** and copy:
+    If you created the table with an older version of this project, upgrade it with:
+
+    ```sql
+    ALTER TABLE scraped_data ADD CONSTRAINT scraped_data_unique_name_key UNIQUE (unique_name);
+    ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS etag TEXT;
+    ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS last_modified TEXT;
+    ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS fetched_at TIMESTAMPTZ DEFAULT NOW();
+    ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS simhash TEXT;
+    ```
+
+    4. **Optional: create a Storage bucket** named `raw-blobs` (Storage → New bucket) to store crawled pages there compressed, then set `RAW_DATA_BLOBS_ENABLED = True` in `assets.py`.
+    Storage buckets deny access by default, so allow the anon key to add and read its files by running this in the **SQL Editor**:
+
+    ```sql
+    CREATE POLICY "raw-blobs insert" ON storage.objects FOR INSERT TO anon WITH CHECK (bucket_id = 'raw-blobs');
+    CREATE POLICY "raw-blobs select" ON storage.objects FOR SELECT TO anon USING (bucket_id = 'raw-blobs');
+    ```
+
+    Without it, pages are kept in the `raw_data` column of the table.
+
+    5. **Go to Project Settings → API** and copy:
         - **Supabase URL**
         - **Anon Key**
     
-    5. **Update your `.env` file** with these values:
+    6. **Update your `.env` file** with these values:
     
     ```
     SUPABASE_URL=your_supabase_url_here
     SUPABASE_ANON_KEY=your_supabase_anon_key_here
     ```
 
-    6. **Restart the project** close everything and reopen it, and you’re good to go! 🚀
+    7. **Restart the project** close everything and reopen it, and you’re good to go! 🚀
+
+    To run without Supabase, set `STORAGE_BACKEND=sqlite` in your `.env` file to keep all data in a local SQLite file.
     """)
 
 st.title("Universal Web Scraper 🦑")
@@ -142,15 +245,30 @@ st.sidebar.markdown("---")
 # Fields to extract
 show_tags = st.sidebar.toggle("Enable Scraping")
 fields = []
+use_cascade = False
+use_dedupe = False
+use_incremental = False
 if show_tags:
     fields = st_tags_sidebar(label='Enter Fields to Extract:',text='Press enter to add a field',value=[],suggestions=[],maxtags=-1,key='fields_input')
+    use_cascade = st.sidebar.toggle("Model Cascade",help="Extract with the cheapest model that has an API key first, and retry a page with the next model only when its output fails validation or leaves too many fields empty")
+    use_dedupe = st.sidebar.toggle("Skip Near-Duplicates",help="Pages that are near-copies of an earlier page (mirrors, tracking-parameter variants) reuse its extracted listings instead of calling the LLM again")
+    use_incremental = st.sidebar.toggle("Incremental Re-extraction",help="Pages scraped before with the same fields, model and prompt only send the parts that changed since then to the LLM, and keep the listings of the rest")
 
 st.sidebar.markdown("---")
 
 use_pagination = st.sidebar.toggle("Enable Pagination")
 pagination_details = ""
+follow_pagination = False
+max_pages = CATALOG_MAX_PAGES
 if use_pagination:
     pagination_details = st.sidebar.text_input("Enter Pagination Details (optional)",help="Describe how to navigate through pages (e.g., 'Next' button class, URL pattern)")
+    follow_pagination = st.sidebar.toggle("Follow Pagination",help="Also crawl and scrape the page URLs found by pagination, in the same launch")
+    if follow_pagination:
+        max_pages = st.sidebar.number_input("Max Pages",min_value=1,max_value=10000,value=CATALOG_MAX_PAGES,help="Maximum number of pages crawled, start URLs included")
+
+crawl_concurrency = st.sidebar.number_input("Crawl Concurrency",min_value=1,max_value=50,value=CRAWL_MAX_CONCURRENCY,help="Number of pages crawled at the same time by the shared browser")
+force_refresh = st.sidebar.toggle("Force Refresh",help="Ignore cached pages and crawl every URL again")
+profile_run = st.sidebar.toggle("Profile Run",help="Run the next launch under cProfile and show the slowest calls")
 
 st.sidebar.markdown("---")
 
@@ -167,55 +285,141 @@ if st.sidebar.button("LAUNCH", type="primary"):
         st.session_state['urls'] = st.session_state["urls_splitted"]
         st.session_state['fields'] = fields
         st.session_state['model_selection'] = model_selection
+        st.session_state['use_cascade'] = use_cascade
+        st.session_state['use_dedupe'] = use_dedupe
+        st.session_state['use_incremental'] = use_incremental
         st.session_state['use_pagination'] = use_pagination
         st.session_state['pagination_details'] = pagination_details
-        
-        # fetch or reuse the markdown for each URL
-        unique_names = fetch_and_store_markdowns(st.session_state["urls_splitted"])
-        st.session_state["unique_names"] = unique_names
+        st.session_state['follow_pagination'] = follow_pagination
+        st.session_state['max_pages'] = int(max_pages)
+        st.session_state['crawl_concurrency'] = int(crawl_concurrency)
+        st.session_state['force_refresh'] = force_refresh
+        st.session_state['run_id'] = generate_run_id()
+        st.session_state['profile_run'] = profile_run
+        st.session_state['profile_report'] = None
+        set_run_id(st.session_state['run_id'])
+
+
+        if follow_pagination:
+            # the catalog crawl fetches pages itself, as part of the pipelined job
+            st.session_state['scraping_state'] = 'scraping'
+        else:
+            # fetch or reuse the markdown for each URL
+            from markdown import crawl_and_store_markdowns
+            with st.spinner("Crawling pages..."):
+                crawl_reports = crawl_and_store_markdowns(st.session_state["urls_splitted"], int(crawl_concurrency), force_refresh=force_refresh)
+            for report in crawl_reports:
+                if report["status"] == "failed":
+                    st.warning(f"Could not crawl {report['url']}: {report['error']}")
+            # duplicate URLs are dropped, so keep the crawled URLs aligned with their unique_names
+            st.session_state["crawled_urls"] = [report["url"] for report in crawl_reports]
+            st.session_state["unique_names"] = [report["unique_name"] for report in crawl_reports]
 
-        # Move on to "scraping" step
-        st.session_state['scraping_state'] = 'scraping'
+            # Move on to "scraping" step
+            st.session_state['scraping_state'] = 'scraping'
 
 
 
 if st.session_state['scraping_state'] == 'scraping':
+    from scraper import scrape_urls
+    from pagination import paginate_urls
+    from markdown import read_raw_data_bulk
+    from write_buffer import WriteBuffer
+    from catalog_crawler import crawl_catalog
+    from results import listing_rows
+    # tag every span of this run (crawl, storage, LLM calls) with its run_id
+    set_run_id(st.session_state['run_id'])
+    profiler = RunProfiler(st.session_state['run_id']) if st.session_state.get('profile_run') else None
+    if profiler is not None:
+        profiler.start()
     try:
         with st.spinner("Processing..."):
-            unique_names = st.session_state["unique_names"]  # from the LAUNCH step
-
             total_input_tokens = 0
             total_output_tokens = 0
             total_cost = 0
-            
-            # 1) Scraping logic
             all_data = []
-            if show_tags:
-                in_tokens_s, out_tokens_s, cost_s, parsed_data = scrape_urls(unique_names,st.session_state['fields'],st.session_state['model_selection'])
-                total_input_tokens += in_tokens_s
-                total_output_tokens += out_tokens_s
-                total_cost += cost_s
-
-                # Store or display parsed data 
-                all_data = parsed_data # or rename to something consistent
-                st.session_state['in_tokens_s'] = in_tokens_s
-                st.session_state['out_tokens_s'] = out_tokens_s
-                st.session_state['cost_s'] = cost_s
-            # 2) Pagination logic
             pagination_info = None
-            if st.session_state['use_pagination']:
-                in_tokens_p, out_tokens_p, cost_p, page_results = paginate_urls(unique_names, st.session_state['model_selection'],st.session_state['pagination_details'],st.session_state["urls_splitted"])
-                total_input_tokens += in_tokens_p
-                total_output_tokens += out_tokens_p
-                total_cost += cost_p
-
-                # Example: store or display page_results
-                # pagination_info can contain the final 'page_urls' from the LLM
-                pagination_info = page_results
-                # you'd parse the page_results to build 'page_urls'
-                st.session_state['in_tokens_p'] = in_tokens_p
-                st.session_state['out_tokens_p'] = out_tokens_p
-                st.session_state['cost_p'] = cost_p
+
+            if st.session_state.get('follow_pagination'):
+                # one pipelined job: crawl, extract and follow pagination
+                catalog = crawl_catalog(st.session_state['urls'], st.session_state['fields'] if show_tags else [], st.session_state['model_selection'], st.session_state['pagination_details'], max_pages=st.session_state['max_pages'], crawl_concurrency=st.session_state['crawl_concurrency'], force_refresh=st.session_state['force_refresh'], cascade=st.session_state['use_cascade'], incremental=st.session_state['use_incremental'], dedupe=st.session_state['use_dedupe'])
+                for page in catalog["pages"]:
+                    if page["status"] == "failed":
+                        st.warning(f"Could not process {page['url']}: {page['error']}")
+                scrape_usage = catalog["scrape_usage"]
+                pagination_usage = catalog["pagination_usage"]
+                total_input_tokens = scrape_usage["input_tokens"] + pagination_usage["input_tokens"]
+                total_output_tokens = scrape_usage["output_tokens"] + pagination_usage["output_tokens"]
+                total_cost = scrape_usage["cost"] + pagination_usage["cost"]
+                if show_tags:
+                    all_data = catalog["parsed_results"]
+                    st.session_state['in_tokens_s'] = scrape_usage["input_tokens"]
+                    st.session_state['out_tokens_s'] = scrape_usage["output_tokens"]
+                    st.session_state['cost_s'] = scrape_usage["cost"]
+                pagination_info = catalog["pagination_results"]
+                st.session_state['in_tokens_p'] = pagination_usage["input_tokens"]
+                st.session_state['out_tokens_p'] = pagination_usage["output_tokens"]
+                st.session_state['cost_p'] = pagination_usage["cost"]
+            else:
+                unique_names = st.session_state["unique_names"]  # from the LAUNCH step
+                # one bulk read shared by the scraping and pagination stages
+                raw_data_map = read_raw_data_bulk(unique_names)
+
+                live_views = []
+
+                def on_scrape_result(result):
+                    if result is None or result.get("error"):
+                        scrape_progress.advance()
+                    else:
+                        scrape_progress.advance(result["token_counts"], result["cost"], listing_rows(result["parsed_data"]))
+
+                def on_pagination_result(result):
+                    if result is None or isinstance(result, dict):  # skipped or failed
+                        pagination_progress.advance()
+                    else:
+                        pagination_progress.advance(result[2], result[3])
+
+                # one write buffer shared by both stages, flushed when the run ends
+                with WriteBuffer() as write_buffer:
+                    # 1) Scraping logic
+                    if show_tags:
+                        scrape_progress = LiveProgress("Scraping", len(unique_names), show_table=True)
+                        live_views.append(scrape_progress)
+                        in_tokens_s, out_tokens_s, cost_s, parsed_data = scrape_urls(unique_names,st.session_state['fields'],st.session_state['model_selection'],parallel=True,raw_data_map=raw_data_map,write_buffer=write_buffer,on_result=on_scrape_result,cascade=st.session_state['use_cascade'],dedupe=st.session_state['use_dedupe'],incremental=st.session_state['use_incremental'])
+                        total_input_tokens += in_tokens_s
+                        total_output_tokens += out_tokens_s
+                        total_cost += cost_s
+
+                        # Store or display parsed data 
+                        all_data = parsed_data # or rename to something consistent
+                        st.session_state['in_tokens_s'] = in_tokens_s
+                        st.session_state['out_tokens_s'] = out_tokens_s
+                        st.session_state['cost_s'] = cost_s
+                    # 2) Pagination logic
+                    if st.session_state['use_pagination']:
+                        pagination_progress = LiveProgress("Pagination", len(unique_names))
+                        live_views.append(pagination_progress)
+                        in_tokens_p, out_tokens_p, cost_p, page_results = paginate_urls(unique_names, st.session_state['model_selection'],st.session_state['pagination_details'],st.session_state["crawled_urls"],parallel=True,raw_data_map=raw_data_map,write_buffer=write_buffer,on_result=on_pagination_result)
+                        total_input_tokens += in_tokens_p
+                        total_output_tokens += out_tokens_p
+                        total_cost += cost_p
+
+                        # Example: store or display page_results
+                        # pagination_info can contain the final 'page_urls' from the LLM
+                        pagination_info = page_results
+                        # you'd parse the page_results to build 'page_urls'
+                        st.session_state['in_tokens_p'] = in_tokens_p
+                        st.session_state['out_tokens_p'] = out_tokens_p
+                        st.session_state['cost_p'] = cost_p
+                # the final results are rendered below
+                for live_view in live_views:
+                    live_view.clear()
+                if write_buffer.failed_rows:
+                    st.warning(f"{len(write_buffer.failed_rows)} results could not be saved to the database.")
+            # pages that still failed after retries are reported, the others kept
+            failed_pages = {entry["unique_name"]: entry["error"] for entry in list(all_data) + list(pagination_info or []) if entry.get("error")}
+            if failed_pages:
+                st.warning(f"{len(failed_pages)} pages failed and were skipped: " + "; ".join(f"{uniq}: {error}" for uniq, error in failed_pages.items()))
             # 3) Save everything in session state
             st.session_state['results'] = {
                 'data': all_data,
@@ -231,6 +435,9 @@ if st.session_state['scraping_state'] == 'scraping':
 
         # Reset the scraping state to 'idle' so that the app stays in an idle state.
         st.session_state['scraping_state'] = 'idle'
+    finally:
+        if profiler is not None:
+            st.session_state['profile_report'] = profiler.stop()
 
 # Display results
 if st.session_state['scraping_state'] == 'completed' and st.session_state['results']:
@@ -247,66 +454,12 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
     if show_tags:
         st.subheader("Scraping Results")
 
-        # We'll accumulate all rows in this list
-        all_rows = []
-
-        # Loop over each data item in the "all_data" list
-        for i, data_item in enumerate(all_data, start=1):
-
-            # Usually data_item is something like:
-            # {"unique_name": "...", "parsed_data": DynamicListingsContainer(...) or dict or str}
-
-            # 1) Ensure data_item is a dict
-            if not isinstance(data_item, dict):
-                st.error(f"data_item is not a dict, skipping. Type: {type(data_item)}")
-                continue
-
-            # 2) If "parsed_data" is present and might be a Pydantic model or something
-            if "parsed_data" in data_item:
-                parsed_obj = data_item["parsed_data"]
-
-                # Convert if it's a Pydantic model
-                if hasattr(parsed_obj, "dict"):
-                    parsed_obj = parsed_obj.model_dump()
-                elif isinstance(parsed_obj, str):
-                    # If it's a JSON string, attempt to parse
-                    try:
-                        parsed_obj = json.loads(parsed_obj)
-                    except json.JSONDecodeError:
-                        # fallback: just keep as raw string
-                        pass
-
-                # Now we have "parsed_obj" as a dict, list, or string
-                data_item["parsed_data"] = parsed_obj
-
-            # 3) If the "parsed_data" has a 'listings' key that is a list of items,
-            #    we might want to treat them as multiple rows. 
-            #    Otherwise, we treat the entire data_item as a single row.
-
-            pd_obj = data_item["parsed_data"]
-
-            # If it has 'listings' in parsed_data
-            if isinstance(pd_obj, dict) and "listings" in pd_obj and isinstance(pd_obj["listings"], list):
-                # We'll create one row per listing, plus carry over "unique_name" or other fields
-                for listing in pd_obj["listings"]:
-                    # Make a shallow copy so we don't mutate 'listing'
-                    row_dict = dict(listing)
-                    # You can also attach the unique_name or other top-level fields:
-                    # row_dict["unique_name"] = data_item.get("unique_name", "")
-                    all_rows.append(row_dict)
-            else:
-                # We'll just store the entire item as one row
-                # Possibly flatten parsed_data => just store it as "parsed_data" field
-                # e.g. if parsed_obj is a dict, embed it. Or keep it as string
-                row_dict = dict(data_item)  # shallow copy
-                all_rows.append(row_dict)
-
-        # After collecting all rows from all_data in "all_rows", create one DataFrame
-        if not all_rows:
+        # one columnar table per run, built once and reused on every rerun
+        results_table = get_results_table(st.session_state.get('run_id'), all_data)
+        if results_table.empty:
             st.warning("No data rows to display.")
         else:
-            df = pd.DataFrame(all_rows)
-            st.dataframe(df, use_container_width=True)
+            st.dataframe(results_table, use_container_width=True)
 
         if "in_tokens_s" in st.session_state:
             st.sidebar.markdown("### Scraping Details")
@@ -314,85 +467,56 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
             st.sidebar.markdown(f"*Input Tokens:* {st.session_state['in_tokens_s']}")
             st.sidebar.markdown(f"*Output Tokens:* {st.session_state['out_tokens_s']}")
             st.sidebar.markdown(f"**Total Cost:** :green-background[**${st.session_state['cost_s']:.4f}**]")
-
-
-        # Download options
+            from scraper import summarize_pruning
+            pruning_totals = summarize_pruning(all_data)
+            if pruning_totals["tokens_before"]:
+                saved = 1 - pruning_totals["tokens_after"] / pruning_totals["tokens_before"]
+                st.sidebar.markdown(f"*Pruning:* {pruning_totals['tokens_before']} → {pruning_totals['tokens_after']} input tokens (-{saved:.0%})")
+            from incremental import summarize_incremental
+            incremental_totals = summarize_incremental(all_data)
+            if incremental_totals["unchanged"] or incremental_totals["partial"]:
+                st.sidebar.markdown(f"*Incremental:* {incremental_totals['unchanged']} pages unchanged, {incremental_totals['partial']} partly re-extracted ({incremental_totals['changed_blocks']} of {incremental_totals['blocks']} blocks sent)")
+            duplicate_pages = sum(1 for result in all_data if isinstance(result, dict) and result.get("duplicate_of"))
+            if duplicate_pages:
+                st.sidebar.markdown(f"*Near-Duplicates:* {duplicate_pages} pages reused another page's listings")
+            from cascade import summarize_cascade, cascade_tier_rows
+            cascade_rows = cascade_tier_rows(summarize_cascade(all_data))
+            if cascade_rows:
+                st.sidebar.markdown("#### Model Cascade")
+                st.sidebar.dataframe(cascade_rows, hide_index=True)
+            cache_stats = get_llm_cache().stats()
+            st.sidebar.markdown(f"*LLM Cache:* {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+            # input tokens the provider billed at its cached-prompt rate, over the whole run
+            llm_calls_summary = get_tracer().summary(st.session_state.get('run_id')).get("llm.call", {})
+            st.sidebar.markdown(f"*Provider-Cached Input Tokens:* {llm_calls_summary.get('cached_input_tokens', 0)} of {llm_calls_summary.get('input_tokens', 0)}")
+
+
+        # Download options (serialized once per run)
         st.subheader("Download Extracted Data")
-        col1, col2 = st.columns(2)
+        exports = get_results_exports(st.session_state.get('run_id'), results_table, all_data)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
-            json_data = json.dumps(all_data, default=lambda o: o.dict() if hasattr(o, 'dict') else str(o), indent=4)
-            st.download_button("Download JSON",data=json_data,file_name="scraped_data.json")
+            st.download_button("Download JSON",data=exports["json"],file_name="scraped_data.json")
         with col2:
-            # Convert all data to a single DataFrame
-            all_listings = []
-            for data in all_data:
-                if isinstance(data, str):
-                    try:
-                        data = json.loads(data)
-                    except json.JSONDecodeError:
-                        continue
-                if isinstance(data, dict) and 'listings' in data:
-                    all_listings.extend(data['listings'])
-                elif hasattr(data, 'listings'):
-                    all_listings.extend([item.dict() for item in data.listings])
-                else:
-                    all_listings.append(data)
-            
-            combined_df = pd.DataFrame(all_listings)
-            st.download_button("Download CSV",data=combined_df.to_csv(index=False),file_name="scraped_data.csv")
+            st.download_button("Download CSV",data=exports["csv"],file_name="scraped_data.csv")
+        with col3:
+            st.download_button("Download NDJSON",data=exports["ndjson"],file_name="scraped_data.ndjson")
+        with col4:
+            if exports["parquet"] is not None:
+                st.download_button("Download Parquet",data=exports["parquet"],file_name="scraped_data.parquet")
+            else:
+                st.caption("Install pyarrow for Parquet export")
 
         st.success(f"Scraping completed. Results saved in database")
 
     # Display pagination info
     if pagination_info:
-        all_page_rows = []
-
-        # Iterate through pagination_info, which contains multiple items
-        for i, item in enumerate(pagination_info, start=1):
-
-            # Ensure item is a dictionary
-            if not isinstance(item, dict):
-                st.error(f"item is not a dict, skipping. Type: {type(item)}")
-                continue
-
-            # Check if "pagination_data" exists
-            if "pagination_data" in item:
-                pag_obj = item["pagination_data"]
-
-                # Convert if it's a Pydantic model
-                if hasattr(pag_obj, "dict"):
-                    pag_obj = pag_obj.model_dump()
-                elif isinstance(pag_obj, str):
-                    # If it's a JSON string, attempt to parse
-                    try:
-                        pag_obj = json.loads(pag_obj)
-                    except json.JSONDecodeError:
-                        # Fallback: keep it as raw string
-                        pass
-
-                # Now we have pag_obj as a dict, list, or string
-                item["pagination_data"] = pag_obj
-
-            # Process the extracted pagination_data
-            pd_obj = item["pagination_data"]
-
-            # If it contains "page_urls" and it's a list, extract individual rows
-            if isinstance(pd_obj, dict) and "page_urls" in pd_obj and isinstance(pd_obj["page_urls"], list):
-                for page_url in pd_obj["page_urls"]:
-                    row_dict = {"page_url": page_url}
-                    # Optionally, attach "unique_name" or other top-level fields
-                    # row_dict["unique_name"] = item.get("unique_name", "")
-                    all_page_rows.append(row_dict)
-            else:
-                # Otherwise, store the entire item as a single row
-                row_dict = dict(item)  # Shallow copy
-                all_page_rows.append(row_dict)
+        pagination_df = get_pagination_table(st.session_state.get('run_id'), pagination_info)
 
         # Create DataFrame and display it
-        if not all_page_rows:
+        if pagination_df.empty:
             st.warning("No page URLs found.")
         else:
-            pagination_df = pd.DataFrame(all_page_rows)
             st.markdown("---")
             st.subheader("Pagination Information")
             st.write("**Page URLs:**")
@@ -402,7 +526,7 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
             # Display token usage and cost using metrics
             st.sidebar.markdown("---")
             st.sidebar.markdown("### Pagination Details")
-            st.sidebar.markdown(f"**Number of Page URLs:** {len(all_page_rows)}")
+            st.sidebar.markdown(f"**Number of Page URLs:** {len(pagination_df)}")
             st.sidebar.markdown("#### Pagination Token Usage")
             st.sidebar.markdown(f"*Input Tokens:* {st.session_state['in_tokens_p']}")
             st.sidebar.markdown(f"*Output Tokens:* {st.session_state['out_tokens_p']}")
@@ -413,7 +537,22 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
         with col1:
             st.download_button("Download Pagination CSV",data=pagination_df.to_csv(index=False),file_name="pagination_urls.csv")
         with col2:
-            st.download_button("Download Pagination JSON",data=json.dumps(all_page_rows, indent=4),file_name="pagination_urls.json")
+            st.download_button("Download Pagination JSON",data=pagination_df.to_json(orient="records", indent=4),file_name="pagination_urls.json")
+    # Where the run spent its time (see tracing.py)
+    run_id = st.session_state.get('run_id')
+    timing = get_tracer().summary(run_id)
+    if timing:
+        st.sidebar.markdown("---")
+        st.sidebar.markdown("### Timing")
+        for name, entry in sorted(timing.items(), key=lambda item: -item[1]["total_seconds"]):
+            st.sidebar.markdown(f"*{name}:* {entry['total_seconds']:.2f}s in {entry['count']} spans (max {entry['max_seconds']:.2f}s)")
+        st.sidebar.download_button("Download Trace (JSON lines)",data=get_tracer().to_jsonl(run_id),file_name=f"trace_{run_id}.jsonl")
+        st.sidebar.download_button("Download Metrics (Prometheus)",data=get_tracer().to_prometheus(run_id),file_name=f"metrics_{run_id}.prom")
+    if st.session_state.get('profile_report'):
+        with st.expander("Profile of this run"):
+            st.caption(f"Saved to {st.session_state['profile_report']['path']}")
+            st.text(st.session_state['profile_report']['top'])
+
     # Reset scraping state
     if st.sidebar.button("Clear Results"):
         st.session_state['scraping_state'] = 'idle'
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+
+import batch_jobs
+import llm_cache
+import scraper
+from assets import BATCH_PRICE_FACTOR
+from llm_calls import build_batch_request
+
+FIELDS = ["name", "price"]
+MODEL = "gpt-4o-mini"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = llm_cache.LLMResponseCache(path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(llm_cache, "_llm_cache", cache)
+    monkeypatch.setattr(batch_jobs, "LLM_CACHE_ENABLED", True)
+    return cache
+
+
+def request():
+    container = scraper.get_listing_models(tuple(FIELDS))[1]
+    return build_batch_request("page#0", "| A | $1 |", container, MODEL, "Extract listings")
+
+
+def test_local_backend_answers_repeated_requests_from_the_cache(cache, monkeypatch):
+    calls = []
+
+    def completion(**body):
+        calls.append(body)
+        message = SimpleNamespace(content='{"listings": []}')
+        return SimpleNamespace(model=MODEL, choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110))
+
+    monkeypatch.setattr(batch_jobs.litellm, "completion", completion)
+    first = batch_jobs.LocalBatchBackend._answer(request())
+    second = batch_jobs.LocalBatchBackend._answer(request())
+    assert len(calls) == 1
+    assert second["response"]["body"]["choices"] == first["response"]["body"]["choices"]
+    assert second["response"]["body"]["usage"]["prompt_tokens"] == 100
+
+
+def test_local_backend_shares_cache_keys_with_call_llm_model(cache):
+    body = request()["body"]
+    container = scraper.get_listing_models(tuple(FIELDS))[1]
+    assert (cache.make_key(MODEL, body["messages"], batch_jobs._request_schema(body["response_format"]))
+            == cache.make_key(MODEL, body["messages"], container))
+
+
+def test_only_batch_endpoints_get_the_batch_price():
+    assert batch_jobs.LocalBatchBackend.price_factor == 1.0
+    assert batch_jobs.OpenAIBatchBackend.price_factor == BATCH_PRICE_FACTOR
+    full = batch_jobs.batch_cost(MODEL, 1000, 100)
+    assert full > 0
+    assert batch_jobs.batch_cost(MODEL, 1000, 100, BATCH_PRICE_FACTOR) == pytest.approx(full * BATCH_PRICE_FACTOR)
@@ -0,0 +1,71 @@
+import pytest
+
+import blob_store
+import markdown
+import storage
+from benchmarks.memory_supabase import InMemorySupabaseClient
+from blob_store import LocalBlobStore, SupabaseBlobStore, ZSTD_MAGIC, is_blob_reference, resolve_raw_data
+from storage import SQLiteStorage
+
+PAGE = "# Products\n\n| Name | Price |\n| --- | --- |\n" + "".join(f"| Item {i} | ${i}.00 |\n" for i in range(200))
+
+
+def test_round_trip_stores_identical_pages_once(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    reference = store.put_text(PAGE)
+    assert is_blob_reference(reference)
+    assert reference["size"] == len(PAGE.encode("utf-8")) > reference["stored_size"]
+    assert store.put_text(PAGE) == reference
+    assert len(list(tmp_path.rglob("*"))) == 2  # one folder, one blob
+    assert resolve_raw_data(reference, store) == PAGE
+    assert resolve_raw_data("inline markdown", store) == "inline markdown"
+
+
+def test_blobs_stay_readable_after_the_default_codec_changes(tmp_path, monkeypatch):
+    pytest.importorskip("zstandard")
+    store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(blob_store, "DEFAULT_CODEC", "zstd")
+    zstd_reference = store.put_text(PAGE)
+    monkeypatch.setattr(blob_store, "DEFAULT_CODEC", "zlib")
+    zlib_reference = store.put_text(PAGE + "\nmore")
+    # the existing zstd blob is reused as it is
+    assert store.put_text(PAGE) == zstd_reference
+    assert (tmp_path / zstd_reference["blob"][:2] / zstd_reference["blob"][2:]).read_bytes().startswith(ZSTD_MAGIC)
+
+    assert store.get_text(zstd_reference) == PAGE
+    assert store.get_text(zlib_reference) == PAGE + "\nmore"
+    # rows written before the codec was detected still carry a "codec" key
+    assert store.get_text({**zstd_reference, "codec": "zlib"}) == PAGE
+
+    monkeypatch.setattr(blob_store, "zstandard", None)
+    assert store.get_text(zlib_reference) == PAGE + "\nmore"
+    with pytest.raises(RuntimeError, match="zstandard"):
+        store.get_text(zstd_reference)
+
+
+def test_supabase_bucket_round_trip():
+    client = InMemorySupabaseClient()
+    store = SupabaseBlobStore("raw-blobs", client)
+    reference = store.put_text(PAGE)
+    assert store.put_text(PAGE) == reference
+    assert store.get_text(reference) == PAGE
+
+
+def test_saved_pages_keep_only_a_reference_and_load_on_lookup(tmp_path, monkeypatch):
+    rows = SQLiteStorage(":memory:")
+    store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(storage, "_storage", rows)
+    monkeypatch.setattr(blob_store, "_blob_store", store)
+    monkeypatch.setattr(markdown, "RAW_DATA_BLOBS_ENABLED", True)
+    markdown.save_raw_data("shop_a", "https://shop.example/a", PAGE)
+    markdown.save_raw_data("shop_b", "https://shop.example/b", PAGE + "\nmore")
+    assert is_blob_reference(rows.read_raw("shop_a"))
+    assert markdown.read_raw_data("shop_a") == PAGE
+
+    reads = []
+    monkeypatch.setattr(store, "get_text", lambda reference: reads.append(reference) or LocalBlobStore.get_text(store, reference))
+    pages = markdown.read_raw_data_bulk(["shop_a", "shop_b"])
+    assert len(pages) == 2 and reads == []
+    assert pages["shop_b"] == PAGE + "\nmore"
+    assert pages["shop_b"] == PAGE + "\nmore"
+    assert len(reads) == 1
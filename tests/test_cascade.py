@@ -0,0 +1,54 @@
+import pytest
+
+import scraper
+from cascade import pick_cascade_result, validate_extraction
+from resilience import CircuitOpenError
+
+FIELDS = ["name", "price"]
+
+
+def container():
+    return scraper.get_listing_models(tuple(FIELDS))[1]
+
+
+def usage():
+    return {"input_tokens": 10, "output_tokens": 5, "cached_input_tokens": 0, "latency": {"queue": 0.0, "network": 0.1, "parse": 0.0}}
+
+
+def test_validate_extraction_rejects_empty_fields():
+    accepted, reason, _ = validate_extraction('{"listings": [{"name": "A", "price": "N/A"}]}', container(), FIELDS)
+    assert not accepted and reason == "empty fields"
+    assert validate_extraction('{"listings": []}', container(), FIELDS)[1] == "no listings"
+    assert validate_extraction("not json", container(), FIELDS)[1] == "invalid output"
+    assert validate_extraction('{"listings": [{"name": "A", "price": "1"}]}', container(), FIELDS)[0]
+
+
+def test_pick_prefers_valid_output_over_errors():
+    attempts = [
+        {"tier": 0, "accepted": False, "reason": "error", "empty_fraction": 1.0},
+        {"tier": 1, "accepted": False, "reason": "empty fields", "empty_fraction": 0.5},
+    ]
+    assert pick_cascade_result(attempts)["tier"] == 1
+
+
+def test_cascade_escalates_past_a_tier_that_raises(monkeypatch):
+    def extract(raw_data, listings_container_model, model, system_message):
+        if model == "cheap":
+            raise CircuitOpenError("cheap is failing")
+        return '{"listings": [{"name": "A", "price": "1"}]}', usage(), 0.01
+
+    monkeypatch.setattr(scraper, "extract_listings", extract)
+    parsed, token_counts, cost, cascade = scraper.extract_listings_cascade("page", container(), FIELDS, ["cheap", "strong"], "system")
+    assert cascade["model"] == "strong" and cascade["accepted"]
+    assert [attempt["reason"] for attempt in cascade["attempts"]] == ["error", None]
+    assert "exception" not in cascade["attempts"][0]
+    assert token_counts["input_tokens"] == 10 and cost == 0.01
+
+
+def test_cascade_raises_when_every_tier_fails(monkeypatch):
+    def extract(raw_data, listings_container_model, model, system_message):
+        raise CircuitOpenError(f"{model} is failing")
+
+    monkeypatch.setattr(scraper, "extract_listings", extract)
+    with pytest.raises(CircuitOpenError):
+        scraper.extract_listings_cascade("page", container(), FIELDS, ["cheap", "strong"], "system")
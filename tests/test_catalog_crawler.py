@@ -0,0 +1,124 @@
+import sys
+import types
+
+import pytest
+
+import catalog_crawler
+
+FIELDS = ["name", "price"]
+
+
+class FakeCrawler:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSite:
+    """A catalog of pages ({url: (markdown, [page urls])}) behind the crawl, pagination and extraction steps."""
+
+    def __init__(self, monkeypatch, pages, previous=None):
+        self.pages = pages
+        self.previous = previous or {}
+        self.crawled = []
+        self.scraped = []
+        monkeypatch.setitem(sys.modules, "crawl4ai", types.SimpleNamespace(AsyncWebCrawler=FakeCrawler))
+        monkeypatch.setattr(catalog_crawler, "crawl_urls_async", self.crawl)
+        monkeypatch.setattr(catalog_crawler, "read_cached_page", lambda uniq: None)
+        monkeypatch.setattr(catalog_crawler, "save_raw_data", lambda *args: None)
+        monkeypatch.setattr(catalog_crawler, "apaginate_page", self.paginate)
+        monkeypatch.setattr(catalog_crawler, "ascrape_page", self.scrape)
+        monkeypatch.setattr(catalog_crawler, "read_formatted_data_bulk", lambda names: {name: self.previous[name] for name in names if name in self.previous})
+
+    async def crawl(self, urls, concurrency, crawler=None):
+        url = urls[0]
+        self.crawled.append(url)
+        if url not in self.pages:
+            return [{"url": url, "success": False, "markdown": "", "headers": {}, "error": "404 Not Found"}]
+        return [{"url": url, "success": True, "markdown": self.pages[url][0], "headers": {}, "error": None}]
+
+    async def paginate(self, uniq, raw_data, url, model, indication, write_buffer=None):
+        return uniq, {"page_urls": self.pages[url][1]}, {"input_tokens": 0, "output_tokens": 0}, 0
+
+    async def scrape(self, uniq, raw_data, container, fields, model, write_buffer=None, cascade_models=None, incremental=False, previous_data=None):
+        self.scraped.append({"unique_name": uniq, "incremental": incremental, "previous_data": previous_data})
+        return {"unique_name": uniq, "parsed_data": {"listings": [{"name": raw_data, "price": "1"}]},
+                "token_counts": {"input_tokens": 10, "output_tokens": 5}, "cost": 0.01}
+
+
+def crawl(**options):
+    return catalog_crawler.crawl_catalog(["https://shop.example/?page=1"], FIELDS, "gpt-4o-mini", **options)
+
+
+def test_catalog_passes_previous_data_for_incremental_extraction(monkeypatch):
+    pages = {"https://shop.example/?page=1": ("page 1", [])}
+    uniq = catalog_crawler.generate_unique_name("https://shop.example/?page=1")
+    site = FakeSite(monkeypatch, pages, previous={uniq: {"listings": []}})
+    crawl(incremental=True)
+    assert site.scraped == [{"unique_name": uniq, "incremental": True, "previous_data": {"listings": []}}]
+    site.scraped.clear()
+    crawl()
+    assert site.scraped[0]["incremental"] is False and site.scraped[0]["previous_data"] is None
+
+
+def test_catalog_reuses_extractions_of_near_duplicate_pages(monkeypatch):
+    import scraper
+    monkeypatch.setattr(scraper, "save_formatted_data", lambda *args, **kwargs: None)
+    listing_text = " ".join(f"Item {n} costs {n} dollars and ships in {n % 5 + 1} days." for n in range(30))
+    pages = {
+        "https://shop.example/?page=1": (listing_text, ["https://mirror.example/?page=1", "https://shop.example/?page=2"]),
+        "https://mirror.example/?page=1": (listing_text + " Thanks for visiting.", []),
+        "https://shop.example/?page=2": ("Completely different products " * 20, []),
+    }
+    site = FakeSite(monkeypatch, pages)
+    catalog = crawl(dedupe=True, max_depth=1)
+    assert len(site.scraped) == 2
+    duplicates = [result for result in catalog["parsed_results"] if result.get("duplicate_of")]
+    assert len(duplicates) == 1
+    assert duplicates[0]["duplicate_of"] == catalog_crawler.generate_unique_name("https://shop.example/?page=1")
+
+    site.scraped.clear()
+    crawl(max_depth=1)
+    assert len(site.scraped) == 3
+
+
+def test_catalog_reports_pages_that_fail(monkeypatch):
+    pages = {
+        "https://shop.example/?page=1": ("page 1", ["https://shop.example/?page=2", "https://shop.example/?page=3"]),
+        "https://shop.example/?page=3": ("broken page", []),
+    }
+    site = FakeSite(monkeypatch, pages)
+    scrape = site.scrape
+
+    async def scrape_or_fail(uniq, raw_data, *args, **kwargs):
+        if raw_data == "broken page":
+            raise RuntimeError("rate limited")
+        return await scrape(uniq, raw_data, *args, **kwargs)
+
+    monkeypatch.setattr(catalog_crawler, "ascrape_page", scrape_or_fail)
+    catalog = crawl(max_depth=1)
+    errors = {result["unique_name"]: result["error"] for result in catalog["parsed_results"] if result.get("error")}
+    assert errors == {
+        catalog_crawler.generate_unique_name("https://shop.example/?page=2"): "404 Not Found",
+        catalog_crawler.generate_unique_name("https://shop.example/?page=3"): "rate limited",
+    }
+    assert len(catalog["parsed_results"]) == 3
+
+
+def test_catalog_follows_page_urls_up_to_max_pages(monkeypatch):
+    pages = {f"https://shop.example/?page={n}": (f"page {n}", [f"https://shop.example/?page={n + 1}"]) for n in range(1, 10)}
+    site = FakeSite(monkeypatch, pages)
+    catalog = crawl(max_pages=3, max_depth=10)
+    assert site.crawled == [f"https://shop.example/?page={n}" for n in (1, 2, 3)]
+    assert [page["depth"] for page in catalog["pages"]] == [0, 1, 2]
+    assert len(catalog["parsed_results"]) == 3
+    assert catalog["scrape_usage"]["input_tokens"] == 30
+
+
+def test_catalog_stops_paginating_at_max_depth(monkeypatch):
+    pages = {f"https://shop.example/?page={n}": (f"page {n}", [f"https://shop.example/?page={n + 1}"]) for n in range(1, 10)}
+    site = FakeSite(monkeypatch, pages)
+    crawl(max_pages=10, max_depth=1)
+    assert site.crawled == ["https://shop.example/?page=1", "https://shop.example/?page=2"]
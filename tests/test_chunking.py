@@ -0,0 +1,69 @@
+from chunking import split_markdown_blocks, chunk_markdown, estimate_tokens
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def test_headings_start_blocks_and_tables_stay_together():
+    markdown = "# Shoes\n\n| Name | Price |\n|---|---|\n| A | 1 |\n| B | 2 |\n\n## Bags\nSome text.\n\nMore text."
+    blocks = split_markdown_blocks(markdown)
+    assert blocks[0].startswith("# Shoes")
+    assert "| A | 1 |" in blocks[0] and "| B | 2 |" in blocks[0]
+    assert blocks[1] == "## Bags\nSome text."
+    assert blocks[2] == "More text."
+
+
+def test_list_items_and_continuation_lines_stay_together():
+    markdown = "- one\n  continued\n- two\n\n- three\n\nAfter the list."
+    blocks = split_markdown_blocks(markdown)
+    assert blocks[0].splitlines()[0] == "- one"
+    assert "- three" in blocks[0]
+    assert blocks[-1] == "After the list."
+
+
+def test_small_markdown_is_one_chunk():
+    assert chunk_markdown("# Title\n\nshort page", 100, word_count) == ["# Title\n\nshort page"]
+
+
+def test_blocks_are_packed_without_exceeding_the_budget():
+    markdown = "\n\n".join(f"## Section {i}\n" + " ".join(["word"] * 8) for i in range(10))
+    chunks = chunk_markdown(markdown, 25, word_count)
+    assert len(chunks) > 1
+    assert all(word_count(chunk) <= 25 for chunk in chunks)
+    # no block is cut: every section heading is followed by its text in the same chunk
+    assert sum(chunk.count("## Section") for chunk in chunks) == 10
+
+
+def test_oversized_table_repeats_its_header_in_every_piece():
+    rows = "\n".join(f"| item{i} | {i} |" for i in range(40))
+    markdown = "| Name | Price |\n|---|---|\n" + rows
+    chunks = chunk_markdown(markdown, 30, word_count)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith("| Name | Price |\n|---|---|")
+    assert sum(chunk.count("| item") for chunk in chunks) == 40
+
+
+def flatten(chunks):
+    return [line for chunk in chunks for line in chunk.splitlines() if line.strip()]
+
+
+def test_oversized_list_keeps_its_order_and_the_budget():
+    items = [f"- item {i} " + ("x" * (300 if i == 5 else 10)) for i in range(20)]
+    markdown = "\n".join(items)
+    chunks = chunk_markdown(markdown, 40)
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+    lines = flatten(chunks)
+    # the long item is cut by characters, everything else is whole and in order
+    assert "".join(lines) == "".join(items)
+    assert [int(line.split()[2]) for line in lines if line.startswith("- item")] == list(range(20))
+
+
+def test_oversized_table_with_a_long_row_keeps_its_order_and_the_budget():
+    rows = [f"| item{i} | {'y' * (500 if i == 7 else 20)} |" for i in range(30)]
+    markdown = "| Name | Description |\n|---|---|\n" + "\n".join(rows)
+    chunks = chunk_markdown(markdown, 60)
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+    body = [line for line in flatten(chunks) if line not in ("| Name | Description |", "|---|---|")]
+    assert "".join(body) == "".join(rows)
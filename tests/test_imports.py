@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("litellm", "pandas", "pyarrow")
+
+
+def heavy_modules_loaded_by(module: str) -> list:
+    script = f"import sys, json, {module}; print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    output = subprocess.check_output([sys.executable, "-c", script], cwd=REPO_ROOT, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_helper_modules_do_not_import_litellm_or_pandas():
+    for module in ("results", "chunking", "resilience", "cascade"):
+        assert heavy_modules_loaded_by(module) == [], module
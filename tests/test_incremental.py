@@ -0,0 +1,152 @@
+import incremental
+from incremental import MANIFEST_KEY, split_change_blocks, merge_incremental, build_manifest
+
+FIELDS = ["name", "price"]
+MODEL = "gpt-4o-mini"
+PROMPT = "Extract the listings."
+
+TABLE_PAGE = """# Products
+
+| Name | Price |
+| --- | --- |
+| Red Mug | $5.00 |
+| Blue Mug | $6.00 |
+| Green Mug | $7.00 |
+| Black Mug | $8.00 |
+"""
+
+CARDS_PAGE = """# Shop
+
+Welcome to the shop.
+
+## Widget
+
+The blue widget for every desk.
+
+Price: $19.99
+
+## Gadget
+
+A small gadget.
+
+Price: $9.99
+
+## Gizmo
+
+A shiny gizmo.
+
+Price: $4.99
+"""
+
+CARDS = [
+    {"name": "Widget", "price": "$19.99"},
+    {"name": "Gadget", "price": "$9.99"},
+    {"name": "Gizmo", "price": "$4.99"},
+]
+
+
+def plan_incremental(markdown, fields, previous_data, model=MODEL, system_message=PROMPT):
+    return incremental.plan_incremental(markdown, fields, previous_data, model, system_message)
+
+
+def extracted(markdown, listings):
+    """formatted_data as stored after a full extraction of markdown."""
+    plan = plan_incremental(markdown, FIELDS, None)
+    assert plan["mode"] == "full"
+    return {"listings": listings, MANIFEST_KEY: build_manifest(plan, listings, FIELDS)}
+
+
+def test_split_change_blocks_cuts_tables_and_lists():
+    units = split_change_blocks(TABLE_PAGE + "\n## Notes\n\n- one\n- two\n  continued\n")
+    assert units[0] == "# Products\n| Name | Price |\n| --- | --- |\n| Red Mug | $5.00 |"
+    assert units[3] == "# Products\n| Name | Price |\n| --- | --- |\n| Black Mug | $8.00 |"
+    assert units[4:] == ["## Notes\n- one", "## Notes\n- two\n  continued"]
+
+
+def test_unchanged_page_reuses_every_listing():
+    listings = [{"name": "Red Mug", "price": "$5.00"}, {"name": "Blue Mug", "price": "$6.00"}]
+    plan = plan_incremental(TABLE_PAGE, FIELDS, extracted(TABLE_PAGE, listings))
+    assert plan["mode"] == "unchanged"
+    assert merge_incremental(plan, [], FIELDS)[0] == listings
+
+
+def test_changed_table_row_is_extracted_on_its_own():
+    listings = [
+        {"name": "Red Mug", "price": "$5.00"},
+        {"name": "Blue Mug", "price": "$6.00"},
+        {"name": "Green Mug", "price": "$7.00"},
+        {"name": "Black Mug", "price": "$8.00"},
+    ]
+    page = TABLE_PAGE.replace("$6.00", "$6.50")
+    plan = plan_incremental(page, FIELDS, extracted(TABLE_PAGE, listings))
+    assert plan["mode"] == "partial"
+    assert "Blue Mug | $6.50" in plan["changed_markdown"] and "Red Mug" not in plan["changed_markdown"]
+    merged, manifest = merge_incremental(plan, [{"name": "Blue Mug", "price": "$6.50"}], FIELDS)
+    assert [listing["price"] for listing in merged] == ["$5.00", "$6.50", "$7.00", "$8.00"]
+    assert len(manifest["listing_blocks"]) == len(merged)
+
+
+def test_changed_paragraph_resends_its_whole_card():
+    page = CARDS_PAGE.replace("$19.99", "$24.99")
+    plan = plan_incremental(page, FIELDS, extracted(CARDS_PAGE, CARDS))
+    assert plan["mode"] == "partial"
+    assert plan["changed_markdown"] == "## Widget\n\nThe blue widget for every desk.\n\nPrice: $24.99"
+    assert [listing["name"] for _, listing in plan["kept"]] == ["Gadget", "Gizmo"]
+    merged, _ = merge_incremental(plan, [{"name": "Widget", "price": "$24.99"}], FIELDS)
+    assert merged == [{"name": "Widget", "price": "$24.99"}] + CARDS[1:]
+
+
+def test_removed_paragraph_resends_its_card():
+    page = CARDS_PAGE.replace("\nA small gadget.\n", "")
+    plan = plan_incremental(page, FIELDS, extracted(CARDS_PAGE, CARDS))
+    assert plan["mode"] == "partial"
+    assert plan["changed_markdown"] == "## Gadget\n\nPrice: $9.99"
+    assert [listing["name"] for _, listing in plan["kept"]] == ["Widget", "Gizmo"]
+
+
+def test_change_outside_any_section_falls_back_to_full():
+    page = "Intro text that changed.\n\n" + CARDS_PAGE
+    previous = extracted("Intro text.\n\n" + CARDS_PAGE, CARDS)
+    assert plan_incremental(page, FIELDS, previous)["mode"] == "full"
+
+
+def test_other_fields_or_old_manifests_fall_back_to_full():
+    previous = extracted(CARDS_PAGE, CARDS)
+    assert plan_incremental(CARDS_PAGE, ["name"], previous)["mode"] == "full"
+    manifest = {key: value for key, value in previous[MANIFEST_KEY].items() if key != "block_sections"}
+    assert plan_incremental(CARDS_PAGE, FIELDS, {**previous, MANIFEST_KEY: manifest})["mode"] == "full"
+
+
+def test_other_model_or_prompt_falls_back_to_full():
+    page = CARDS_PAGE.replace("$19.99", "$24.99")
+    previous = extracted(CARDS_PAGE, CARDS)
+    assert plan_incremental(page, FIELDS, previous)["mode"] == "partial"
+    assert plan_incremental(page, FIELDS, previous, model="gemini-1.5-flash")["mode"] == "full"
+    assert plan_incremental(CARDS_PAGE, FIELDS, previous, system_message="Extract every listing.")["mode"] == "full"
+
+
+def product_page(names):
+    cards = [
+        f"## {name}\n\nA {name.lower()} for every desk.\n\n"
+        f"[View {name}](https://shop.example/products/{name.lower()}?variant=1234567890&collection=desk-accessories&sort=featured)\n\n"
+        f"Price: ${len(name)}.99"
+        for name in names
+    ]
+    return "# Shop\n\n" + "\n\n".join(cards) + "\n"
+
+
+def test_incremental_extraction_with_pruning_sends_only_the_new_card(monkeypatch):
+    import scraper
+    monkeypatch.setattr(scraper, "PRUNING_ENABLED", True)
+    names = ["Lamp", "Chair", "Desk", "Shelf", "Stool", "Rug"]
+    listings = [{"name": name, "price": f"${len(name)}.99"} for name in names]
+    plan, sent, _ = scraper.prepare_page_extraction("shop", product_page(names), FIELDS, None, True, MODEL, PROMPT)
+    assert plan["mode"] == "full" and "[1]: https://shop.example/products/lamp" in sent
+    previous = {"listings": listings, MANIFEST_KEY: build_manifest(plan, listings, FIELDS)}
+
+    # a listing added at the top renumbers every collapsed link of the full page
+    plan, sent, _ = scraper.prepare_page_extraction("shop", product_page(["Sofa"] + names), FIELDS, previous, True, MODEL, PROMPT)
+    assert plan["mode"] == "partial"
+    assert len(plan["kept"]) == len(names)
+    assert "## Sofa" in sent and "Lamp" not in sent
+    assert "[View Sofa][1]" in sent and "[1]: https://shop.example/products/sofa" in sent
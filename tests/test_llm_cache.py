@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+import llm_calls
+from assets import OPENAI_MODEL_FULLNAME
+from llm_cache import LLMResponseCache
+
+MESSAGES = [{"role": "user", "content": "Extract the listings"}]
+TOKENS = {"input_tokens": 100, "output_tokens": 10, "cached_input_tokens": 0}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(llm_cache, "_llm_cache", cache)
+    return cache
+
+
+def test_hit_returns_the_stored_response_with_its_usage(cache):
+    key = cache.make_key("gpt-4o-mini", MESSAGES)
+    assert cache.get(key) is None
+    cache.set(key, {"listings": []}, TOKENS, 0.002)
+    assert cache.get(key) == {"parsed_response": {"listings": []}, "token_counts": TOKENS, "cost": 0.002}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_key_depends_on_model_messages_and_max_tokens():
+    key = LLMResponseCache.make_key("gpt-4o-mini", MESSAGES)
+    assert LLMResponseCache.make_key("gpt-4o-mini", MESSAGES) == key
+    assert LLMResponseCache.make_key("gpt-4o", MESSAGES) != key
+    assert LLMResponseCache.make_key("gpt-4o-mini", MESSAGES, max_tokens=100) != key
+    assert LLMResponseCache.make_key("gpt-4o-mini", [{"role": "user", "content": "Other"}]) != key
+
+
+def test_entries_expire_after_max_age(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite"), max_age_seconds=60)
+    cache.set("key", "response", TOKENS, 0.0)
+    now[0] += 30
+    assert cache.get("key") is not None
+    now[0] += 31
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite"), max_age_seconds=None)
+    for key in ("a", "b"):
+        cache.set(key, "x" * 100, TOKENS, 0.0)
+        now[0] += 1
+    cache.get("a")  # "b" is now the least recently used
+    cache.max_bytes = cache.stats()["bytes"]
+    now[0] += 1
+    cache.set("c", "x" * 100, TOKENS, 0.0)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_call_llm_model_sends_identical_requests_once(cache, monkeypatch):
+    calls = []
+
+    def completion(**params):
+        calls.append(params)
+        message = SimpleNamespace(content='{"listings": []}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+
+    monkeypatch.setattr(llm_calls, "completion", completion)
+    monkeypatch.setattr(llm_calls, "completion_cost", lambda completion_response: 0.002)
+    first = llm_calls.call_llm_model("| A | $1 |", None, OPENAI_MODEL_FULLNAME, "Extract listings", use_cache=True)
+    second = llm_calls.call_llm_model("| A | $1 |", None, OPENAI_MODEL_FULLNAME, "Extract listings", use_cache=True)
+    assert len(calls) == 1
+    assert second[0] == first[0] and second[2] == first[2] == 0.002
+    assert second[1]["input_tokens"] == 100 and second[1]["latency"]["network"] == 0.0
+    llm_calls.call_llm_model("| B | $2 |", None, OPENAI_MODEL_FULLNAME, "Extract listings", use_cache=True)
+    assert len(calls) == 2
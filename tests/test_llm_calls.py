@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+import llm_calls
+from assets import OPENAI_MODEL_FULLNAME
+
+
+def response(content='{"listings": []}', usage=None):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def fake_provider(monkeypatch, reply):
+    calls = []
+
+    def completion(**params):
+        calls.append(params)
+        return reply
+
+    async def acompletion(**params):
+        calls.append(params)
+        return reply
+
+    monkeypatch.setattr(llm_calls, "completion", completion)
+    monkeypatch.setattr(llm_calls, "acompletion", acompletion)
+    monkeypatch.setattr(llm_calls, "completion_cost", lambda completion_response: 0.001)
+    return calls
+
+
+def test_token_counts_come_from_the_provider_usage(monkeypatch):
+    usage = SimpleNamespace(prompt_tokens=1200, completion_tokens=80, prompt_tokens_details={"cached_tokens": 1024})
+    fake_provider(monkeypatch, response(usage=usage))
+
+    def count_tokens(model, text):
+        raise AssertionError("the response should not be tokenized locally")
+
+    monkeypatch.setattr(llm_calls, "count_tokens", count_tokens)
+    _, token_counts, cost = llm_calls.call_llm_model("page", None, OPENAI_MODEL_FULLNAME, "Extract", use_cache=False)
+    assert (token_counts["input_tokens"], token_counts["output_tokens"], token_counts["cached_input_tokens"]) == (1200, 80, 1024)
+    assert cost == 0.001
+
+
+def test_anthropic_style_cache_reads_count_as_cached_tokens(monkeypatch):
+    usage = SimpleNamespace(prompt_tokens=500, completion_tokens=20, cache_read_input_tokens=300)
+    fake_provider(monkeypatch, response(usage=usage))
+    _, token_counts, _ = llm_calls.call_llm_model("page", None, OPENAI_MODEL_FULLNAME, "Extract", use_cache=False)
+    assert token_counts["cached_input_tokens"] == 300
+
+
+def test_responses_without_usage_are_tokenized_locally(monkeypatch):
+    fake_provider(monkeypatch, response(content="four words of output"))
+    monkeypatch.setattr(llm_calls, "count_tokens", lambda model, text: len(text.split()))
+    _, token_counts, _ = llm_calls.call_llm_model("page", None, OPENAI_MODEL_FULLNAME, "Extract now", use_cache=False)
+    # two messages, 4 tokens of overhead each
+    user_words = len(f"{llm_calls.USER_MESSAGE}  page".split())
+    assert token_counts["input_tokens"] == (2 + 4) + (user_words + 4)
+    assert token_counts["output_tokens"] == 4 and token_counts["cached_input_tokens"] == 0
+
+
+def test_every_call_reports_its_latency(monkeypatch):
+    fake_provider(monkeypatch, response(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=1)))
+    _, sync_counts, _ = llm_calls.call_llm_model("page", None, OPENAI_MODEL_FULLNAME, "Extract", use_cache=False)
+    _, async_counts, _ = asyncio.run(llm_calls.acall_llm_model("page", None, OPENAI_MODEL_FULLNAME, "Extract", use_cache=False))
+    for token_counts in (sync_counts, async_counts):
+        assert set(token_counts["latency"]) == {"queue", "network", "parse"}
+        assert all(seconds >= 0 for seconds in token_counts["latency"].values())
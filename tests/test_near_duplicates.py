@@ -0,0 +1,94 @@
+import random
+
+from near_duplicates import FINGERPRINT_BITS, SimHashIndex, find_near_duplicates, hamming_distance, simhash
+from storage import SQLiteStorage, SupabaseStorage
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar papa".split()
+
+
+def page(seed, words=1000):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(words))
+
+
+def test_near_copies_get_close_fingerprints():
+    original = page(1)
+    words = original.split()
+    words[500] = "changed"
+    assert hamming_distance(simhash(original), simhash(" ".join(words))) <= 3
+    # link targets are ignored
+    assert simhash(original + " [more](https://a.example/)") == simhash(original + " [more](https://b.example/?utm_source=x)")
+    assert hamming_distance(simhash(original), simhash(page(2))) > 10
+    assert simhash("too short to compare") is None
+
+
+def test_index_finds_every_fingerprint_within_max_distance():
+    rng = random.Random(7)
+    for max_distance in (0, 3, 6):
+        index = SimHashIndex(max_distance)
+        base = rng.getrandbits(FINGERPRINT_BITS)
+        for distance in range(max_distance + 3):
+            for trial in range(20):
+                flipped = base
+                for bit in rng.sample(range(FINGERPRINT_BITS), distance):
+                    flipped ^= 1 << bit
+                index.add(f"{distance}-{trial}", flipped)
+        found = {key for key, _ in index.find(base)}
+        expected = {f"{distance}-{trial}" for distance in range(max_distance + 1) for trial in range(20)}
+        assert found == expected
+
+
+def test_find_near_duplicates_maps_to_first_page():
+    fingerprints = {"a": 0b1011, "b": 0b1010, "c": 1 << 40 | 0xFFFF}
+    assert find_near_duplicates(["a", "b", "c", "missing"], fingerprints) == {"b": "a"}
+
+
+def test_sqlite_reads_only_stored_fingerprints():
+    storage = SQLiteStorage(":memory:")
+    storage.save_raw("a", "https://a.example", "page a", simhash="00000000000000ff")
+    storage.save_raw("b", "https://b.example", "page b")
+    assert storage.read_fingerprints_bulk(["a", "b"]) == {"a": "00000000000000ff"}
+    assert "simhash" not in storage.read_cache_metadata_bulk(["a"])["a"]
+
+
+class TableWithoutSimhash:
+    """Just enough of a supabase table query to fail like PostgREST on the simhash column."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.columns = None
+
+    def select(self, columns):
+        self.columns = columns
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.columns = ",".join(row)
+        self.row = row
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, column, value):
+        return self
+
+    def execute(self):
+        if "simhash" in self.columns:
+            raise RuntimeError("Could not find the 'simhash' column of 'scraped_data' in the schema cache")
+        if hasattr(self, "row"):
+            self.rows.append(self.row)
+        return type("Response", (), {"data": []})()
+
+
+def test_supabase_without_simhash_column_falls_back():
+    rows = []
+    client = type("Client", (), {"table": lambda self, name: TableWithoutSimhash(rows)})()
+    storage = SupabaseStorage(client)
+    assert storage.read_fingerprints_bulk(["a"]) == {}
+    storage.save_raw("a", "https://a.example", "page a", simhash="00000000000000ff")
+    assert rows and "simhash" not in rows[0]
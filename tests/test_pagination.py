@@ -0,0 +1,79 @@
+from pagination import detect_pagination, extract_links
+
+BASE = "https://shop.example.com/shoes"
+
+
+def pager(numbers, href="/shoes?page={}"):
+    return " ".join("..." if number is None else f"[{number}]({href.format(number)})" for number in numbers)
+
+
+def test_extract_links_resolves_relative_links():
+    markdown = "[a](/x) [b](https://other.com/y) [c](#top) https://shop.example.com/z"
+    assert extract_links(markdown, BASE) == ["https://shop.example.com/x", "https://other.com/y", "https://shop.example.com/z"]
+
+
+def test_contiguous_page_links_generate_the_sequence():
+    detected, confidence = detect_pagination(pager([1, 2, 3, 4, 5]), BASE)
+    assert confidence >= 0.8
+    assert detected.page_urls == [f"https://shop.example.com/shoes?page={n}" for n in range(1, 6)]
+
+
+def test_ellipsis_pager_is_confident():
+    detected, confidence = detect_pagination(pager([1, 2, 3, 4, None, 50]), BASE)
+    assert confidence >= 0.8
+    assert len(detected.page_urls) == 50
+
+
+def test_pager_window_around_current_page_is_confident():
+    detected, confidence = detect_pagination(pager([1, None, 7, 8, 9, None, 50]), BASE + "?page=8")
+    assert confidence >= 0.8
+    assert detected.page_urls[-1] == "https://shop.example.com/shoes?page=50"
+
+
+def test_scattered_numbers_are_not_confident():
+    _, confidence = detect_pagination(pager([3, 17, 40, 90]), BASE)
+    assert confidence < 0.8
+
+
+def test_two_pages_are_not_confident():
+    _, confidence = detect_pagination(pager([1, 2]), BASE)
+    assert confidence < 0.8
+
+
+def test_offset_parameters_use_their_step():
+    detected, _ = detect_pagination(pager([0, 20, 40, 60], href="/shoes?start={}"), BASE)
+    assert detected.page_urls == [f"https://shop.example.com/shoes?start={n}" for n in (0, 20, 40, 60)]
+
+
+def test_path_page_numbers():
+    detected, confidence = detect_pagination(pager([1, 2, 3], href="/shoes/page/{}"), BASE)
+    assert confidence >= 0.8
+    assert detected.page_urls[1] == "https://shop.example.com/shoes/page/2"
+
+
+def test_sequential_product_ids_are_not_pagination():
+    products = " ".join(f"[Product {n}](/p/{n})" for n in range(1001, 1021))
+    detected, confidence = detect_pagination(products, BASE)
+    assert detected is None and confidence == 0.0
+    products = " ".join(f"[Product {n}](/shoes?p={n})" for n in range(1001, 1021))
+    assert detect_pagination(products, BASE) == (None, 0.0)
+
+
+def test_short_p_slot_counts_on_pager_links():
+    markdown = pager([1, 2, 3], href="/shoes?p={}") + " [Next](/shoes?p=2)"
+    detected, confidence = detect_pagination(markdown, BASE)
+    assert confidence >= 0.8
+    assert detected.page_urls == [f"https://shop.example.com/shoes?p={n}" for n in (1, 2, 3)]
+
+
+def test_next_group_is_used_when_the_largest_is_rejected():
+    # many product links on /page/<id> go past the generation cap
+    products = " ".join(f"[Item](/item/page/{n})" for n in range(1000, 3000, 100))
+    markdown = products + " " + pager([1, 2, 3, 4])
+    detected, confidence = detect_pagination(markdown, BASE)
+    assert confidence >= 0.8
+    assert detected.page_urls[0] == "https://shop.example.com/shoes?page=1"
+
+
+def test_other_hosts_are_ignored():
+    assert detect_pagination(pager([1, 2, 3], href="https://other.com/list?page={}"), BASE) == (None, 0.0)
@@ -0,0 +1,50 @@
+from pruning import (drop_image_links, strip_tracking_params, strip_boilerplate, drop_navigation_sections,
+                     collapse_link_urls, prune_markdown)
+
+NAVIGATION = "- [Home](/)\n- [Shoes](/shoes)\n- [Bags](/bags)\n- [Sale](/sale)"
+LISTINGS = "\n\n".join(f"## Boot {i}\nPrice: ${i}0.00\n[View](https://shop.example/boot-{i}?utm_source=mail)" for i in range(8))
+PAGE = f"{NAVIGATION}\n\nWe use cookies to improve your experience. Accept all cookies.\n\n![Boot photo](/img/boot.png)\n\n{LISTINGS}\n\n© 2024 Shop. All rights reserved."
+
+
+def test_images_become_alt_text_unless_an_image_field_is_requested():
+    assert drop_image_links("![Red boot](/img/1.png) $10", ["name"]) == "Red boot $10"
+    assert drop_image_links("![Red boot](/img/1.png)", ["image_url"]) == "![Red boot](/img/1.png)"
+
+
+def test_tracking_parameters_are_removed_from_links():
+    assert strip_tracking_params("[Boot](https://shop.example/boot?id=7&utm_source=mail&gclid=x)", []) == "[Boot](https://shop.example/boot?id=7)"
+
+
+def test_short_boilerplate_blocks_are_dropped_unless_they_mention_a_field():
+    markdown = "We use cookies.\n\n## Boot\nPrice: $10"
+    assert strip_boilerplate(markdown, ["price"]) == "## Boot\nPrice: $10"
+    assert strip_boilerplate(markdown, ["cookies"]) == markdown
+
+
+def test_navigation_menus_at_the_edges_are_dropped():
+    assert drop_navigation_sections(f"{NAVIGATION}\n\n{LISTINGS}", ["price"]) == LISTINGS
+
+
+def test_repeated_and_long_urls_become_references():
+    long_url = "https://shop.example/" + "a" * 100
+    collapsed = collapse_link_urls(f"[A](/x) [B](/x) [C]({long_url}) [D](/y)", [])
+    assert collapsed == f"[A][1] [B][1] [C][2] [D](/y)\n\n[1]: /x\n[2]: {long_url}"
+
+
+def test_prune_markdown_keeps_listings_and_reports_tokens():
+    pruned, stats = prune_markdown(PAGE, ["name", "price"])
+    for i in range(8):
+        assert f"## Boot {i}\nPrice: ${i}0.00" in pruned
+    assert "cookies" not in pruned and "[Home]" not in pruned and "/img/boot.png" not in pruned and "utm_source" not in pruned
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_link_fields_and_keep_links_skip_the_link_steps():
+    for pruned, _ in (prune_markdown(PAGE, ["name", "product_url"]), prune_markdown(PAGE, ["name"], keep_links=True)):
+        assert "[Home](/)" in pruned
+        assert "[View](https://shop.example/boot-0)" in pruned
+
+
+def test_only_the_selected_steps_run():
+    pruned, _ = prune_markdown(PAGE, ["name"], steps=["drop_image_links"])
+    assert pruned == PAGE.replace("![Boot photo](/img/boot.png)", "Boot photo")
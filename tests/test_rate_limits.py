@@ -0,0 +1,74 @@
+import asyncio
+
+import rate_limits
+from assets import OPENAI_MODEL_FULLNAME, GEMINI_MODEL_FULLNAME
+from rate_limits import AsyncRateLimiter, WINDOW_SECONDS, get_rate_limiter
+
+
+def fake_clock(monkeypatch):
+    """A monotonic clock that only moves when the limiter sleeps; returns the list of sleeps."""
+    now = [0.0]
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(rate_limits.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limits.asyncio, "sleep", sleep)
+    return sleeps
+
+
+async def reserve(limiter, times, tokens=0):
+    for _ in range(times):
+        async with limiter.limit(tokens):
+            pass
+
+
+def test_requests_over_rpm_wait_for_the_window(monkeypatch):
+    sleeps = fake_clock(monkeypatch)
+    asyncio.run(reserve(AsyncRateLimiter(rpm=2), 3))
+    assert sleeps == [WINDOW_SECONDS]
+
+
+def test_tokens_over_tpm_wait_and_corrections_count(monkeypatch):
+    sleeps = fake_clock(monkeypatch)
+    limiter = AsyncRateLimiter(tpm=1000)
+
+    async def run():
+        async with limiter.limit(100) as usage:
+            usage["tokens"] = 900  # the provider reported more than the estimate
+        await reserve(limiter, 1, tokens=50)
+        assert sleeps == []
+        await reserve(limiter, 1, tokens=100)
+
+    asyncio.run(run())
+    assert sleeps == [WINDOW_SECONDS]
+
+
+def test_concurrency_is_capped():
+    limiter = AsyncRateLimiter(max_concurrency=2)
+    in_flight = [0]
+    peak = [0]
+
+    async def call():
+        async with limiter.limit():
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak[0] == 2
+
+
+def test_one_limiter_per_provider_and_event_loop():
+    async def limiters():
+        return get_rate_limiter(OPENAI_MODEL_FULLNAME), get_rate_limiter(OPENAI_MODEL_FULLNAME), get_rate_limiter(GEMINI_MODEL_FULLNAME)
+
+    first, same, other = asyncio.run(limiters())
+    assert first is same and first is not other
+    assert asyncio.run(limiters())[0] is not first
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+import resilience
+from assets import MODELS_USED
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, call_with_retries, is_retryable
+
+MODEL = list(MODELS_USED)[0]
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_breaker_opens_after_the_failure_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] += 31
+    assert breaker.state == "half-open"
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    # the trial failed: open again for another reset period
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] += 31
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_retryable_errors():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(StatusError(400))
+
+
+def test_backoff_honors_retry_after():
+    assert backoff_delay(0, retry_after=5.0) >= 5.0
+    assert 0 <= backoff_delay(3) <= resilience.LLM_BACKOFF_BASE_SECONDS * 2 ** 3
+
+
+def test_call_with_retries_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(503)
+        return "ok"
+
+    assert call_with_retries(send, MODEL) == "ok"
+    assert len(calls) == 3
+
+
+def test_call_with_retries_raises_client_errors_at_once(monkeypatch):
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        call_with_retries(send, MODEL)
+    assert len(calls) == 1
@@ -0,0 +1,79 @@
+import io
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from results import (build_results_table, build_pagination_table, iter_csv_chunks, iter_ndjson_chunks, write_export,
+                     to_csv_bytes, to_ndjson_bytes, to_json_bytes, to_parquet_bytes)
+
+
+class Listing(BaseModel):
+    name: str
+    price: str
+
+
+class Container(BaseModel):
+    listings: list[Listing]
+
+
+PARSED_RESULTS = [
+    {"unique_name": "a", "parsed_data": Container(listings=[Listing(name="Boot", price="$10"), Listing(name="Shoe, red", price="$5")])},
+    {"unique_name": "b", "parsed_data": json.dumps({"listings": [{"name": "Café", "price": "€3"}]})},
+    {"unique_name": "c", "parsed_data": {"title": "no listings here"}},
+]
+
+
+def test_results_table_has_one_row_per_listing():
+    table = build_results_table(PARSED_RESULTS)
+    assert list(table["name"][:3]) == ["Boot", "Shoe, red", "Café"]
+    assert table["parsed_data"].iloc[3] == {"title": "no listings here"}
+
+
+def test_csv_is_written_in_chunks_with_one_header():
+    table = build_results_table(PARSED_RESULTS)
+    chunks = list(iter_csv_chunks(table, chunk_rows=2))
+    assert len(chunks) == 3  # the header, then two chunks of rows
+    assert b"".join(chunks) == table.to_csv(index=False).encode("utf-8") == to_csv_bytes(table)
+
+
+def test_ndjson_has_one_object_per_line():
+    table = build_results_table(PARSED_RESULTS[:2])
+    chunks = list(iter_ndjson_chunks(table, chunk_rows=2))
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["Boot", "Shoe, red", "Café"]
+    assert to_ndjson_bytes(build_results_table([])) == b""
+
+
+def test_write_export_streams_chunks_to_a_file():
+    table = build_results_table(PARSED_RESULTS)
+    file = io.BytesIO()
+    written = write_export(iter_csv_chunks(table, chunk_rows=1), file)
+    assert file.getvalue() == to_csv_bytes(table) and written == len(file.getvalue())
+
+
+def test_json_export_normalizes_parsed_data():
+    documents = json.loads(to_json_bytes(PARSED_RESULTS))
+    assert documents[0]["parsed_data"]["listings"][1]["name"] == "Shoe, red"
+    assert documents[1]["parsed_data"]["listings"][0]["price"] == "€3"
+
+
+def test_parquet_round_trip_with_mixed_columns():
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    table = build_results_table(PARSED_RESULTS)
+    restored = pd.read_parquet(io.BytesIO(to_parquet_bytes(table)))
+    assert list(restored["name"][:3]) == ["Boot", "Shoe, red", "Café"]
+    assert json.loads(restored["parsed_data"].iloc[3]) == {"title": "no listings here"}
+
+
+def test_pagination_table_keeps_the_source_page():
+    table = build_pagination_table([
+        {"unique_name": "a", "pagination_data": {"page_urls": ["https://shop.example/?page=2", "https://shop.example/?page=3"]}},
+        {"unique_name": "b", "pagination_data": json.dumps({"page_urls": []})},
+    ])
+    assert table.to_dict("records") == [
+        {"page_url": "https://shop.example/?page=2", "unique_name": "a"},
+        {"page_url": "https://shop.example/?page=3", "unique_name": "a"},
+    ]
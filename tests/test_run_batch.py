@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import run_batch
+from utils import generate_unique_name
+
+URLS = [f"https://shop.example/p{n}" for n in range(5)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FakePipeline:
+    """Stands in for crawling and extraction; scraping can be made to stop after a number of batches."""
+
+    def __init__(self, monkeypatch, fail_fetch=(), interrupt_after=None):
+        self.fetched = []
+        self.scraped = []
+        self.fail_fetch = set(fail_fetch)
+        self.interrupt_after = interrupt_after
+        monkeypatch.setattr(run_batch, "crawl_and_store_markdowns", self.fetch)
+        monkeypatch.setattr(run_batch, "read_raw_data_bulk", lambda unique_names: {uniq: "# page" for uniq in unique_names})
+        monkeypatch.setattr(run_batch, "scrape_urls", self.scrape)
+
+    def fetch(self, urls, concurrency, force_refresh=False):
+        self.fetched.extend(urls)
+        return [{"url": url, "status": "failed" if url in self.fail_fetch else "crawled", "error": "404" if url in self.fail_fetch else None} for url in urls]
+
+    def scrape(self, unique_names, fields, model, **kwargs):
+        if self.interrupt_after is not None and len(self.scraped) >= self.interrupt_after:
+            raise Interrupted()
+        self.scraped.append(list(unique_names))
+        results = [{"unique_name": uniq, "parsed_data": {"listings": []}} for uniq in unique_names]
+        return 10 * len(unique_names), len(unique_names), 0.01 * len(unique_names), results
+
+
+@pytest.fixture
+def urls_file(tmp_path):
+    path = tmp_path / "urls.txt"
+    path.write_text("# catalog\n" + "\n".join(URLS + [URLS[0]]) + "\n\n", encoding="utf-8")
+    return path
+
+
+def run(urls_file, *extra):
+    return run_batch.main(["--urls", str(urls_file), "--fields", "name,price", "--batch-size", "2", *extra])
+
+
+def read_checkpoint(urls_file):
+    return json.loads((urls_file.parent / "urls.txt.checkpoint.json").read_text(encoding="utf-8"))
+
+
+def test_interrupted_run_resumes_without_redoing_finished_pages(monkeypatch, urls_file):
+    first = FakePipeline(monkeypatch, interrupt_after=1)
+    with pytest.raises(Interrupted):
+        run(urls_file)
+    assert first.fetched == URLS
+    checkpoint = read_checkpoint(urls_file)
+    assert [checkpoint["urls"][url]["scrape"] for url in URLS] == ["done", "done", "pending", "pending", "pending"]
+
+    second = FakePipeline(monkeypatch)
+    assert run(urls_file) == 0
+    assert second.fetched == []
+    assert second.scraped == [[generate_unique_name(url) for url in URLS[2:4]], [generate_unique_name(URLS[4])]]
+    resumed = read_checkpoint(urls_file)
+    assert resumed["run_id"] == checkpoint["run_id"]
+    assert resumed["usage"]["scrape"]["input_tokens"] == 50
+    lines = (urls_file.parent / "urls.txt.results.jsonl").read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(line)["unique_name"] for line in lines) == sorted(generate_unique_name(url) for url in URLS)
+
+
+def test_failed_fetches_are_retried_and_not_scraped(monkeypatch, urls_file):
+    first = FakePipeline(monkeypatch, fail_fetch={URLS[1]})
+    run(urls_file)
+    assert generate_unique_name(URLS[1]) not in sum(first.scraped, [])
+    assert read_checkpoint(urls_file)["urls"][URLS[1]]["fetch"] == "failed"
+    second = FakePipeline(monkeypatch)
+    run(urls_file)
+    assert second.fetched == [URLS[1]]
+    assert second.scraped == [[generate_unique_name(URLS[1])]]
+
+
+def test_a_different_configuration_starts_a_new_checkpoint(monkeypatch, urls_file):
+    FakePipeline(monkeypatch)
+    run(urls_file)
+    run_id = read_checkpoint(urls_file)["run_id"]
+    pipeline = FakePipeline(monkeypatch)
+    run_batch.main(["--urls", str(urls_file), "--fields", "name", "--batch-size", "2"])
+    assert read_checkpoint(urls_file)["run_id"] != run_id
+    assert len(pipeline.fetched) == len(URLS)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import scraper
+from scraper import get_listing_models, merge_listings
+
+
+def test_merge_listings_drops_duplicates_across_chunks():
+    _, container = get_listing_models(("name", "price"))
+    merged = merge_listings([
+        '{"listings": [{"name": "A", "price": "1"}]}',
+        {"listings": [{"name": "A", "price": "1"}, {"name": "B", "price": "2"}]},
+    ], container)
+    assert [listing.name for listing in merged.listings] == ["A", "B"]
+
+
+def test_merge_listings_drops_only_the_invalid_listing():
+    _, container = get_listing_models(("name", "price"))
+    merged = merge_listings([
+        '{"listings": [{"name": "A", "price": "1"}, {"name": "B"}]}',
+        "not json",
+        {"listings": [{"name": "C", "price": "3"}]},
+    ], container)
+    assert [listing.name for listing in merged.listings] == ["A", "C"]
+
+
+PAGES = {"slow": "# Slow page\nA boot for 10 dollars", "fast": "# Fast page\nA shoe for 5 dollars", "broken": "# Broken page\nnothing"}
+DELAYS = {"Slow": 0.05, "Fast": 0.0}
+
+
+@pytest.fixture
+def fake_extraction(monkeypatch):
+    monkeypatch.setattr(scraper, "save_formatted_data", lambda *args, **kwargs: None)
+
+    def parse(markdown):
+        if "Broken" in markdown:
+            raise RuntimeError("provider unavailable")
+        name = "Slow" if "Slow" in markdown else "Fast"
+        return name, ({"listings": [{"name": name, "price": "1"}]}, {"input_tokens": 10, "output_tokens": 2}, 0.01)
+
+    async def aextract_listings(markdown, container, model, system_message):
+        name, output = parse(markdown)
+        await asyncio.sleep(DELAYS[name])
+        return output
+
+    monkeypatch.setattr(scraper, "aextract_listings", aextract_listings)
+    monkeypatch.setattr(scraper, "extract_listings", lambda markdown, container, model, system_message: parse(markdown)[1])
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_results_are_streamed_as_pages_finish(fake_extraction, parallel):
+    streamed = []
+    input_tokens, _, cost, results = scraper.scrape_urls(
+        ["slow", "missing", "fast", "broken"], ["name", "price"], "gpt-4o-mini", parallel=parallel,
+        raw_data_map=PAGES, write_buffer=object(), on_result=streamed.append, incremental=False, dedupe=False,
+    )
+    finished = [result["unique_name"] if result else None for result in streamed]
+    if parallel:
+        # pages are reported in completion order: the slow page comes last
+        assert finished[-1] == "slow" and sorted(finished, key=str) == sorted([None, "fast", "broken", "slow"], key=str)
+    else:
+        assert finished == ["slow", None, "fast", "broken"]
+    assert [result["unique_name"] for result in results] == ["slow", "fast", "broken"]
+    assert results[2]["error"] == "provider unavailable"
+    assert input_tokens == 20 and cost == pytest.approx(0.02)
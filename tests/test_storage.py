@@ -0,0 +1,53 @@
+import pytest
+
+import storage
+from benchmarks.memory_supabase import InMemorySupabaseClient
+from storage import SQLiteStorage, SupabaseStorage, get_storage
+
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStorage(str(tmp_path / "scraped.sqlite3"), chunk_size=2)
+    return SupabaseStorage(InMemorySupabaseClient(), chunk_size=2)
+
+
+def test_raw_data_round_trip_with_cache_metadata(backend):
+    backend.save_raw("shop_a", "https://shop.example/a", "# Page A", etag='"v1"', simhash="00ff")
+    backend.save_raw("shop_b", "https://shop.example/b", {"blob": "abc", "size": 10, "stored_size": 8})
+    names = ["shop_a", "shop_b", "missing"]
+    assert backend.read_raw_bulk(names) == {"shop_a": "# Page A", "shop_b": {"blob": "abc", "size": 10, "stored_size": 8}}
+    assert backend.read_raw("missing") == ""
+    metadata = backend.read_cache_metadata_bulk(names)
+    assert set(metadata) == {"shop_a", "shop_b"}
+    assert metadata["shop_a"]["etag"] == '"v1"' and metadata["shop_a"]["fetched_at"]
+    assert backend.read_fingerprints_bulk(names) == {"shop_a": "00ff"}
+
+
+def test_upserts_only_write_the_given_columns(backend):
+    backend.save_raw("shop_a", "https://shop.example/a", "# Page A")
+    backend.save_formatted("shop_a", {"listings": [{"name": "Boot"}]})
+    backend.save_pagination("shop_a", {"page_urls": ["https://shop.example/a?page=2"]})
+    backend.bulk_upsert([{"unique_name": "shop_c", "formatted_data": {"listings": []}}])
+    assert backend.read_raw_bulk(["shop_a"]) == {"shop_a": "# Page A"}
+    assert backend.read_formatted_bulk(["shop_a", "shop_c", "shop_d"]) == {
+        "shop_a": {"listings": [{"name": "Boot"}]},
+        "shop_c": {"listings": []},
+    }
+    assert backend.read_raw_bulk(["shop_c"]) == {}
+
+
+def test_sqlite_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "scraped.sqlite3")
+    SQLiteStorage(path).save_raw("shop_a", "https://shop.example/a", "# Page A")
+    assert SQLiteStorage(path).read_raw("shop_a") == "# Page A"
+
+
+def test_backend_is_selected_by_name(monkeypatch):
+    monkeypatch.setattr(storage, "_storage", None)
+    monkeypatch.setenv("STORAGE_BACKEND", "nosuchdb")
+    with pytest.raises(ValueError):
+        get_storage()
+    monkeypatch.setattr(storage, "STORAGE_BACKENDS", {**storage.STORAGE_BACKENDS, "memory": lambda: SQLiteStorage(":memory:")})
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    assert isinstance(get_storage(), SQLiteStorage)
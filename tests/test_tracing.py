@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+
+from tracing import Tracer, set_run_id, trace_page
+
+
+def test_spans_carry_the_run_page_and_attributes():
+    tracer = Tracer(enabled=True)
+
+    async def page(uniq):
+        with trace_page(uniq):
+            await asyncio.sleep(0)
+            with tracer.span("llm.call", input_tokens=100) as attributes:
+                attributes["cost"] = 0.01
+
+    async def run():
+        set_run_id("run-1")
+        await asyncio.gather(page("shop_a"), page("shop_b"))
+
+    asyncio.run(run())
+    tracer.record("crawl", 0.0, 1.5, run_id="run-2", bytes=2048)
+    spans = tracer.spans("run-1")
+    assert sorted(span["attributes"]["unique_name"] for span in spans) == ["shop_a", "shop_b"]
+    assert spans[0]["attributes"]["input_tokens"] == 100 and spans[0]["attributes"]["cost"] == 0.01
+    assert [span["name"] for span in tracer.spans("run-2")] == ["crawl"]
+
+
+def test_errors_are_recorded_and_raised():
+    tracer = Tracer(enabled=True)
+    with pytest.raises(ValueError):
+        with tracer.span("json.parse"):
+            raise ValueError("bad json")
+    assert tracer.spans()[0]["attributes"]["error"] == "bad json"
+
+
+def test_disabled_tracer_and_span_limit():
+    disabled = Tracer(enabled=False)
+    with disabled.span("crawl"):
+        pass
+    assert disabled.spans() == []
+    bounded = Tracer(enabled=True, max_spans=2)
+    for n in range(3):
+        bounded.record("crawl", n, 0.1, run_id="run", rows=n)
+    assert [span["attributes"]["rows"] for span in bounded.spans()] == [1, 2]
+
+
+def test_summary_and_exports():
+    tracer = Tracer(enabled=True)
+    tracer.record("llm.call", 0.0, 2.0, run_id="run", input_tokens=100, cost=0.01, cache_hit=False)
+    tracer.record("llm.call", 1.0, 0.5, run_id="run", input_tokens=50, cost=0.0, cache_hit=True)
+    tracer.record("crawl", 0.0, 1.0, run_id="other", bytes=10)
+    summary = tracer.summary("run")
+    assert set(summary) == {"llm.call"}
+    assert summary["llm.call"]["count"] == 2 and summary["llm.call"]["total_seconds"] == 2.5 and summary["llm.call"]["max_seconds"] == 2.0
+    assert summary["llm.call"]["input_tokens"] == 150 and summary["llm.call"]["cache_hit"] == 1
+
+    lines = tracer.to_jsonl("run").splitlines()
+    assert [json.loads(line)["attributes"]["input_tokens"] for line in lines] == [100, 50]
+
+    metrics = tracer.to_prometheus("run")
+    assert 'scraper_span_duration_seconds_sum{span="llm.call"} 2.500000' in metrics
+    assert 'scraper_span_duration_seconds_count{span="llm.call"} 2' in metrics
+    assert 'scraper_span_attribute_total{span="llm.call",attribute="input_tokens"} 150' in metrics
+    assert "crawl" not in metrics
+
+
+def test_export_jsonl_appends(tmp_path):
+    tracer = Tracer(enabled=True)
+    tracer.record("crawl", 0.0, 1.0, run_id="run")
+    path = str(tmp_path / "traces" / "run.jsonl")
+    tracer.export_jsonl(path, "run")
+    tracer.export_jsonl(path, "run")
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
@@ -0,0 +1,32 @@
+from utils import canonicalize_url, dedupe_urls
+
+
+def test_host_case_default_port_and_fragment_are_normalized():
+    assert canonicalize_url("HTTPS://Example.com:443/shop#top") == "https://example.com/shop"
+    assert canonicalize_url("http://example.com:80/shop") == "http://example.com/shop"
+
+
+def test_missing_scheme_and_root_path():
+    assert canonicalize_url("example.com") == "https://example.com/"
+    assert canonicalize_url("https://example.com") == canonicalize_url("https://example.com/")
+
+
+def test_tracking_parameters_are_dropped_and_query_sorted():
+    url = "https://example.com/shop?utm_source=x&b=2&gclid=abc&a=1"
+    assert canonicalize_url(url) == "https://example.com/shop?a=1&b=2"
+
+
+def test_ref_is_kept_as_a_real_parameter():
+    assert canonicalize_url("https://example.com/repo?ref=main") == "https://example.com/repo?ref=main"
+    assert canonicalize_url("https://example.com/repo?ref=main") != canonicalize_url("https://example.com/repo?ref=dev")
+
+
+def test_trailing_slash_is_kept_outside_the_root():
+    assert canonicalize_url("https://example.com/a/") == "https://example.com/a/"
+    assert canonicalize_url("https://example.com/a/") != canonicalize_url("https://example.com/a")
+    assert canonicalize_url("https://example.com//a//b") == "https://example.com/a/b"
+
+
+def test_dedupe_urls_keeps_the_first_spelling():
+    urls = ["https://example.com/a?utm_source=x", "https://EXAMPLE.com/a", "https://example.com/b"]
+    assert dedupe_urls(urls) == ["https://example.com/a?utm_source=x", "https://example.com/b"]
@@ -0,0 +1,66 @@
+import write_buffer
+from write_buffer import WriteBuffer
+
+
+class FlakyUpsert:
+    """Fails the first `failures` calls, then records the rows it is given."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.rows = []
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("storage is down")
+        self.rows.extend(rows)
+
+
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(write_buffer.time, "sleep", lambda seconds: None)
+
+
+def test_flush_merges_columns_and_groups_rows_by_columns():
+    upsert = FlakyUpsert(0)
+    with WriteBuffer(flush_interval=60, upsert=upsert) as buffer:
+        buffer.add("a", "formatted_data", {"listings": []})
+        buffer.add("a", "pagination_data", {"page_urls": []})
+        buffer.add("b", "formatted_data", {"listings": []})
+        assert buffer.flush() == 2
+    assert upsert.calls == 2
+    assert {"unique_name": "a", "formatted_data": {"listings": []}, "pagination_data": {"page_urls": []}} in upsert.rows
+    assert buffer.rows_written == 2 and buffer.failed_rows == []
+
+
+def test_failed_writes_are_retried(monkeypatch):
+    no_sleep(monkeypatch)
+    upsert = FlakyUpsert(2)
+    with WriteBuffer(flush_interval=60, max_retries=3, upsert=upsert) as buffer:
+        buffer.add("a", "formatted_data", {"listings": []})
+    assert upsert.calls == 3
+    assert buffer.rows_written == 1 and buffer.failed_rows == []
+
+
+def test_rows_still_failing_after_retries_end_in_failed_rows(monkeypatch):
+    no_sleep(monkeypatch)
+    upsert = FlakyUpsert(10)
+    with WriteBuffer(flush_interval=60, max_retries=2, upsert=upsert) as buffer:
+        buffer.add("a", "formatted_data", {"listings": []})
+    assert upsert.calls == 3
+    assert buffer.rows_written == 0
+    assert buffer.failed_rows == [{"unique_name": "a", "formatted_data": {"listings": []}}]
+
+
+def test_rows_are_flushed_once_max_rows_are_pending():
+    upsert = FlakyUpsert(0)
+    buffer = WriteBuffer(max_rows=2, flush_interval=60, upsert=upsert)
+    buffer.add("a", "formatted_data", 1)
+    buffer.add("b", "formatted_data", 2)
+    # written by the background thread, without a flush() call
+    for _ in range(100):
+        if buffer.rows_written:
+            break
+        write_buffer.time.sleep(0.01)
+    assert buffer.rows_written == 2
+    buffer.close()
@@ -0,0 +1,198 @@
+# tracing.py
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from assets import TRACING_ENABLED, TRACE_MAX_SPANS, PROFILE_OUTPUT_DIR
+
+# the run the current code belongs to; asyncio tasks and asyncio.to_thread
+# inherit it, so spans recorded deep in the pipeline know their run
+_current_run_id = contextvars.ContextVar("trace_run_id", default=None)
+# the page being processed, set per asyncio task by trace_page()
+_current_unique_name = contextvars.ContextVar("trace_unique_name", default=None)
+
+# span attributes that are added up per span name in the Prometheus export
+SUMMED_ATTRIBUTES = ("input_tokens", "output_tokens", "cached_input_tokens", "cost", "bytes", "rows", "cache_hit")
+
+
+def set_run_id(run_id: str) -> None:
+    """Tags every span recorded from now on (in this context) with run_id."""
+    _current_run_id.set(run_id)
+
+
+def current_run_id():
+    return _current_run_id.get()
+
+
+@contextmanager
+def trace_page(unique_name: str):
+    """Tags the spans recorded inside the block with this page's unique_name."""
+    token = _current_unique_name.set(unique_name)
+    try:
+        yield
+    finally:
+        _current_unique_name.reset(token)
+
+
+class Tracer:
+    """
+    Records timing spans (crawl, storage.read, llm.call, json.parse,
+    storage.write, ...) in memory. Each span is a dict:
+        {"name", "run_id", "start", "duration", "attributes"}
+    where attributes carry the unique_name / url and measures such as
+    tokens, cost, bytes and cache hits.
+
+    Usage:
+        with get_tracer().span("crawl", url=url) as attributes:
+            ...
+            attributes["bytes"] = len(markdown)
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, max_spans: int = TRACE_MAX_SPANS):
+        self.enabled = enabled
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, run_id: str = None, **attributes):
+        """Times the block; the yielded dict can be filled with more attributes."""
+        if not self.enabled:
+            yield attributes
+            return
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield attributes
+        except Exception as e:
+            attributes["error"] = str(e)
+            raise
+        finally:
+            self.record(name, start, time.perf_counter() - started, run_id, **attributes)
+
+    def record(self, name: str, start: float, duration: float, run_id: str = None, **attributes) -> None:
+        """Adds an already measured span."""
+        if not self.enabled:
+            return
+        unique_name = _current_unique_name.get()
+        if unique_name is not None:
+            attributes.setdefault("unique_name", unique_name)
+        span = {"name": name, "run_id": run_id or current_run_id(), "start": start, "duration": duration, "attributes": attributes}
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, run_id: str = None) -> list:
+        with self._lock:
+            spans = list(self._spans)
+        if run_id is None:
+            return spans
+        return [span for span in spans if span["run_id"] == run_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self, run_id: str = None) -> dict:
+        """
+        Per span name: {"count", "total_seconds", "max_seconds", <summed attributes>},
+        e.g. to tell whether a run was crawl-, LLM- or database-bound.
+        """
+        summary = {}
+        for span in self.spans(run_id):
+            entry = summary.setdefault(span["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["total_seconds"] += span["duration"]
+            entry["max_seconds"] = max(entry["max_seconds"], span["duration"])
+            for attribute in SUMMED_ATTRIBUTES:
+                value = span["attributes"].get(attribute)
+                if isinstance(value, (int, float)):
+                    entry[attribute] = entry.get(attribute, 0) + value
+        return summary
+
+    def to_jsonl(self, run_id: str = None) -> str:
+        """The spans as JSON lines, one span per line."""
+        return "".join(json.dumps(span, default=str) + "\n" for span in self.spans(run_id))
+
+    def export_jsonl(self, path: str, run_id: str = None) -> None:
+        """Appends the spans to a JSON lines file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl(run_id))
+
+    def to_prometheus(self, run_id: str = None) -> str:
+        """The span summary in the Prometheus text exposition format."""
+        lines = [
+            "# HELP scraper_span_duration_seconds Time spent in each pipeline stage.",
+            "# TYPE scraper_span_duration_seconds summary",
+        ]
+        summary = self.summary(run_id)
+        for name, entry in sorted(summary.items()):
+            lines.append(f'scraper_span_duration_seconds_sum{{span="{name}"}} {entry["total_seconds"]:.6f}')
+            lines.append(f'scraper_span_duration_seconds_count{{span="{name}"}} {entry["count"]}')
+        lines.append("# HELP scraper_span_attribute_total Tokens, cost, bytes, rows and cache hits recorded by each stage.")
+        lines.append("# TYPE scraper_span_attribute_total counter")
+        for name, entry in sorted(summary.items()):
+            for attribute in SUMMED_ATTRIBUTES:
+                if attribute in entry:
+                    lines.append(f'scraper_span_attribute_total{{span="{name}",attribute="{attribute}"}} {entry[attribute]}')
+        return "\n".join(lines) + "\n"
+
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """Returns the process-wide tracer."""
+    return _tracer
+
+
+class RunProfiler:
+    """
+    Optional cProfile of a single run. The stats are saved to
+    <output_dir>/<run_id>.prof (open with snakeviz or pstats) and stop()
+    returns {"path", "top"}, "top" being a text report of the slowest calls.
+    cProfile only sees the calling thread: the async engines run there,
+    the write buffer's background thread is not profiled.
+
+    Usage:
+        with RunProfiler(run_id) as profiler:
+            ...
+        print(profiler.report["top"])
+    """
+
+    def __init__(self, run_id: str = None, output_dir: str = PROFILE_OUTPUT_DIR):
+        self.run_id = run_id
+        self.output_dir = output_dir
+        self.report = {}
+        self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profiler.enable()
+
+    def stop(self) -> dict:
+        self._profiler.disable()
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{self.run_id or current_run_id() or int(time.time())}.prof")
+        self._profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(30)
+        self.report = {"path": path, "top": text.getvalue()}
+        GREEN = "\033[32m"
+        RESET = "\033[0m"
+        print(f"{GREEN}INFO:Profile saved to {path}{RESET}")
+        return self.report
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
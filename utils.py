@@ -1,15 +1,81 @@
+import asyncio
 from datetime import datetime
+import hashlib
 import re
+from typing import List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that never change the content of a page
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref_src", "_ga", "_gl", "igshid", "yclid"}
+
+# =============================================================================
+# 5) CANONICALIZE URL
+# =============================================================================
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so that trivially different spellings of the same page
+    (case of the host, default ports, fragments, tracking parameters,
+    query parameter order, a missing root path) map to the same string.
+    Other trailing slashes are kept: some sites serve /a and /a/ differently.
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = "https://" + url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+def dedupe_urls(urls: List[str]) -> List[str]:
+    """
+    Drop URLs whose canonical form was already seen, keeping the first spelling.
+    """
+    seen = set()
+    unique_urls = []
+    for url in urls:
+        canonical = canonicalize_url(url)
+        if canonical not in seen:
+            seen.add(canonical)
+            unique_urls.append(url)
+    return unique_urls
+
 # =============================================================================
 # 6) GENERATE UNIQUE FOLDER NAME
 # =============================================================================
 def generate_unique_name(url: str) -> str:
     """
-    Generate a unique name for the folder based on the URL.
+    Generate a deterministic unique name for the page based on its canonical URL,
+    so the same page always maps to the same cached row.
+    """
+    canonical = canonicalize_url(url)
+    domain = re.sub(r'\W+', '_', urlsplit(canonical).netloc)
+    digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+    return f"{domain}_{digest}"
+
+def generate_run_id() -> str:
+    """
+    Generate a unique, time-based identifier for one launch of the pipeline.
+    """
+    return datetime.now().strftime('run_%Y_%m_%d__%H_%M_%S_%f')
+
+def run_async(coro):
+    """
+    Runs a coroutine to completion on a fresh event loop, so the sync
+    code paths (Streamlit, scripts) can call the async engines.
     """
-    timestamp = datetime.now().strftime('%Y_%m_%d__%H_%M_%S_%f')
-    domain = re.sub(r'\W+', '_', url.split('//')[-1].split('/')[0])
-    return f"{domain}_{timestamp}"
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
 
 # def calculate_price(token_counts, model):
 #     """
@@ -22,4 +88,4 @@ def generate_unique_name(url: str) -> str:
 #     output_cost = output_token_count * PRICING[model]["output"]
 #     total_cost = input_cost + output_cost
 
-#     return input_token_count, output_token_count, total_cost
\ No newline at end of file
+#     return input_token_count, output_token_count, total_cost
@@ -0,0 +1,135 @@
+# write_buffer.py
+
+import random
+import threading
+import time
+from assets import WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_FLUSH_SECONDS, WRITE_BUFFER_MAX_RETRIES
+from storage import get_storage, SCRAPED_DATA_TABLE
+from tracing import get_tracer, current_run_id
+
+
+def storage_bulk_upsert(rows: list) -> None:
+    """Upserts scraped_data rows through the configured storage backend, matching rows on unique_name."""
+    get_storage().bulk_upsert(rows)
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer for per-page results (formatted_data, pagination_data).
+
+    add() only queues the value in memory; a background thread writes the
+    queued rows as bulk upserts once `max_rows` rows are pending or the oldest
+    one has waited `flush_interval` seconds. Failed writes are retried with
+    jittered exponential backoff. flush() writes everything pending right now,
+    and leaving the `with` block (or close()) does a final flush.
+
+    Usage:
+        with WriteBuffer() as buffer:
+            buffer.add(unique_name, "formatted_data", data)
+    """
+
+    def __init__(self, max_rows: int = WRITE_BUFFER_MAX_ROWS, flush_interval: float = WRITE_BUFFER_FLUSH_SECONDS, max_retries: int = WRITE_BUFFER_MAX_RETRIES, upsert=storage_bulk_upsert):
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.upsert = upsert
+        self.failed_rows = []
+        self.rows_written = 0
+        # the background thread doesn't inherit the caller's context
+        self.run_id = current_run_id()
+        self._pending = {}  # unique_name -> {column: value}
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+        self._worker.start()
+
+    def add(self, unique_name: str, column: str, value) -> None:
+        """Queue `column = value` for the row with this unique_name."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("WriteBuffer is closed")
+            self._pending.setdefault(unique_name, {})[column] = value
+            if self._oldest is None:
+                # wake the worker so it starts the flush_interval countdown
+                self._oldest = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) >= self.max_rows:
+                self._condition.notify()
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.max_rows or time.monotonic() - self._oldest >= self.flush_interval
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and not self._due():
+                    timeout = None if self._oldest is None else max(0.0, self.flush_interval - (time.monotonic() - self._oldest))
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _take_pending(self) -> dict:
+        with self._condition:
+            pending, self._pending, self._oldest = self._pending, {}, None
+        return pending
+
+    def _write_with_retries(self, rows: list) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.upsert(rows)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    RED = "\033[31m"
+                    RESET = "\033[0m"
+                    print(f"{RED}ERROR:Could not write {len(rows)} rows to {SCRAPED_DATA_TABLE}: {e}{RESET}")
+                    return False
+                time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+        return False
+
+    def flush(self) -> int:
+        """Write every pending row now. Returns the number of rows written."""
+        with self._flush_lock:
+            pending = self._take_pending()
+            if not pending:
+                return 0
+            # a bulk upsert needs the same columns on every row
+            groups = {}
+            for unique_name, columns in pending.items():
+                row = {"unique_name": unique_name, **columns}
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+            written = 0
+            for rows in groups.values():
+                with get_tracer().span("storage.write", run_id=self.run_id, table=SCRAPED_DATA_TABLE, rows=len(rows)) as span:
+                    if self._write_with_retries(rows):
+                        written += len(rows)
+                    else:
+                        span["error"] = "write failed"
+                        self.failed_rows.extend(rows)
+            self.rows_written += written
+            MAGENTA = "\033[35m"
+            RESET = "\033[0m"
+            print(f"{MAGENTA}INFO:Flushed {written} rows to {SCRAPED_DATA_TABLE}{RESET}")
+            return written
+
+    def close(self) -> None:
+        """Stop the background thread and flush what is left."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False